@@ -2,6 +2,13 @@ import sounddevice as sd
 import numpy as np
 import threading
 import time
+from churn import activity, capture, compress, dsp, snapshot
+from churn.profile import profiler, stage
+from churn.cache import StretchCache
+from churn.evolve import Evolver
+from churn.tiers import TierStore
+from churn.memory import budget
+from churn.archive import LayerArchive
 
 # --- Configuration ---
 fs = 44100
@@ -9,116 +16,243 @@ capture_dur = 2        # Duration of each new seed
 grand_loop_dur = 15    # Interval to capture 5 new seeds + resample output
 stretch_factor = 1.19
 stagger_delay = 0.5
+cache_mb = 256         # Byte budget for memoized stretch generations
+tier_db = -45          # Out-of-band energy (dB) a layer may lose when moved to a lower rate
+compress_layers = True # Keep layer loops as int16 + per-block scales (half the RAM)
+memory_mb = 512        # Byte budget for all layer buffers
+evict_policy = 'oldest' # 'oldest', 'quietest', 'longest' or 'lru'
+archive_recall = 1     # Archived layers brought back per grand loop
+snapshot_path = "aardvark.snap" # Written on SIGUSR1 / SIGTERM, restored on the next start
+stream_first = True    # Open a duplex stream at once and fold seeds in as they finish (False: record all 5 first)
+
+stretch_cache = StretchCache(max_bytes=cache_mb * 1024 * 1024)
+tier_store = TierStore(fs, tolerance_db=tier_db)
+budget.configure(memory_mb, evict_policy)
+
+@stage("evolve")
+def next_generation(data, rate, generation, source):
+    """Evolver worker: the next 19% stretch (normalized to keep layering balanced), settled, indexed and packed."""
+    data = stretch_cache.stretch(data, stretch_factor, generation, target=1.0, source=source)
+    data, rate = tier_store.settle(data, rate)
+    index = stretch_cache.activity(data) or activity.ActivityIndex(data)
+    return compress.pack(data, compress_layers), rate, index, generation
+
+evolver = Evolver(next_generation)  # Generations are built off the audio thread
+archive = LayerArchive("aardvark")  # Cold layers are spilled here instead of dropped
 
 class Layer:
     def __init__(self, data, volume=0.2):
-        self.data = data.flatten().astype(np.float32)
+        self.data = compress.pack(data, compress_layers)
+        self.activity = activity.ActivityIndex(data)
         self.ptr = 0
+        self.generation = 0
+        self.source = stretch_cache.source()  # Cache identity of this layer's generations
+        self.rate = 1  # Stored at fs / rate once stretched dark enough
         self.is_active = True
         self.volume = volume
+        self.pending = None  # Next generation, built by the evolver
+        self.buf = np.zeros(0, dtype=np.float32)
 
     def get_samples(self, frames):
         if not self.is_active:
-            return np.zeros(frames, dtype=np.float32)
+            return None
+        if self.pending is None:
+            evolver.request(self)
         
-        n_samples = len(self.data)
-        indices = (np.arange(self.ptr, self.ptr + frames)) % n_samples
-        chunk = self.data[indices]
+        n_samples = len(self.data) * self.rate
+        chunk = None  # None (nothing to mix) while the index says this read is silent
+        if not activity.mixing.skip(self.activity, self.ptr, frames, self.rate):
+            if len(self.buf) < frames:
+                self.buf = np.zeros(frames, dtype=np.float32)
+            chunk = tier_store.read(self.data, self.rate, self.ptr, self.buf[:frames])
+            np.multiply(chunk, self.volume, out=chunk)
+        budget.touch(self)
         
         self.ptr += frames
         if self.ptr >= n_samples:
             self.ptr = 0
-            self.evolve()
-            
-        return chunk * self.volume
-
-    def evolve(self):
-        n_old = len(self.data)
-        n_new = int(n_old * stretch_factor)
-        new_indices = np.linspace(0, n_old - 1, n_new)
-        stretched = np.interp(new_indices, np.arange(n_old), self.data)
-        
-        max_val = np.max(np.abs(stretched))
-        if max_val > 0:
-            stretched = stretched / max_val
+            evolver.advance(self)  # Swaps in the next generation if the worker has it ready
             
-        self.data = stretched.astype(np.float32)
+        return chunk
 
 # --- Global State ---
 layers = []
 master_history = [] 
 lock = threading.Lock()
+input_ring = capture.InputRing(fs)  # Microphone side of the duplex stream; seeds are sliced from it
+mix_buffer = np.zeros(0, dtype=np.float32)
 
+@stage("callback")
 def audio_callback(outdata, frames, time_info, status):
-    mixed = np.zeros(frames, dtype=np.float32)
-    with lock:
+    global mix_buffer
+    if len(mix_buffer) < frames:
+        mix_buffer = np.zeros(frames, dtype=np.float32)
+    mixed = mix_buffer[:frames]
+    mixed.fill(0)
+    with lock, stage("mix"):
         for layer in layers:
-            mixed += layer.get_samples(frames)
+            chunk = layer.get_samples(frames)
+            if chunk is not None:
+                mixed += chunk
     
-    final_signal = np.tanh(mixed * 1.2)
-    final_signal = np.clip(final_signal, -1.0, 1.0)
+    final_signal = dsp.drive(mixed, 1.2, out=mixed)
+    final_signal = dsp.clip(final_signal, out=final_signal)
     outdata[:, 0] = final_signal
     
     # Track the output history for the Grand Loop resampling
     master_history.append(final_signal.copy())
 
-def grand_loop_processor():
-    global master_history, layers
+def archive_layer(layer):
+    archive.spill(layer.data, volume=layer.volume, rate=layer.rate, generation=layer.generation)
+
+def evict_layer(layer):
+    with lock:
+        if layer in layers:
+            layers.remove(layer)
+    archive_layer(layer)
+
+def add_layer(layer):
+    retired = None
+    with lock:
+        layers.append(layer)
+        budget.register("aardvark", layer, on_evict=evict_layer)
+        # Cleanup: Prevent the list from growing infinitely (Keep last 25 layers)
+        if len(layers) > 25:
+            retired = layers.pop(0)
+    if retired is not None:
+        budget.unregister(retired)
+        archive_layer(retired)
+
+@stage("recall")
+def recall_layers(count=archive_recall):
+    """Brings archived layers back; their samples page in from disk as they play."""
+    for _ in range(count):
+        recalled = archive.recall()
+        if recalled is None:
+            return
+        data, meta = recalled
+        layer = Layer(data, volume=meta["volume"])
+        layer.rate, layer.generation = meta["rate"], meta["generation"]
+        add_layer(layer)
+
+@stage("resample_master")
+def resample_master():
+    """Turns the output heard since the last cycle into a new foundation layer."""
+    global master_history
+    with lock:
+        if not master_history:
+            return
+        recorded_mix = np.concatenate(master_history)
+        master_history = [] # Reset history
     
+    target_samples = int(grand_loop_dur * fs)
+    if len(recorded_mix) > target_samples:
+        recorded_mix = recorded_mix[-target_samples:]
+    
+    # Add the master resample as a low-volume foundation layer
+    add_layer(Layer(recorded_mix, volume=0.1))
+
+@stage("harvest")
+def harvest_seeds(count=5):
+    """
+    Slices `count` seeds off the duplex stream's input ring, spaced on the
+    input clock as the old back-to-back sd.rec calls were (capture_dur each,
+    stagger_delay apart); each joins as soon as its last sample is in.
+    """
+    length = int(capture_dur * fs)
+    step = length + int(stagger_delay * fs)
+    start = input_ring.written
+    for i in range(count):
+        print(f"   > Harvesting Mic Seed {i+1}/5...")
+        begin = start + i * step
+        if not input_ring.wait(begin + length, timeout=step / fs + 5):
+            print("   > No input from the stream, harvest skipped")
+            return
+        add_layer(Layer(input_ring.read(begin, length), volume=0.15))
+
+def grand_loop_processor():
     while True:
         # Wait for the next 15-second cycle
         time.sleep(grand_loop_dur)
         
         print(f"\n--- [Cycle Triggered] Resampling Output & Harvesting New Seeds ---")
+        print(f"   {stretch_cache.report()}")
+        print(f"   {tier_store.report()}")
+        print(f"   {evolver.report()}")
+        print(f"   {activity.mixing.report(fs)}")
         
         # 1. Resample the Master Output (The "Grand Loop")
-        with lock:
-            if master_history:
-                recorded_mix = np.concatenate(master_history)
-                master_history = [] # Reset history
-                
-                target_samples = int(grand_loop_dur * fs)
-                if len(recorded_mix) > target_samples:
-                    recorded_mix = recorded_mix[-target_samples:]
-                
-                # Add the master resample as a low-volume foundation layer
-                new_grand = Layer(recorded_mix, volume=0.1)
-                layers.append(new_grand)
-
-        # 2. Capture 5 New Seeds from Mic (Background)
-        # We do this in a sub-loop so the main Grand Loop can eventually restart
-        for i in range(5):
-            print(f"   > Harvesting Mic Seed {i+1}/5...")
-            # Use blocking=True here because we are in a background thread
-            new_rec = sd.rec(int(capture_dur * fs), samplerate=fs, channels=1, blocking=True)
-            
-            new_seed = Layer(new_rec, volume=0.15)
-            with lock:
-                layers.append(new_seed)
-                # Cleanup: Prevent the list from growing infinitely (Keep last 25 layers)
-                if len(layers) > 25:
-                    layers.pop(0)
-            
-            time.sleep(stagger_delay)
+        resample_master()
+
+        # 2. Harvest 5 New Seeds from the stream's input (no device is opened)
+        harvest_seeds()
+
+        # 3. Bring back old material from the disk archive
+        recall_layers()
+
+        # 4. Keep every layer buffer inside the memory budget
+        budget.enforce()
+        print(f"   {budget.report()}")
+        print(f"   {archive.report()}")
+
+def save_snapshot():
+    """Writes every layer (samples, position, generation, ...), the unresampled output and RNG state."""
+    start = time.perf_counter()
+    with lock:
+        saved = [snapshot.layer_state(layer) for layer in layers]
+        history = list(master_history)
+    state = {
+        "layers": saved,
+        "master_history": np.concatenate(history) if history else np.zeros(0, dtype=np.float32),
+        "rng": snapshot.rng_state(),
+    }
+    nbytes = snapshot.save(snapshot_path, state)
+    print(f"\n[Snapshot] {len(saved)} layers, {nbytes / 1e6:.1f} MB -> {snapshot_path} "
+          f"({(time.perf_counter() - start) * 1e3:.0f} ms)")
+
+def restore_snapshot():
+    global master_history
+    start = time.perf_counter()
+    state = snapshot.load(snapshot_path)
+    for saved in state["layers"]:
+        add_layer(snapshot.apply(Layer(saved["data"]), saved))
+    if len(state["master_history"]):
+        master_history = [np.array(state["master_history"])]
+    snapshot.restore_rng(state["rng"])
+    print(f"[Snapshot] Restored {len(layers)} layers from {snapshot_path} "
+          f"in {(time.perf_counter() - start) * 1e3:.0f} ms")
 
 def main():
     global layers
+    profiler.install("aardvark")
     
-    # Initial Start: Capture first 5 seeds
-    print("--- Phase 1: Initial Seed Capture (10 seconds) ---")
-    for i in range(5):
-        print(f"Recording Initial Seed {i+1}/5...")
-        rec = sd.rec(int(capture_dur * fs), samplerate=fs, channels=1, blocking=True)
-        layers.append(Layer(rec, volume=0.2))
+    seeds = None
+    if snapshot.exists(snapshot_path):
+        restore_snapshot()
+    elif stream_first:
+        # Initial Start: the first 5 seeds come off the running stream, each joining as it completes
+        print("--- Stream-first start: 5 seeds join as they are captured ---")
+        seeds = capture.SeedCapture(input_ring, 5, capture_dur, lambda i, rec: add_layer(Layer(rec, volume=0.2)))
+    else:
+        # Initial Start: Capture first 5 seeds
+        print("--- Phase 1: Initial Seed Capture (10 seconds) ---")
+        for i in range(5):
+            print(f"Recording Initial Seed {i+1}/5...")
+            rec = sd.rec(int(capture_dur * fs), samplerate=fs, channels=1, blocking=True)
+            add_layer(Layer(rec, volume=0.2))
+    saves = snapshot.on_signal(save_snapshot)
 
     # Start the Engine
-    with sd.OutputStream(channels=1, samplerate=fs, callback=audio_callback):
+    # One duplex stream for the whole run: its input side feeds every seed and harvest
+    with sd.Stream(channels=1, samplerate=fs, callback=input_ring.duplex(audio_callback)):
+        if seeds is not None:
+            seeds.start()
         # Kick off the periodic harvester/resampler
         threading.Thread(target=grand_loop_processor, daemon=True).start()
         
         print("\n--- System Operational: Press Ctrl+C to Stop ---")
         while True:
-            time.sleep(1)
+            saves.sleep(1)  # Signalled snapshots are written here, not in the handler
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,22 @@
+# churn/__init__.py
+from . import dsp
+from . import jit
+from .scheduler import SampleScheduler, capture_window
+from .admission import AdmissionController
+from .cache import StretchCache
+from .timeline import TimelinePlayer
+from .memory import MemoryBudget
+from .tiers import TierStore
+from .compress import CompressedBuffer
+from .archive import LayerArchive
+from . import snapshot
+from .session import Session
+from .profile import profiler, stage
+from .graph import Graph
+from .resample import Resampler
+from .activity import ActivityIndex
+from .reverb import Reverb
+from .convolve import PartitionedConvolver
+from .capture import InputRing, SeedCapture
+from .accumulator import Accumulator
+from .evolve import Evolver
\ No newline at end of file
@@ -0,0 +1,129 @@
+# churn/accumulator.py
+import atexit
+import os
+import tempfile
+
+import numpy as np
+
+from churn import dsp
+
+BLOCK = 4096       # Samples per entry of the running peak index
+CHUNK = 16         # Blocks mixed per pass, so a chunk is still in cache when its peaks are taken
+GROWTH = 1.5       # Capacity multiplier when a layer outgrows the buffer
+
+
+class Accumulator:
+    """
+    Running sum of layers that all start at sample 0 (isabella's and johan's
+    ghosts over their source), in one float32 buffer whose capacity grows
+    geometrically, so mixing a layer in is an in-place add over that layer's
+    length instead of a fresh buffer plus a re-add of the whole history.
+
+    A per-block peak index is refreshed only for the blocks a layer touches,
+    so the peak for normalization is a max over blocks, not a rescan. The
+    buffer holds the sum times `gain`: normalize() folds a new gain in with
+    one in-place scale, and mix() is a view of the buffer (valid until the
+    next add()).
+
+    spill() moves the sum into a writable file mapping. Later adds write
+    through it in place, and growth extends that one file, so an accumulator
+    over budget neither copies its history back into RAM nor leaves old
+    copies on disk; close() deletes the file.
+    """
+
+    def __init__(self, base=None, block=BLOCK):
+        self.block = block
+        self.buf = np.zeros(0, dtype=np.float32)
+        self.peaks = np.zeros(0, dtype=np.float32)  # Per-block max |sample| of the buffer, in buffer units
+        self.length = 0
+        self.gain = 1.0
+        self.grows = 0
+        self.path = None  # Backing file once spilled
+        if base is not None:
+            self.add(base)
+
+    def __len__(self):
+        return self.length
+
+    @property
+    def spilled(self):
+        return self.path is not None
+
+    def _map(self, capacity):
+        # Zero-extends the backing file (samples already in it stay where they are) and maps all of it
+        with open(self.path, "r+b") as f:
+            f.truncate(capacity * 4)
+        return np.memmap(self.path, dtype=np.float32, mode='r+', shape=(capacity,))
+
+    def _reserve(self, n):
+        if n <= len(self.buf):
+            return
+        capacity = max(n, int(len(self.buf) * GROWTH))
+        capacity = -(-capacity // self.block) * self.block
+        if self.spilled:
+            buf = self._map(capacity)
+        else:
+            buf = np.zeros(capacity, dtype=np.float32)
+            buf[:self.length] = self.buf[:self.length]
+        peaks = np.zeros(capacity // self.block, dtype=np.float32)
+        peaks[:len(self.peaks)] = self.peaks
+        self.buf, self.peaks = buf, peaks
+        self.grows += 1
+
+    def add(self, layer):
+        """Mixes `layer` in from sample 0, growing the sum if it is longer."""
+        layer = dsp.as_f32(layer)
+        n = len(layer)
+        self._reserve(n)
+        self.length = max(self.length, n)
+        step = CHUNK * self.block
+        scratch = np.empty(min(step, n), dtype=np.float32)
+        for start in range(0, n, step):
+            k = min(step, n - start)
+            part = np.multiply(layer[start:start + k], np.float32(self.gain), out=scratch[:k])
+            self.buf[start:start + k] += part
+            # Whole blocks: the padding past `length` is zero, so it never raises a peak
+            end = -(-(start + k) // self.block) * self.block
+            frames = self.buf[start:end].reshape(-1, self.block)
+            np.maximum(frames.max(axis=1), -frames.min(axis=1), out=self.peaks[start // self.block:end // self.block])
+
+    def peak(self):
+        """Peak of the sum (not of the scaled buffer)."""
+        used = -(-self.length // self.block)
+        return float(self.peaks[:used].max()) / self.gain if used else 0.0
+
+    def normalize(self, target=1.0, floor=0.0):
+        """Scales the buffer so its peak equals `target` (as dsp.normalize); returns mix()."""
+        used = -(-self.length // self.block)
+        p = float(self.peaks[:used].max()) if used else 0.0
+        if p > floor:
+            ratio = target / p
+            np.multiply(self.buf[:self.length], np.float32(ratio), out=self.buf[:self.length])
+            self.peaks[:used] *= np.float32(ratio)
+            self.gain *= ratio
+        return self.mix()
+
+    def mix(self):
+        return self.buf[:self.length]
+
+    def spill(self, directory=None):
+        """Moves the buffer into a file mapping under `directory` (the temp dir by default)."""
+        if self.spilled:
+            return
+        fd, self.path = tempfile.mkstemp(prefix=f"churn-acc-{os.getpid()}-", suffix=".f32", dir=directory)
+        os.close(fd)
+        atexit.register(self.close)
+        buf = self._map(max(len(self.buf), self.block))
+        buf[:self.length] = self.buf[:self.length]
+        self.buf = buf
+
+    def close(self):
+        """Deletes the backing file (mix() views of it stay readable until released)."""
+        if not self.spilled:
+            return
+        atexit.unregister(self.close)
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+        self.path = None
@@ -0,0 +1,149 @@
+# churn/activity.py
+import numpy as np
+
+from churn import compress, dsp
+from churn.tiers import TAPS
+
+BLOCK = 1024       # Samples per index entry
+MIX_FLOOR = 1e-4   # Block peak under which the mixer skips a layer's read (-80 dBFS)
+GATE = 0.005       # Block peak a capture needs somewhere to count as sound (the old whole-buffer gate)
+
+
+CHUNK = 64         # Blocks decoded per pass when a compressed buffer has to be scanned
+
+
+class ActivityIndex:
+    """
+    Per-block peak and RMS of a stored buffer, computed once when the buffer
+    is made so nothing has to rescan the samples: the mixer asks silent()
+    before reading a layer, normalization takes peak(), and captures are
+    gated (and trimmed) block by block.
+
+    A compressed buffer with the same block size is indexed from its scales
+    alone (a block's peak is its scale * 32767), so recalling a layer from
+    the archive or a snapshot pages in none of its samples; its RMS is only
+    decoded, a chunk at a time, if someone asks for it.
+    """
+
+    def __init__(self, data, block=BLOCK):
+        self.length = n = len(data)
+        self.block = block
+        self._source, self._gain = None, 1.0
+        if isinstance(data, compress.CompressedBuffer):
+            if data.block == block:
+                self.peaks = data.scales * np.float32(32767)
+                self._rms, self._source = None, data
+            else:
+                self.peaks, self._rms = self._scan_compressed(data)
+        else:
+            self.peaks, self._rms = self._scan(dsp.as_f32(data))
+        self._count_loud()
+
+    def _scan(self, data):
+        n, block = len(data), self.block
+        whole = n // block
+        peaks = np.zeros(-(-n // block), dtype=np.float32)
+        rms = np.zeros_like(peaks)
+        frames = data[:whole * block].reshape(whole, block)
+        if whole:
+            np.maximum(frames.max(axis=1), -frames.min(axis=1), out=peaks[:whole])
+            rms[:whole] = np.sqrt(np.einsum('ij,ij->i', frames, frames) / block)
+        if whole < len(peaks):
+            tail = data[whole * block:]
+            peaks[-1] = dsp.peak(tail)
+            rms[-1] = np.sqrt(np.dot(tail, tail) / len(tail))
+        return peaks, rms
+
+    def _scan_compressed(self, data):
+        # CHUNK blocks at a time through one scratch buffer, never the whole layer decoded at once
+        step = CHUNK * self.block
+        scratch = np.empty(min(step, self.length), dtype=np.float32)
+        parts = [self._scan(data.decode(start, scratch[:min(step, self.length - start)]))
+                 for start in range(0, self.length, step)]
+        if not parts:
+            return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.float32)
+        return np.concatenate([p for p, _ in parts]), np.concatenate([r for _, r in parts])
+
+    @property
+    def rms(self):
+        if self._rms is None:
+            self._rms = self._scan_compressed(self._source)[1] * np.float32(self._gain)
+            self._source = None
+        return self._rms
+
+    def _count_loud(self):
+        # loud[k] = blocks before k over MIX_FLOOR; any range checks in O(1) from the audio thread
+        self.loud = [0] + np.cumsum(self.peaks >= MIX_FLOOR).tolist()
+
+    def peak(self):
+        return float(self.peaks.max()) if len(self.peaks) else 0.0
+
+    def scale(self, gain):
+        """Follows the buffer being multiplied by `gain` (e.g. by a normalize)."""
+        self.peaks *= gain
+        if self._rms is None:
+            self._gain *= gain  # Applied when the RMS is decoded
+        else:
+            self._rms *= gain
+        self._count_loud()
+
+    def silent(self, start, n, margin=0):
+        """True when every block under samples [start - margin, start + n + margin) is quiet, wrapping at the end."""
+        loud, length, b = self.loud, self.length, self.block
+        if n + 2 * margin >= length:
+            return loud[-1] == 0
+        start = (start - margin) % length
+        end = start + n + 2 * margin
+        if loud[(min(end, length) - 1) // b + 1] != loud[start // b]:
+            return False
+        return end <= length or loud[(end - length - 1) // b + 1] == 0
+
+    def span(self, threshold=GATE):
+        """(start, end) of the samples from the first to the last block peaking at `threshold` or more; None if none does."""
+        loud = np.flatnonzero(self.peaks >= threshold)
+        if len(loud) == 0:
+            return None
+        return int(loud[0]) * self.block, min(self.length, (int(loud[-1]) + 1) * self.block)
+
+    def active_fraction(self, threshold=MIX_FLOOR):
+        return float(np.mean(self.peaks >= threshold)) if len(self.peaks) else 0.0
+
+
+def gate(data, threshold=GATE):
+    """A capture trimmed to its loud blocks (first to last over `threshold`); None when it has none."""
+    data = dsp.as_f32(data)
+    span = ActivityIndex(data).span(threshold) if len(data) else None
+    if span is None:
+        return None
+    return data[span[0]:span[1]]
+
+
+class MixStats:
+    """Counts the layer reads the mixer skipped because the index said they were silent."""
+
+    def __init__(self):
+        self.reads = 0
+        self.skipped = 0
+        self.skipped_samples = 0
+
+    def skip(self, index, ptr, frames, rate=1):
+        """
+        True (and counted) when a layer's next `frames` output samples from
+        `ptr` are silent. `index` covers the stored data, which is at 1/rate
+        of the output rate; polyphase read-back reaches TAPS samples further.
+        """
+        self.reads += 1
+        margin = TAPS if rate > 1 else 0
+        if not index.silent(ptr // rate, -(-frames // rate) + 1, margin):
+            return False
+        self.skipped += 1
+        self.skipped_samples += frames
+        return True
+
+    def report(self, fs=44100):
+        share = self.skipped / self.reads if self.reads else 0.0
+        return (f"mixer: {self.skipped}/{self.reads} layer reads skipped as silent ({share:.0%}), "
+                f"{self.skipped_samples / fs:.1f} s of layer audio not mixed")
+
+
+mixing = MixStats()
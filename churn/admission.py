@@ -0,0 +1,70 @@
+# churn/admission.py
+import time
+
+
+class AdmissionController:
+    """
+    Decides how many layers may be mixed at once from measured load.
+
+    The callback reports how long each block took against its deadline
+    (frames / fs) and how many worker jobs are still pending. The load limit
+    creeps up while the smoothed utilization sits below `target` and the
+    backlog is empty, and backs off as soon as either runs hot. `cap` is an
+    optional upper bound set from outside (e.g. an artistic oscillation).
+    """
+
+    def __init__(self, fs, target=0.5, floor=1, ceiling=32, max_backlog=4,
+                 smoothing=0.05, hold_sec=0.5):
+        self.fs = fs
+        self.target = target
+        self.floor = floor
+        self.ceiling = ceiling
+        self.max_backlog = max_backlog
+        self.smoothing = smoothing
+        self.hold_samples = int(hold_sec * fs)
+
+        self.limit = floor
+        self.cap = ceiling
+        self.load = 0.0
+        self.peak_load = 0.0
+        self.backlog = 0
+        self.admitted = 0
+        self.rejected = 0
+        self._since_change = 0
+
+    def block_started(self):
+        return time.perf_counter()
+
+    def block_finished(self, started, frames, backlog=0):
+        """Call at the end of the callback with the value returned by block_started()."""
+        utilization = (time.perf_counter() - started) / (frames / self.fs)
+        self.load += self.smoothing * (utilization - self.load)
+        self.peak_load = max(self.peak_load, utilization)
+        self.backlog = backlog
+
+        # Only move the limit once per hold period so it does not chatter
+        self._since_change += frames
+        if self._since_change < self.hold_samples:
+            return
+        self._since_change = 0
+
+        if self.load > self.target or backlog > self.max_backlog:
+            self.limit = max(self.floor, self.limit - 1)
+        elif self.load < self.target * 0.7 and backlog == 0:
+            self.limit = min(self.ceiling, self.limit + 1)
+
+    def allowed(self):
+        return max(self.floor, min(self.limit, self.cap))
+
+    def admit(self, active_count):
+        """Returns True (and counts it) if one more layer fits right now."""
+        if active_count < self.allowed():
+            self.admitted += 1
+            return True
+        self.rejected += 1
+        return False
+
+    def report(self):
+        return (f"load {self.load:.1%} (peak {self.peak_load:.1%}) | "
+                f"limit {self.limit} cap {self.cap} | backlog {self.backlog} | "
+                f"admitted {self.admitted} rejected {self.rejected}")
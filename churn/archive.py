@@ -0,0 +1,149 @@
+# churn/archive.py
+import atexit
+import itertools
+import os
+import random
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from churn.compress import CompressedBuffer
+
+
+class _Segment:
+    """One preallocated, memory-mapped file that layers are appended into."""
+
+    def __init__(self, path, nbytes):
+        self.path = path
+        self.map = np.memmap(path, dtype=np.uint8, mode='w+', shape=(nbytes,))
+        self.used = 0
+        self.keys = []
+
+    def free(self):
+        return len(self.map) - self.used
+
+    def put(self, array):
+        raw = np.ascontiguousarray(array).view(np.uint8).reshape(-1)
+        start = self.used
+        self.map[start:start + len(raw)] = raw
+        self.used += -(-len(raw) // 64) * 64  # Keep every array 64-byte aligned
+        return start
+
+    def view(self, start, dtype, count):
+        out = self.map[start:start + count * np.dtype(dtype).itemsize].view(dtype)
+        out.flags.writeable = False
+        return out
+
+
+class LayerArchive:
+    """
+    Spills cold layers to memory-mapped segment files on local disk.
+
+    spill() copies a layer's samples (float32 or churn.compress format) out
+    of RAM; take()/recall() hand back a read-only view into the mapping, so
+    pages are read from disk only as playback reaches them. Once the files
+    pass max_disk_bytes the oldest segment is dropped with everything in it.
+    Views still playing keep their mapping alive.
+    """
+
+    def __init__(self, name="churn", directory=None, segment_bytes=64 * 1024 * 1024,
+                 max_disk_bytes=4 * 1024 * 1024 * 1024):
+        self.name = name
+        self.directory = directory or tempfile.gettempdir()
+        self.segment_bytes = segment_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.segments = []
+        self.entries = OrderedDict()  # key -> (segment, parts, meta)
+        self.keys = itertools.count()
+        self.counter = itertools.count()
+        self.spilled = 0
+        self.recalled = 0
+        self.dropped = 0
+        self.lock = threading.Lock()
+        atexit.register(self.close)
+
+    def _segment_for(self, nbytes):
+        if self.segments and self.segments[-1].free() >= nbytes:
+            return self.segments[-1]
+        path = os.path.join(self.directory, f"{self.name}-{os.getpid()}-{next(self.counter)}.seg")
+        segment = _Segment(path, max(self.segment_bytes, nbytes))
+        self.segments.append(segment)
+        while len(self.segments) > 1 and self.disk_bytes() > self.max_disk_bytes:
+            self._drop(self.segments.pop(0))
+        return segment
+
+    def _drop(self, segment):
+        for key in segment.keys:
+            if self.entries.pop(key, None) is not None:
+                self.dropped += 1
+        segment.map = None
+        try:
+            os.remove(segment.path)
+        except OSError:
+            pass
+
+    def spill(self, data, **meta):
+        """Writes `data` to disk and returns its key; `meta` comes back with it."""
+        if isinstance(data, CompressedBuffer):
+            arrays = [data.q, data.scales]
+            meta["_compressed"] = (data.length, data.block, data.power)
+        else:
+            arrays = [np.asarray(data, dtype=np.float32).reshape(-1)]
+        nbytes = sum(-(-a.nbytes // 64) * 64 for a in arrays)
+        with self.lock:
+            segment = self._segment_for(nbytes)
+            parts = [(segment.put(a), a.dtype, len(a)) for a in arrays]
+            key = next(self.keys)
+            segment.keys.append(key)
+            self.entries[key] = (segment, parts, meta)
+            self.spilled += 1
+        return key
+
+    def take(self, key):
+        """Removes an entry from the archive and returns (data, meta), data mapped from disk."""
+        with self.lock:
+            segment, parts, meta = self.entries.pop(key)
+            self.recalled += 1
+            views = [segment.view(*part) for part in parts]
+        meta = dict(meta)
+        compressed = meta.pop("_compressed", None)
+        if compressed is None:
+            return views[0], meta
+        length, block, power = compressed
+        return CompressedBuffer.from_parts(views[0], views[1], length, block, power), meta
+
+    def recall(self, choice='random'):
+        """take() of a random (or the 'oldest' / 'newest') entry; None when empty."""
+        with self.lock:
+            if not self.entries:
+                return None
+            keys = list(self.entries)
+        if choice == 'oldest':
+            key = keys[0]
+        elif choice == 'newest':
+            key = keys[-1]
+        else:
+            key = random.choice(keys)
+        try:
+            return self.take(key)
+        except KeyError:  # Dropped between the listing and the take
+            return None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def disk_bytes(self):
+        return sum(len(s.map) for s in self.segments)
+
+    def close(self):
+        atexit.unregister(self.close)
+        with self.lock:
+            for segment in self.segments:
+                self._drop(segment)
+            self.segments = []
+
+    def report(self):
+        return (f"archive: {len(self.entries)} layers on disk ({self.disk_bytes() / 1e6:.0f} MB) | "
+                f"{self.spilled} spilled, {self.recalled} recalled, {self.dropped} dropped")
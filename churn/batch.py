@@ -0,0 +1,125 @@
+# churn/batch.py
+# Run from the repo root with:
+#   python3 -m churn.batch isabella chickens.wav --loops 28 --seeds 8 [--workers N] [--out renders]
+#
+# Renders N seeded variations of a ChickenChurner engine (isabella / johan)
+# headless across a process pool: no prompt, no playback, no sleeping.
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import psutil
+
+
+def render_one(engine, source, loops, seed, out_dir):
+    """Renders one variation in this process; returns its timing/CPU record."""
+    module = importlib.import_module(engine)
+    options = {} if loops is None else {"loops": loops}  # None keeps the engine's own default
+    churner = module.ChickenChurner(base_input=source, headless=True, seed=seed, out_dir=out_dir,
+                                    prefix=f"{engine}_seed{seed:04d}", **options)
+    proc = psutil.Process()
+    start, cpu = time.perf_counter(), time.process_time()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):  # Per-loop banners would interleave across workers
+            churner.perform()
+        wall = time.perf_counter() - start
+        audio_sec = len(churner.accumulator if churner.accumulator is not None else churner.source_audio) / churner.fs
+    finally:
+        # Pool workers are reused: nothing of this variation may outlive it
+        churner.close()
+    return {
+        "seed": seed,
+        "loops": churner.num_loops,
+        "file": churner.created_files[-1],
+        "wall_sec": wall,
+        "cpu_sec": time.process_time() - cpu,
+        "audio_sec": audio_sec,
+        "rss_mb": proc.memory_info().rss / 1e6,
+        "pid": os.getpid(),
+    }
+
+
+def _render_pool(engine, source, loops, seed_list, workers, out_dir, show=True):
+    """Renders `seed_list` on a fresh pool; returns (results, wall seconds including pool start-up)."""
+    start = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        jobs = [pool.submit(render_one, engine, source, loops, seed, out_dir) for seed in seed_list]
+        for job in as_completed(jobs):
+            r = job.result()
+            results.append(r)
+            if show:
+                print(f"seed {r['seed']:>4}: {r['wall_sec']:6.2f} s wall  {r['cpu_sec']:6.2f} s CPU  "
+                      f"{r['audio_sec']:6.1f} s audio  {r['rss_mb']:6.0f} MB  -> {r['file']}")
+    return results, time.perf_counter() - start
+
+
+def run(engine, source, loops=None, seeds=8, workers=None, out_dir="renders", first_seed=0, baseline=True):
+    workers = workers or os.cpu_count() or 1
+    os.makedirs(out_dir, exist_ok=True)
+    source = os.path.abspath(source)
+    print(f"--- Rendering {seeds} x {engine} ({loops or 'default'} loops of {os.path.basename(source)}) "
+          f"on {workers} workers ---")
+
+    results, wall = _render_pool(engine, source, loops, range(first_seed, first_seed + seeds), workers, out_dir)
+    audio = sum(r["audio_sec"] for r in results)
+    throughput = audio / wall if wall else 0.0  # Seconds of rendered audio per wall second
+
+    # Throughput scaling: the same measure on a 1-worker pool given one worker's share of the seeds, so
+    # pool start-up is spread over as many renders as in the batch. (CPU-seconds per wall second would
+    # only show utilization, not finished work.)
+    single = throughput if workers == 1 else None
+    if baseline and workers > 1:
+        share = range(first_seed, first_seed + -(-seeds // workers))
+        print(f"--- 1-worker reference: {len(share)} of the variations ---")
+        with tempfile.TemporaryDirectory() as scratch:
+            ref, ref_wall = _render_pool(engine, source, loops, share, 1, scratch, show=False)
+        single = sum(r["audio_sec"] for r in ref) / ref_wall if ref_wall else 0.0
+    summary = {
+        "engine": engine,
+        "source": source,
+        "loops": results[0]["loops"] if results else loops,
+        "workers": workers,
+        "wall_sec": wall,
+        "cpu_sec": sum(r["cpu_sec"] for r in results),
+        "audio_sec": audio,
+        "throughput": throughput,
+        "throughput_1_worker": single,
+        "speedup": throughput / single if single else None,
+        "runs": sorted(results, key=lambda r: r["seed"]),
+    }
+    with open(os.path.join(out_dir, "summary.json"), "w") as f:
+        json.dump(summary, f, indent=2)
+    line = (f"\n{seeds} variations in {wall:.2f} s | {summary['cpu_sec']:.1f} s CPU | "
+            f"{throughput:.1f} s of audio per wall second on {workers} workers")
+    if summary["speedup"] is not None:
+        line += (f" | 1 worker: {single:.1f} -> speedup {summary['speedup']:.2f}x "
+                 f"({summary['speedup'] / workers:.0%} efficiency)")
+    print(line)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless parallel renders of ChickenChurner variations")
+    parser.add_argument("engine", choices=["isabella", "johan"])
+    parser.add_argument("source", help="WAV file to churn")
+    parser.add_argument("--loops", type=int, default=None, help="iterations per variation (engine default)")
+    parser.add_argument("--seeds", type=int, default=8, help="number of variations")
+    parser.add_argument("--first-seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: all cores)")
+    parser.add_argument("--out", default="renders", help="output directory for WAVs and summary.json")
+    parser.add_argument("--no-baseline", action="store_true",
+                        help="skip the 1-worker reference render the speedup is measured against")
+    args = parser.parse_args(argv)
+    run(args.engine, args.source, args.loops, args.seeds, args.workers, args.out, args.first_seed,
+        not args.no_baseline)
+
+
+if __name__ == "__main__":
+    main()
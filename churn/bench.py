@@ -0,0 +1,482 @@
+# churn/bench.py
+# Run with: python3 -m churn.bench [name ...]
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from churn import dsp, jit
+
+FS = 44100
+
+
+def _timeit(fn, repeat=20):
+    fn()  # Warm up caches / lazy imports
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def _peak_bytes(fn):
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def _report(title, rows):
+    print(f"\n--- {title} ---")
+    for row in rows:
+        print("  " + row)
+
+
+def bench_dsp():
+    """Legacy float64 stretch_and_verb vs the float32 kernels (3 s capture, 1.19x)."""
+    data = (np.random.randn(3 * FS) * 0.1).astype(np.float32)
+    delay = int(FS * 0.15)
+
+    def legacy():
+        n = len(data)
+        idx = np.linspace(0, n - 1, int(n * 1.19))
+        stretched = np.interp(idx, np.arange(n), data.flatten())
+        out = np.zeros_like(stretched)
+        out[delay:] = stretched[:-delay] * 0.4
+        combined = ((stretched + out) * 0.4).astype(np.float32)
+        combined[-2000:] *= np.linspace(1., 0., 2000)
+        return combined
+
+    out = np.empty(int(len(data) * 1.19), dtype=np.float32)
+    scratch = np.empty_like(out)
+
+    def kernels():
+        dsp.stretch(data, 1.19, out=scratch)
+        dsp.delay_reverb(scratch, delay, 0.4, 0.4, out=out)
+        return dsp.fade_out(out, 2000)
+
+    rows = []
+    for name, fn in [("legacy float64", legacy), ("float32 kernels", kernels)]:
+        t = _timeit(fn)
+        peak = _peak_bytes(fn)
+        rows.append(f"{name:<18} {t * 1e3:7.2f} ms/capture  {len(data) / t / 1e6:7.1f} Msamples/s  peak temp {peak / 1e6:6.2f} MB")
+    _report("stretch + reverb + fade (3 s capture)", rows)
+
+    block = np.random.randn(1024).astype(np.float32)
+    mixed = np.empty(1024, dtype=np.float32)
+
+    def legacy_master():
+        return np.clip(np.tanh(block * 1.2), -1.0, 1.0)
+
+    def kernel_master():
+        dsp.drive(block, 1.2, out=mixed)
+        return dsp.clip(mixed, out=mixed)
+
+    rows = []
+    for name, fn in [("legacy", legacy_master), ("kernels out=", kernel_master)]:
+        t = _timeit(fn, repeat=2000)
+        rows.append(f"{name:<18} {t * 1e6:7.2f} us/block  peak temp {_peak_bytes(fn)} B")
+    _report("master drive + clip (1024-frame block)", rows)
+
+
+def bench_jit():
+    """Per-block callback cost of the recursive kernels on each available backend."""
+    from scipy.signal import butter
+
+    frames = 1024
+    block = (np.random.randn(frames) * 0.1).astype(np.float32)
+    out = np.empty(frames, dtype=np.float32)
+    loop = (np.random.randn(2 * FS) * 0.1).astype(np.float32)
+    b, a = butter(2, 2500 / (0.5 * FS))
+    jit.warmup()
+
+    rows = []
+    previous = jit.BACKEND
+    for backend in jit.KERNELS:
+        jit.use_backend(backend)
+        comb = jit.Comb(int(FS * 0.1), 0.3)
+        lpf = jit.IIRFilter(b, a)
+        head = jit.Varispeed(loop, 1 / 1.19)
+        budget = frames / FS
+        for name, fn in [("comb 100 ms", lambda: comb.process(block, out)),
+                         ("biquad low-pass", lambda: lpf.process(block, out)),
+                         ("varispeed 1/1.19", lambda: head.read(out))]:
+            t = _timeit(fn, repeat=2000)
+            rows.append(f"{backend:<6} {name:<17} {t * 1e6:8.2f} us/block  ({t / budget:.2%} of a {frames}-frame deadline)")
+    jit.use_backend(previous)
+
+    whole = (np.random.randn(4 * FS) * 0.1).astype(np.float32)
+
+    def python_loop():
+        d = int(FS * 0.1)
+        y = np.copy(whole)
+        for i in range(d, len(y)):
+            y[i] += y[i - d] * 0.3
+        return y
+
+    t_loop = _timeit(python_loop, repeat=1)
+    rows.append(f"AudioTransformer.reverb python loop (4 s): {t_loop * 1e3:8.1f} ms")
+    for backend in jit.KERNELS:
+        jit.use_backend(backend)
+        t = _timeit(lambda: jit.comb(whole, int(FS * 0.1), 0.3))
+        rows.append(f"AudioTransformer.reverb {backend:<6} (4 s):      {t * 1e3:8.2f} ms")
+    jit.use_backend(previous)
+    _report("recursive kernels", rows)
+
+
+def bench_cache():
+    """Twelve 1.19x generations of a 2 s seed, cold then replayed from the stretch cache."""
+    from churn.cache import StretchCache
+
+    cache = StretchCache(max_bytes=64 * 1024 * 1024)
+    seed = (np.random.randn(2 * FS) * 0.1).astype(np.float32)
+    rows = []
+    for run in ("cold", "warm"):
+        start = time.perf_counter()
+        data = seed
+        for generation in range(1, 13):
+            data = cache.stretch(data, 1.19, generation, target=1.0)
+        rows.append(f"{run}: {(time.perf_counter() - start) * 1e3:7.2f} ms  {cache.report()}")
+    _report("stretch cache", rows)
+
+
+def bench_timeline():
+    """udvar cycle render cost against total samples (5 voices, 2.5 s stagger)."""
+    from churn.timeline import render
+
+    offsets = [int(i * 2.5 * FS) for i in range(5)]
+    rows = []
+    for generation in (1, 5, 10):
+        clips = [np.zeros(int(5 * FS * 1.19 ** generation), dtype=np.float32) for _ in range(5)]
+        total = sum(len(c) for c in clips)
+        t = _timeit(lambda: render(clips, offsets), repeat=5)
+        rows.append(f"generation {generation:>2}: {total / FS:7.1f} s of voices  {t * 1e3:7.2f} ms/cycle  {total / t / 1e6:6.1f} Msamples/s")
+    _report("timeline render", rows)
+
+
+def bench_tiers():
+    """Round-trip error and memory per storage tier over 1.19x generations of a white-noise seed (worst case)."""
+    from churn import tiers
+    from churn.tiers import TierStore
+
+    store = TierStore(FS)
+    data = (np.random.randn(2 * FS) * 0.1).astype(np.float32)
+    rows = []
+    for generation in range(1, 17):
+        data = dsp.normalize(dsp.stretch(data, 1.19))
+        if generation % 3 and generation != 16:
+            continue
+        errors = "  ".join(f"1/{f}: {tiers.error_db(data, f):6.1f} dB" for f in (2, 4))
+        _, factor = store.settle(data)
+        rows.append(f"generation {generation:>2} ({len(data) / FS:5.1f} s)  {errors}  -> stored at {FS // factor} Hz, "
+                    f"{data.nbytes / factor / 1e6:5.2f} MB instead of {data.nbytes / 1e6:5.2f} MB")
+    _report(f"storage tiers (tolerance {store.tolerance_db:.0f} dB)", rows)
+
+    out = np.empty(1024, dtype=np.float32)
+    rows = []
+    for factor in (1, 2, 4):
+        low = tiers.decimate(data, factor)
+        t = _timeit(lambda: tiers.read(low, factor, 12345, out), repeat=2000)
+        rows.append(f"1/{factor} rate read {t * 1e6:7.2f} us/block  (peak temp {_peak_bytes(lambda: tiers.read(low, factor, 12345, out))} B)")
+    _report("full-rate read of a 1024-frame block", rows)
+
+
+def bench_compress():
+    """RAM per layer against mix cost per callback, float32 vs int16 + per-block scales."""
+    from churn import compress
+
+    frames = 1024
+    count = 200
+    layers = [(np.random.randn(10 * FS) * 0.1).astype(np.float32) for _ in range(count)]
+    packed = [compress.pack(layer) for layer in layers]
+    mixed = np.zeros(frames, dtype=np.float32)
+    deadline = frames / FS
+
+    rows = []
+    for name, store in [("float32", layers), ("int16 + scales", packed)]:
+        ram = sum(layer.nbytes for layer in store)
+
+        def callback():
+            mixed.fill(0)
+            for i, layer in enumerate(store):
+                compress.mix(layer, (i * 997) % (len(layer) - frames), mixed)
+
+        t = _timeit(callback, repeat=200)
+        rows.append(f"{name:<15} {ram / 1e6:7.1f} MB for {count} x 10 s layers  "
+                    f"{t * 1e6:8.1f} us/callback ({t / deadline:.1%} of a {frames}-frame deadline)")
+    t = _timeit(lambda: compress.pack(layers[0]), repeat=20)
+    rows.append(f"encode 10 s: {t * 1e3:.2f} ms   round-trip error: {compress.error_db(layers[0]):.1f} dB")
+    _report("compressed layer storage", rows)
+
+
+def bench_profile():
+    """Cost of a profiled stage per call, with the profiler off and on."""
+    from churn.profile import Profiler
+
+    prof = Profiler(directory=None)
+    timed = prof.stage("bench")(lambda: None)
+    block = prof.stage("bench_with")
+    frames = 1024
+    mixed = np.zeros(frames, dtype=np.float32)
+    layer = (np.random.randn(frames) * 0.1).astype(np.float32)
+
+    def with_block():
+        with block:
+            mixed.__iadd__(layer)
+
+    rows = []
+    base = _timeit(lambda: mixed.__iadd__(layer), repeat=100000)
+    for state in ("off", "on"):
+        if state == "on":
+            prof.enable()
+        t_dec = _timeit(timed, repeat=100000)
+        t_with = _timeit(with_block, repeat=100000)
+        rows.append(f"profiler {state:<3}  decorated call {t_dec * 1e9:6.0f} ns   "
+                    f"`with` around a {frames}-sample add {(t_with - base) * 1e9:6.0f} ns over {base * 1e9:.0f} ns")
+    prof.disable(write=False)
+    gil = prof.gil.summary()
+    rows.append(f"sampler at {prof.sample_hz} Hz: {len(prof.stacks)} distinct stacks, "
+                f"wake-up lateness p99 {gil['p99_ms']:.3f} ms")
+    _report("stage timer overhead", rows)
+
+
+def bench_graph():
+    """Whole-buffer AudioTransformer.process against the block-streaming graph (3 s sample)."""
+    from churn import graph
+
+    x = (np.random.randn(3 * FS) * 0.3).astype(np.float32)
+    delay = int(0.1 * FS)
+
+    def whole():
+        y = np.tanh(x * 2.5)
+        return jit.comb(y, delay, 0.3)
+
+    chain = [graph.Gain(0.8), graph.Drive(2.5), graph.Clip(-0.95, 0.95), graph.Comb(delay, 0.3), graph.Fade(2000)]
+    rows = [f"graph: {graph.Graph(chain).describe()}"]
+    t = _timeit(whole, repeat=20)
+    rows.append(f"whole buffer      {t * 1e3:7.2f} ms   first sample out after {len(x) / FS * 1e3:7.1f} ms of input")
+    for block in (64, 256, 1024):
+        g = graph.Graph(chain, block=block)
+        t = _timeit(lambda: g.render(x), repeat=20)
+        rows.append(f"graph block {block:<5} {t * 1e3:7.2f} ms   first sample out after {block / FS * 1e3:7.1f} ms of input")
+
+    # Fused elementwise pass against one numpy pass per node, per 256-sample block
+    blk = x[:256].copy()
+    out = np.empty_like(blk)
+    fused = graph.Fused(chain[:3])
+
+    def separate():
+        np.multiply(blk, 0.8, out=out)
+        np.multiply(out, 2.5, out=out)
+        np.tanh(out, out=out)
+        np.clip(out, -0.95, 0.95, out=out)
+
+    def temporaries():
+        np.clip(np.tanh(blk * 0.8 * 2.5), -0.95, 0.95)
+
+    rows.append(f"gain*drive*clip fused           {_timeit(lambda: fused.process(blk, out), repeat=20000) * 1e6:6.2f} us/block")
+    rows.append(f"gain*drive*clip one op per node {_timeit(separate, repeat=20000) * 1e6:6.2f} us/block")
+    rows.append(f"gain*drive*clip with temporaries {_timeit(temporaries, repeat=20000) * 1e6:5.2f} us/block")
+    _report("streaming effect graph", rows)
+
+
+def bench_resample():
+    """1.19x stretch of a 3 s capture: np.interp against the polyphase resampler at each quality."""
+    from churn import resample
+
+    x = (np.random.randn(3 * FS) * 0.3).astype(np.float32)
+    m = int(len(x) * 1.19)
+    t = np.arange(len(x))
+    tone = np.sin(2 * np.pi * 5000 * t / FS).astype(np.float32)
+    ideal = np.sin(2 * np.pi * 5000 * (np.arange(m) / 1.19) / FS)
+
+    def error_db(y):
+        # Against the exact 5 kHz tone at the output positions, edges excluded
+        err = y[64:-64] - ideal[64:-64]
+        return 10 * np.log10(np.mean(err ** 2) / 0.5)
+
+    def interp():
+        return np.interp(np.linspace(0, len(x) - 1, m), t, x)
+
+    base = _timeit(interp, repeat=20)
+    rows = [f"{'np.interp':<18} {base * 1e3:7.2f} ms  {len(x) / FS / base:7.0f}x real time  "
+            f"(float64 positions + output)",
+            f"{'dsp.stretch':<18} {_timeit(lambda: dsp.stretch(x, 1.19), repeat=20) * 1e3:7.2f} ms"]
+    for quality, (taps, _, _) in resample.QUALITY.items():
+        t_whole = _timeit(lambda: resample.resample(x, 1.19, quality), repeat=20)
+
+        def stream():
+            r = resample.Resampler(1.19, quality)
+            for start in range(0, len(x), 512):
+                r.process(x[start:start + 512])
+
+        t_stream = _timeit(stream, repeat=5)
+        err = error_db(resample.resample(tone, 1.19, quality))
+        rows.append(f"{quality + f' ({taps} taps)':<18} {t_whole * 1e3:7.2f} ms  {base / t_whole:5.1f}x np.interp  "
+                    f"| 512-blocks {t_stream * 1e3:7.2f} ms | 5 kHz error {err:6.1f} dB")
+    _report("polyphase resampler (3 s capture, 1.19x)", rows)
+
+
+def bench_activity():
+    """Mixing 20 looped layers (10 s each, sound in ~30% of them) with and without the activity index."""
+    from churn import activity, compress
+
+    rng = np.random.default_rng(0)
+    layers = []
+    for _ in range(20):
+        x = np.zeros(10 * FS, dtype=np.float32)
+        for start in rng.integers(0, 9 * FS, 3):
+            x[start:start + FS] = rng.standard_normal(FS).astype(np.float32) * 0.2
+        layers.append((compress.pack(x), activity.ActivityIndex(x)))
+    frames, blocks = 512, 10 * FS // 512
+    mixed, chunk = np.zeros(frames, dtype=np.float32), np.zeros(frames, dtype=np.float32)
+
+    def mix(use_index):
+        stats = activity.MixStats()
+        for b in range(blocks):
+            mixed.fill(0)
+            for data, index in layers:
+                if use_index and stats.skip(index, b * frames, frames):
+                    continue
+                np.add(mixed, compress.read(data, b * frames, chunk), out=mixed)
+        return stats
+
+    t_all = _timeit(lambda: mix(False), repeat=3)
+    t_idx = _timeit(lambda: mix(True), repeat=3)
+    stats = mix(True)
+    x = compress.expand(layers[0][0])
+    rows = [f"every layer, every block   {t_all * 1e3:7.1f} ms per 10 s",
+            f"skipping silent blocks     {t_idx * 1e3:7.1f} ms per 10 s  ({t_all / t_idx:.1f}x)",
+            stats.report(FS),
+            f"index build {_timeit(lambda: activity.ActivityIndex(x), repeat=20) * 1e3:.2f} ms per 10 s layer | "
+            f"peak from index {_timeit(lambda: layers[0][1].peak(), repeat=1000) * 1e6:.1f} us "
+            f"vs dsp.peak scan {_timeit(lambda: dsp.peak(x), repeat=100) * 1e6:.0f} us"]
+    _report("activity index", rows)
+
+
+def bench_accumulator():
+    """isabella's merge + mix + normalize over 16 loops of 1.19x-longer ghosts: fresh buffers each loop vs Accumulator."""
+    from churn.accumulator import Accumulator
+
+    loops = 16
+    source = (np.random.randn(3 * FS) * 0.1).astype(np.float32)
+    lengths = [int(len(source) * 1.19 ** i) for i in range(1, loops + 1)]
+    longest = (np.random.randn(lengths[-1]) * 0.1).astype(np.float32)
+    ghosts = [longest[:n] for n in lengths]
+
+    def fresh():
+        acc = None
+        for ghost in ghosts:
+            if acc is None:
+                acc = ghost
+            else:
+                temp = np.zeros(max(len(acc), len(ghost)), dtype=np.float32)
+                temp[:len(acc)] += acc
+                temp[:len(ghost)] += ghost
+                acc = temp
+            final = np.zeros(max(len(source), len(acc)), dtype=np.float32)
+            final[:len(source)] += source
+            final[:len(acc)] += acc
+            dsp.normalize(final)
+        return final
+
+    def accumulated():
+        acc = Accumulator(source)
+        for ghost in ghosts:
+            acc.add(ghost)
+            final = acc.normalize()
+        return final, acc.grows
+
+    t_fresh = _timeit(fresh, repeat=2)
+    t_acc = _timeit(accumulated, repeat=2)
+    final, grows = accumulated()
+    err = float(np.abs(final - fresh()).max())
+    rows = [f"final mix {lengths[-1] / FS:.0f} s, {sum(lengths) / FS:.0f} s of ghosts mixed",
+            f"fresh buffers per loop  {t_fresh * 1e3:7.1f} ms | peak {_peak_bytes(fresh) / 1e6:6.1f} MB",
+            f"Accumulator             {t_acc * 1e3:7.1f} ms | peak {_peak_bytes(accumulated) / 1e6:6.1f} MB "
+            f"({t_fresh / t_acc:.1f}x, {grows} reallocations) | max diff {err:.1e}"]
+    _report("incremental accumulator", rows)
+
+
+def bench_reverb():
+    """Cost per reverb voice per 256-sample block, per backend, against the old single 150 ms tap."""
+    from churn import reverb
+
+    block = 256
+    x = (np.random.randn(3 * FS) * 0.1).astype(np.float32)
+    blk = x[:block].copy()
+    out = np.empty(block, dtype=np.float32)
+    tap = _timeit(lambda: dsp.delay_reverb(blk, int(FS * 0.15) % block, out=out), repeat=2000)
+    rows = [f"single tap (dsp.delay_reverb)   {tap * 1e6:7.1f} us/block",
+            f"block budget {reverb.BUDGET:.0%} of {block / FS * 1e3:.1f} ms = {reverb.BUDGET * block / FS * 1e6:.0f} us"]
+    jit.warmup()
+    for backend in jit.KERNELS:
+        jit.use_backend(backend)
+        costs = [reverb.Reverb(combs=c).cost(block) for c in (1, 4, 8)]
+        voice = costs[-1]
+        render = _timeit(lambda: reverb.render(x), repeat=5)
+        rows.append(f"{backend:<6} 1 / 4 / 8 combs + 4 allpasses {' / '.join(f'{c * 1e6:.0f}' for c in costs)} us/block | "
+                    f"{voice / (block / FS):.1%} of real time per voice, "
+                    f"{int(reverb.BUDGET * block / FS / voice)} voices in budget | 3 s capture {render * 1e3:.1f} ms")
+    jit.use_backend("numba" if "numba" in jit.KERNELS else "numpy")
+    _report("multi-tap reverb", rows)
+
+
+def bench_convolve():
+    """Cost per 1024-sample callback of a convolution reverb over IR lengths: partitioned vs per-block FFT and direct."""
+    from scipy.signal import fftconvolve
+
+    from churn import convolve
+
+    block = convolve.PARTITION
+    blk = (np.random.randn(block) * 0.1).astype(np.float32)
+    out = np.empty(block, dtype=np.float32)
+    period = block / FS
+    rows = [f"callback period {period * 1e3:.1f} ms"]
+    jit.warmup()
+    for seconds in (0.5, 1, 2, 4, 8):
+        ir = convolve.synthetic_ir(seconds, FS)
+        fft = _timeit(lambda: fftconvolve(blk, ir), repeat=5)
+        direct = _timeit(lambda: np.convolve(blk, ir), repeat=1) if seconds <= 1 else None
+        row = f"IR {seconds:>3} s ({-(-len(ir) // block):3d} parts) | whole-IR FFT {fft * 1e3:6.2f} ms"
+        row += f" | direct {direct * 1e3:6.1f} ms" if direct is not None else " | direct     -   "
+        for backend in jit.KERNELS:
+            jit.use_backend(backend)
+            conv = convolve.PartitionedConvolver(ir, block)
+            conv.process(blk, out)
+            times = []
+            for _ in range(50):
+                start = time.perf_counter()
+                conv.process(blk, out)
+                times.append(time.perf_counter() - start)
+            row += f" | {backend} {np.mean(times) * 1e6:5.0f} us (max {max(times) * 1e6:5.0f}, {np.mean(times) / period:.1%})"
+        rows.append(row)
+    jit.use_backend("numba" if "numba" in jit.KERNELS else "numpy")
+    _report("partitioned convolution", rows)
+
+
+BENCHES = {
+    "dsp": bench_dsp,
+    "jit": bench_jit,
+    "cache": bench_cache,
+    "timeline": bench_timeline,
+    "tiers": bench_tiers,
+    "compress": bench_compress,
+    "profile": bench_profile,
+    "graph": bench_graph,
+    "resample": bench_resample,
+    "activity": bench_activity,
+    "accumulator": bench_accumulator,
+    "reverb": bench_reverb,
+    "convolve": bench_convolve,
+}
+
+
+def main(names):
+    for name in names or BENCHES:
+        BENCHES[name]()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,118 @@
+# churn/cache.py
+import hashlib
+import itertools
+import threading
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+
+from churn import activity, compress, dsp, resample
+
+
+class StretchCache:
+    """
+    LRU of stretched (optionally normalized) buffers under a byte budget.
+
+    Entries are keyed by (content hash, factor, generation, normalize target).
+    Outputs handed back are read-only and remember their own key, so the
+    next generation of an evolving buffer is keyed without re-hashing it,
+    and their ActivityIndex, which also supplies the peak to normalize by.
+    A layer that is repacked between generations (so the array it passes is
+    never one of ours) takes a source() id and is keyed on (id, generation):
+    its samples are then neither hashed nor expanded on a hit.
+    Stretches go through churn.resample at `quality` ('linear' keeps dsp.stretch).
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024, quality='good'):
+        self.max_bytes = max_bytes
+        self.quality = quality
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        self._digests = {}  # id(array) -> (weakref, digest, ActivityIndex) for arrays we produced
+        self._sources = itertools.count()
+
+    def fingerprint(self, data):
+        known = self._digests.get(id(data))
+        if known is not None and known[0]() is data:
+            return known[1]
+        return hashlib.blake2b(np.ascontiguousarray(data), digest_size=16).hexdigest()
+
+    def source(self):
+        """A fresh identity for one evolving buffer (unique in this process)."""
+        return f"source-{next(self._sources)}"
+
+    def _remember(self, array, digest, index):
+        key = id(array)
+        self._digests[key] = (weakref.ref(array, lambda _, key=key: self._digests.pop(key, None)), digest, index)
+
+    def activity(self, data):
+        """The ActivityIndex of an array this cache returned, None for any other array."""
+        known = self._digests.get(id(data))
+        if known is not None and known[0]() is data:
+            return known[2]
+        return None
+
+    def stretch(self, data, factor, generation=0, target=None, source=None):
+        """
+        Stretch (then dsp.normalize to `target` if given), served from the
+        cache when possible. `data` may be compressed; with a `source` id it
+        is only expanded on a miss.
+        """
+        if source is None:
+            data = dsp.as_f32(compress.expand(data))
+            key = (self.fingerprint(data), float(factor), int(generation), target)
+        else:
+            key = (source, float(factor), int(generation), target)
+        with self.lock:
+            hit = self.entries.get(key)
+            if hit is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return hit
+            self.misses += 1
+
+        data = dsp.as_f32(compress.expand(data))
+        if self.quality == 'linear':
+            result = dsp.stretch(data, factor)
+        else:
+            result = resample.resample(data, factor, self.quality)
+        index = activity.ActivityIndex(result)
+        if target is not None:
+            peak = index.peak()
+            dsp.normalize(result, target, known_peak=peak)
+            if peak > 0:
+                index.scale(target / peak)
+        result.flags.writeable = False
+        # The output's own digest is derived from its key: no second hash pass needed
+        self._remember(result, hashlib.blake2b(repr(key).encode(), digest_size=16).hexdigest(), index)
+
+        with self.lock:
+            if key not in self.entries and result.nbytes <= self.max_bytes:
+                self.entries[key] = result
+                self.bytes += result.nbytes
+                while self.bytes > self.max_bytes:
+                    _, old = self.entries.popitem(last=False)
+                    self.bytes -= old.nbytes
+                    self.evictions += 1
+        return result
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self.entries),
+            "bytes": self.bytes,
+            "evictions": self.evictions,
+        }
+
+    def report(self):
+        s = self.stats()
+        return (f"stretch cache: {s['hit_rate']:.0%} hits ({s['hits']}/{s['hits'] + s['misses']}) | "
+                f"{s['entries']} entries, {s['bytes'] / 1e6:.1f} MB of {self.max_bytes / 1e6:.0f} MB")
@@ -0,0 +1,111 @@
+# churn/capture.py
+import threading
+import time
+
+import numpy as np
+
+RING_SEC = 30      # Seconds of input the ring keeps; a range must be read before it is overwritten
+
+
+class InputRing:
+    """
+    The input side of a duplex stream. The callback write()s each block
+    into a mirrored ring and moves the input clock on; any other thread can
+    wait() for a sample position on that clock and read() the range before
+    it, so captures come off the running stream instead of a second device
+    open (a blocking sd.rec) and never stall the audio thread.
+    """
+
+    def __init__(self, fs, seconds=RING_SEC):
+        self.fs = fs
+        self.cap = int(seconds * fs)
+        self.ring = np.zeros(2 * self.cap, dtype=np.float32)
+        self.written = 0            # Input samples seen since the stream opened
+        self.first_block = None     # perf_counter() of the first callback
+        self.cond = threading.Condition()
+
+    def write(self, indata):
+        """Audio thread: appends one input block (frames x channels; channel 0 is kept)."""
+        x = indata[:, 0] if indata.ndim > 1 else indata
+        n = len(x)
+        start = self.written % self.cap
+        k = min(n, self.cap - start)
+        for base in (0, self.cap):
+            self.ring[base + start:base + start + k] = x[:k]
+            self.ring[base:base + n - k] = x[k:]
+        with self.cond:
+            if self.first_block is None:
+                self.first_block = time.perf_counter()
+            self.written += n
+            self.cond.notify_all()
+
+    def wait(self, end, timeout=None):
+        """Blocks until the input clock reaches `end`; False on timeout."""
+        with self.cond:
+            return self.cond.wait_for(lambda: self.written >= end, timeout)
+
+    def read(self, start, n):
+        """A copy of input samples [start, start + n), which must have been written and not yet overwritten."""
+        if start < self.written - self.cap or start + n > self.written:
+            raise ValueError(f"Samples {start}..{start + n} are not in the ring "
+                             f"(holds {max(0, self.written - self.cap)}..{self.written})")
+        begin = start % self.cap
+        return self.ring[begin:begin + n].copy()
+
+    def duplex(self, callback):
+        """An sd.Stream callback that feeds the ring, then runs an output-only `callback`."""
+        def wrapped(indata, outdata, frames, time_info, status):
+            self.write(indata)
+            callback(outdata, frames, time_info, status)
+        return wrapped
+
+
+class SeedCapture:
+    """
+    Stream-first startup: the duplex stream opens at once and a background
+    thread cuts `count` seeds of `seconds` each from its InputRing, back to
+    back, handing each to on_seed(index, data) as soon as its last sample
+    arrives. Time to first sound is one seed instead of all of them.
+
+    Times are taken from construction, so make it before opening the stream.
+    """
+
+    def __init__(self, ring, count, seconds, on_seed):
+        self.ring = ring
+        self.count = count
+        self.length = int(seconds * ring.fs)
+        self.on_seed = on_seed
+        self.launched = time.perf_counter()
+        self.joined = []  # Seconds after launch at which each seed joined the mix
+        self.cond = threading.Condition()
+        self.thread = threading.Thread(target=self._run, daemon=True, name="churn-seeds")
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def _run(self):
+        start = self.ring.written
+        for i in range(self.count):
+            self.ring.wait(start + self.length)
+            self.on_seed(i, self.ring.read(start, self.length))
+            start += self.length
+            with self.cond:
+                self.joined.append(time.perf_counter() - self.launched)
+                self.cond.notify_all()
+        print(self.report())
+
+    def wait(self, seeds=None, timeout=None):
+        """Blocks until `seeds` (default all) have joined; False on timeout."""
+        seeds = self.count if seeds is None else seeds
+        with self.cond:
+            return self.cond.wait_for(lambda: len(self.joined) >= seeds, timeout)
+
+    def report(self):
+        first = self.ring.first_block
+        live = f"{(first - self.launched) * 1e3:.0f} ms" if first is not None else "not yet"
+        joined = " / ".join(f"{t:.2f}" for t in self.joined) or "none yet"
+        sequential = self.count * self.length / self.ring.fs
+        sound = f"{self.joined[0]:.2f} s" if self.joined else "pending"
+        return (f"startup: stream live {live} after launch | seeds joined at {joined} s | "
+                f"first sound {sound} (recording all {self.count} first: {sequential:.1f} s + stream open)")
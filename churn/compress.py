@@ -0,0 +1,124 @@
+# churn/compress.py
+import threading
+
+import numpy as np
+
+from churn import dsp
+
+BLOCK = 1024  # Samples sharing one scale factor
+
+_local = threading.local()
+
+
+def _scratch(n):
+    buf = getattr(_local, "buf", None)
+    if buf is None or len(buf) < n:
+        buf = _local.buf = np.empty(n, dtype=np.float32)
+    return buf[:n]
+
+
+class CompressedBuffer:
+    """
+    int16 samples with one float32 scale per BLOCK: half the size of a
+    float32 buffer, quantization noise ~90 dB under each block's peak.
+    Decoding is one vectorized multiply over the blocks a read touches.
+    """
+
+    def __init__(self, data, block=BLOCK):
+        data = dsp.as_f32(data)
+        self.length = len(data)
+        self.block = block
+        blocks = -(-len(data) // block)
+        frames = np.zeros((blocks, block), dtype=np.float32)
+        frames.reshape(-1)[:len(data)] = data
+        peaks = np.maximum(frames.max(axis=1), -frames.min(axis=1))
+        # A silent block keeps scale 0, so scale * 32767 is every block's decoded peak
+        self.scales = (peaks / 32767).astype(np.float32)
+        np.divide(frames, self.scales[:, None], out=frames, where=self.scales[:, None] > 0)
+        self.q = np.rint(frames, out=frames).astype(np.int16).reshape(-1)
+        self.power = float(np.dot(data, data)) / len(data) if len(data) else 0.0
+
+    @classmethod
+    def from_parts(cls, q, scales, length, block=BLOCK, power=0.0):
+        """Wraps already-encoded arrays (e.g. mapped from disk) without copying them."""
+        buf = cls.__new__(cls)
+        buf.q, buf.scales, buf.length, buf.block, buf.power = q, scales, length, block, power
+        return buf
+
+    def __len__(self):
+        return self.length
+
+    @property
+    def nbytes(self):
+        return self.q.nbytes + self.scales.nbytes
+
+    def decode(self, start, out, add=False):
+        """Decodes samples [start, start + len(out)) into `out` (or adds them when `add`)."""
+        n = len(out)
+        if n == 0:
+            return out
+        b = self.block
+        first, last = start // b, (start + n - 1) // b + 1
+        tmp = _scratch((last - first) * b)
+        np.multiply(self.q[first * b:last * b].reshape(-1, b), self.scales[first:last, None],
+                    out=tmp.reshape(-1, b))
+        seg = tmp[start - first * b:start - first * b + n]
+        if add:
+            out += seg
+        else:
+            out[:] = seg
+        return out
+
+    def loop_read(self, ptr, out):
+        """dsp.loop_read for a compressed loop."""
+        frames = len(out)
+        ptr %= self.length
+        done = 0
+        while done < frames:
+            k = min(frames - done, self.length - ptr)
+            self.decode(ptr, out[done:done + k])
+            done += k
+            ptr = (ptr + k) % self.length
+        return out
+
+    def expand(self):
+        return self.decode(0, np.empty(self.length, dtype=np.float32))
+
+
+def pack(data, enabled=True, block=BLOCK):
+    """CompressedBuffer of `data` when enabled, otherwise a flat float32 array."""
+    if isinstance(data, CompressedBuffer):
+        return data
+    if not enabled:
+        return dsp.as_f32(data)
+    return CompressedBuffer(data, block)
+
+
+def expand(data):
+    """float32 samples of either storage format."""
+    return data.expand() if isinstance(data, CompressedBuffer) else data
+
+
+def read(data, ptr, out):
+    """Looping read from either storage format."""
+    if isinstance(data, CompressedBuffer):
+        return data.loop_read(ptr, out)
+    return dsp.loop_read(data, ptr, out)
+
+
+def mix(data, start, out):
+    """Adds data[start:start + len(out)] into `out` from either storage format."""
+    if isinstance(data, CompressedBuffer):
+        return data.decode(start, out, add=True)
+    out += data[start:start + len(out)]
+    return out
+
+
+def error_db(data, block=BLOCK):
+    """Round-trip error of the int16 format relative to the signal, in dB."""
+    data = dsp.as_f32(data)
+    err = CompressedBuffer(data, block).expand() - data
+    sig = float(np.dot(data, data))
+    if sig <= 0:
+        return -np.inf
+    return 10 * np.log10(max(float(np.dot(err, err)), 1e-30) / sig)
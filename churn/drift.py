@@ -0,0 +1,173 @@
+# churn/drift.py
+import numpy as np
+
+POLICIES = ('resync', 'crossfade', 'ratematch')
+
+
+class DriftBuffer:
+    """
+    FIFO between a producer that makes more samples than the output plays
+    (a streaming stretch) and a fixed-rate output callback. The level is
+    held near `target` samples of latency by an explicit drift policy
+    instead of letting it grow until a hard flush:
+
+      'resync'    - every resync_sec, jump the read head back to `target` (hard cut)
+      'crossfade' - once the level passes target + fade, skip the excess under a
+                    `fade`-sample crossfade
+      'ratematch' - read up to max_dev faster, servoed on the level, so small
+                    drift is absorbed without a cut; anything beyond that is
+                    crossfaded out as above
+
+    Samples are mirrored into a double-length ring so every read is a slice
+    (or one gather for fractional rates) without wrap-around handling.
+    """
+
+    def __init__(self, fs, target=2048, policy='crossfade', fade=512, capacity_sec=2.0,
+                 resync_sec=1.0, max_dev=0.02, hysteresis=4096):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown drift policy {policy!r} (choose from {POLICIES})")
+        self.fs = fs
+        self.target = int(target)
+        self.policy = policy
+        self.fade = int(fade)
+        self.cap = max(int(capacity_sec * fs), 4 * (self.target + self.fade + hysteresis))
+        self.ring = np.zeros(2 * self.cap, dtype=np.float32)
+        self.resync_every = int(resync_sec * fs)
+        self.max_dev = max_dev
+        self.hysteresis = hysteresis
+        self.w = 0          # Samples written so far
+        self.r = 0.0        # Read position in the same count (fractional under 'ratematch')
+        self.rate = 1.0
+        self.integral = 0.0
+        self.skip = 0       # Samples being crossfaded out, 0 when no crossfade is running
+        self.xpos = 0
+        self.since_resync = 0
+        self.started = False
+        self.a = np.zeros(0, dtype=np.float32)
+        self.b = np.zeros(0, dtype=np.float32)
+        # Stats
+        self.dropped = 0
+        self.cuts = 0
+        self.underruns = 0
+        self.overruns = 0
+        self.peak_level = 0
+
+    def level(self):
+        return self.w - self.r
+
+    # --- Producer side ---
+
+    def write(self, x):
+        n = len(x)
+        if n == 0:
+            return
+        if n > self.cap:
+            x = x[-self.cap:]
+            n = self.cap
+        if self.level() + n > self.cap:  # Only if the policy can't keep up; drop the oldest
+            excess = self.level() + n - self.cap
+            self.r += excess
+            self.dropped += int(excess)
+            self.overruns += 1
+        start = self.w % self.cap
+        k = min(n, self.cap - start)
+        for base in (0, self.cap):
+            self.ring[base + start:base + start + k] = x[:k]
+            self.ring[base:base + n - k] = x[k:]
+        self.w += n
+        self.peak_level = max(self.peak_level, int(self.level()))
+
+    # --- Output side ---
+
+    def _read(self, pos, rate, out):
+        n = len(out)
+        if rate == 1.0 and pos == int(pos):
+            start = int(pos) % self.cap
+            out[:] = self.ring[start:start + n]
+            return out
+        p = pos + rate * np.arange(n)
+        i = np.floor(p).astype(np.intp)
+        frac = (p - i).astype(np.float32)
+        i %= self.cap
+        np.subtract(self.ring[i + 1], self.ring[i], out=out)
+        out *= frac
+        out += self.ring[i]
+        return out
+
+    def _scratch(self, n):
+        if len(self.a) < n:
+            self.a = np.zeros(n, dtype=np.float32)
+            self.b = np.zeros(n, dtype=np.float32)
+        return self.a[:n], self.b[:n]
+
+    def _servo(self, n):
+        # PI controller on the latency error; clamped to +-max_dev around 1.0
+        err = (self.level() - self.target) / max(self.target, 1)
+        self.integral = float(np.clip(self.integral + err * n / self.fs, -1.0, 1.0))
+        self.rate = 1.0 + float(np.clip(0.05 * err + 0.02 * self.integral, -self.max_dev, self.max_dev))
+
+    def read(self, out):
+        """Fills `out` with the next len(out) samples at the current drift correction."""
+        n = len(out)
+        if not self.started:
+            if self.level() < self.target:
+                out[:] = 0
+                return out
+            self.started = True
+
+        if self.policy == 'ratematch':
+            self._servo(n)
+        if self.policy == 'resync':
+            self.since_resync += n
+            if self.since_resync >= self.resync_every:
+                self.since_resync = 0
+                if self.level() > self.target + n:
+                    jump = int(self.level() - self.target)
+                    self.r += jump
+                    self.dropped += jump
+                    self.cuts += 1
+        elif self.skip == 0:
+            excess = self.level() - n * self.rate - self.target
+            if excess > self.fade + self.hysteresis:
+                self.skip = int(excess - self.fade)
+                self.xpos = 0
+
+        need = n * self.rate + 1 + self.skip
+        if self.level() < need:
+            # Underrun: play what is there, then wait for `target` samples again
+            self.underruns += 1
+            self.started = False
+            self.skip = 0
+            k = max(0, int(self.level()) - 1)
+            self._read(self.r, 1.0, out[:k])
+            out[k:] = 0
+            self.r += k
+            return out
+
+        if self.skip:
+            a, b = self._scratch(n)
+            self._read(self.r, self.rate, a)
+            self._read(self.r + self.skip, self.rate, b)
+            t = np.arange(self.xpos, self.xpos + n, dtype=np.float32)
+            np.minimum(t / self.fade, 1.0, out=t)
+            np.subtract(b, a, out=out)
+            out *= t
+            out += a
+            self.xpos += n
+            self.r += n * self.rate
+            if self.xpos >= self.fade:
+                self.r += self.skip
+                self.dropped += self.skip
+                self.cuts += 1
+                self.skip = 0
+            return out
+
+        self._read(self.r, self.rate, out)
+        self.r += n * self.rate
+        return out
+
+    def report(self):
+        ms = 1e3 / self.fs
+        return (f"drift[{self.policy}]: latency {self.level() * ms:.0f} ms (target {self.target * ms:.0f}, "
+                f"peak {self.peak_level * ms:.0f}) | rate {self.rate:.4f} | {self.cuts} cuts, "
+                f"{self.dropped / self.fs:.1f} s skipped | {self.underruns} underruns, {self.overruns} overruns")
@@ -0,0 +1,188 @@
+# churn/dsp.py
+import numpy as np
+
+# Output samples handled per pass in stretch(); bounds its scratch memory
+CHUNK = 16384
+
+_curves = {}
+
+
+def as_f32(data):
+    """Flattens to a float32 vector without copying when it already is one."""
+    data = np.asarray(data)
+    if data.ndim > 1:
+        data = data.reshape(-1)
+    if data.dtype != np.float32:
+        data = data.astype(np.float32)
+    return data
+
+
+def _target(data, out, n):
+    if out is None:
+        return np.empty(n, dtype=np.float32)
+    return out[:n]
+
+
+def stretch(data, factor, out=None):
+    """
+    Linear resample to int(len * factor) samples, endpoints aligned
+    (the same grid as np.linspace(0, n - 1, m) + np.interp), in float32.
+    Positions are computed in float64 a chunk at a time so long buffers keep
+    their fractional precision without a float64 copy of the whole output.
+    """
+    data = as_f32(data)
+    n = len(data)
+    m = int(n * factor)
+    out = _target(data, out, m)
+    if m == 0:
+        return out
+    if n < 2 or m < 2:
+        out[:] = data[0] if n else 0.0
+        return out
+
+    step = (n - 1) / (m - 1)
+    c = min(CHUNK, m)
+    base = np.arange(c, dtype=np.float64)
+    pos = np.empty(c, dtype=np.float64)
+    idx = np.empty(c, dtype=np.intp)
+    frac = np.empty(c, dtype=np.float32)
+    nxt = np.empty(c, dtype=np.float32)
+
+    for start in range(0, m, c):
+        k = min(c, m - start)
+        p, i, f, b, o = pos[:k], idx[:k], frac[:k], nxt[:k], out[start:start + k]
+        np.add(base[:k], start, out=p)
+        np.multiply(p, step, out=p)
+        np.copyto(i, p, casting='unsafe')  # floor, positions are >= 0
+        np.minimum(i, n - 2, out=i)
+        np.subtract(p, i, out=p)
+        np.copyto(f, p, casting='same_kind')
+        np.take(data, i, out=o)
+        np.add(i, 1, out=i)
+        np.take(data, i, out=b)
+        np.subtract(b, o, out=b)
+        np.multiply(b, f, out=b)
+        np.add(o, b, out=o)
+    return out
+
+
+def delay_reverb(data, delay, decay=0.4, gain=0.5, out=None):
+    """(x + x delayed by `delay` samples * decay) * gain. `out` must not overlap `data`."""
+    if out is None:
+        out = np.empty_like(data, dtype=np.float32)
+    if 0 < delay < len(data):
+        np.multiply(data[:-delay], decay, out=out[delay:])
+        np.add(out[delay:], data[delay:], out=out[delay:])
+        out[:delay] = data[:delay]
+    else:
+        out[:] = data
+    np.multiply(out, gain, out=out)
+    return out
+
+
+def fade_curve(n, power=1.0, rising=True):
+    """Cached float32 ramp (0 -> 1 when rising), shaped by `power`."""
+    key = (n, power, rising)
+    curve = _curves.get(key)
+    if curve is None:
+        curve = np.linspace(0.0, 1.0, n, dtype=np.float32) if rising else np.linspace(1.0, 0.0, n, dtype=np.float32)
+        if power != 1.0:
+            np.power(curve, power, out=curve)
+        curve.flags.writeable = False
+        _curves[key] = curve
+    return curve
+
+
+def fade_in(data, n, power=1.0, out=None):
+    if out is None:
+        out = data
+    elif out is not data:
+        out[:] = data
+    n = min(n, len(out))
+    if n > 0:
+        out[:n] *= fade_curve(n, power, rising=True)
+    return out
+
+
+def fade_out(data, n, power=1.0, out=None):
+    if out is None:
+        out = data
+    elif out is not data:
+        out[:] = data
+    n = min(n, len(out))
+    if n > 0:
+        out[len(out) - n:] *= fade_curve(n, power, rising=False)
+    return out
+
+
+def drive(data, gain, out=None):
+    """tanh soft clip of data * gain."""
+    if out is None:
+        out = np.empty_like(data, dtype=np.float32)
+    np.multiply(data, gain, out=out)
+    return np.tanh(out, out=out)
+
+
+def peak(data):
+    """max(|x|) without allocating an abs() copy."""
+    if len(data) == 0:
+        return 0.0
+    return float(max(data.max(), -data.min()))
+
+
+def normalize(data, target=1.0, floor=0.0, out=None, known_peak=None):
+    """
+    Scales so the peak equals `target`; untouched if the peak is <= floor.
+    `known_peak` (e.g. from an ActivityIndex) saves the scan for it.
+    """
+    if out is None:
+        out = data
+    elif out is not data:
+        out[:] = data
+    p = peak(data) if known_peak is None else known_peak
+    if p > floor:
+        np.multiply(out, target / p, out=out)
+    return out
+
+
+def clip(data, lo=-1.0, hi=1.0, out=None):
+    return np.clip(data, lo, hi, out=out)
+
+
+def fold(data, n, out=None):
+    """Wraps everything past `n` samples back onto the start (overlap-add), leaving n samples."""
+    if out is None:
+        out = np.array(data[:n], dtype=np.float32)
+    else:
+        out[:] = data[:n]
+    for start in range(n, len(data), n):
+        chunk = data[start:start + n]
+        out[:len(chunk)] += chunk
+    return out
+
+
+def loop_read(data, ptr, out):
+    """Copies len(out) samples from a looping buffer starting at `ptr` (wraps around)."""
+    n = len(data)
+    frames = len(out)
+    ptr %= n
+    done = 0
+    while done < frames:
+        k = min(frames - done, n - ptr)
+        out[done:done + k] = data[ptr:ptr + k]
+        done += k
+        ptr = (ptr + k) % n
+    return out
+
+
+def push(fifo, block):
+    """Rolls `block` onto the end of a FIFO in place (np.roll allocates a new array)."""
+    k = len(block)
+    if k == 0:
+        return fifo
+    if k >= len(fifo):
+        fifo[:] = block[-len(fifo):]
+        return fifo
+    fifo[:-k] = fifo[k:]
+    fifo[-k:] = block
+    return fifo
@@ -0,0 +1,48 @@
+# churn/evolve.py
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Evolver:
+    """
+    Builds each layer's next generation on a worker thread while the
+    current one plays, so the stretch, tier settle, activity index and
+    repack never run in the audio callback.
+
+    build(data, rate, generation, source) -> (data, rate, activity, generation)
+    runs on the worker. At the loop point the callback calls advance(): a
+    finished generation is swapped in by plain attribute assignment and the
+    next one is requested; an unfinished one leaves the layer replaying its
+    current generation (counted as late) rather than blocking the callback.
+    Layers carry `pending`, a future that snapshots must not save.
+    """
+
+    def __init__(self, build):
+        self.build = build
+        self.pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="churn-evolve")
+        self.swaps = 0
+        self.late = 0
+
+    def request(self, layer):
+        """Starts building the generation after the layer's current one (from its state right now)."""
+        layer.pending = self.pool.submit(self.build, layer.data, layer.rate, layer.generation + 1, layer.source)
+
+    def advance(self, layer):
+        """Audio thread, at the loop point: True when the next generation was swapped in."""
+        pending = layer.pending
+        if pending is None:
+            self.request(layer)
+            return False
+        if not pending.done():
+            self.late += 1
+            return False
+        layer.data, layer.rate, layer.activity, layer.generation = pending.result()
+        self.swaps += 1
+        self.request(layer)
+        return True
+
+    def wait(self):
+        """Returns once every generation requested so far is built (the worker runs them in order)."""
+        self.pool.submit(int).result()
+
+    def report(self):
+        return f"evolve: {self.swaps} generations swapped in, {self.late} loops replayed while one was building"
@@ -0,0 +1,418 @@
+# churn/graph.py
+# Block-streaming effect graph: the same chain of stateful nodes runs in a
+# real-time callback (one block of latency) or offline over a whole buffer.
+import abc
+import copy
+import math
+
+import numpy as np
+from scipy.signal import butter
+
+from churn import dsp, jit, resample
+
+BLOCK = 256  # Samples per pass through the graph (the graph's latency)
+
+# Elementwise op codes; runs of adjacent elementwise nodes are fused into one in-place step
+GAIN, DRIVE, CLIP, FADE = 0, 1, 2, 3
+
+
+# --- Fused elementwise pass ---
+
+def _fade(out, pos, fade_in, fade_out, length):
+    n = len(out)
+    if pos < fade_in:
+        k = int(min(n, fade_in - pos))
+        ramp = np.arange(pos, pos + k, dtype=np.float32)
+        out[:k] *= ramp / max(fade_in - 1, 1)
+    if length > 0 and fade_out > 0 and pos + n > length - fade_out:
+        start = int(max(0, length - fade_out - pos))
+        ramp = np.arange(pos + start, pos + n, dtype=np.float32)
+        np.subtract(length - 1, ramp, out=ramp)
+        np.maximum(ramp, 0, out=ramp)
+        out[start:] *= ramp / max(fade_out - 1, 1)
+
+
+def _chain(x, ops, pos, out):
+    """
+    The ops one after another, in place on `out`: no temporaries, and at
+    block size the buffer stays in cache from the first op to the last.
+    (numpy's vectorized tanh beats a per-sample compiled loop here.)
+    """
+    if out is not x:
+        np.copyto(out, x)
+    for code, (p0, p1, p2) in ops:
+        if code == GAIN:
+            out *= p0
+        elif code == DRIVE:
+            out *= p0
+            np.tanh(out, out=out)
+        elif code == CLIP:
+            np.clip(out, p0, p1, out=out)
+        else:
+            _fade(out, pos, p0, p1, p2)
+    return out
+
+
+# --- Nodes ---
+
+class Node(abc.ABC):
+    """One stage of a Graph. process(x, out) writes into `out` and returns the filled part."""
+
+    elementwise = False
+
+    def out_length(self, n):
+        return n
+
+    @abc.abstractmethod
+    def process(self, x, out):
+        """Output for input block `x`, written into (the start of) `out`."""
+
+    def reset(self):
+        pass
+
+
+class Elementwise(Node):
+    """
+    A per-sample op (`self.op`). A Graph fuses every run of these into one
+    Fused node; run on its own, one behaves as a Fused of itself.
+    """
+    elementwise = True
+    pos = 0
+
+    def process(self, x, out):
+        out = out[:len(x)]
+        _chain(x, [self.op], self.pos, out)
+        self.pos += len(x)
+        return out
+
+    def reset(self):
+        self.pos = 0
+
+
+class Gain(Elementwise):
+    def __init__(self, gain):
+        self.op = (GAIN, (gain, 0.0, 0.0))
+
+
+class Drive(Elementwise):
+    """tanh soft clip of x * gain (dsp.drive)."""
+
+    def __init__(self, gain):
+        self.op = (DRIVE, (gain, 0.0, 0.0))
+
+
+class Clip(Elementwise):
+    def __init__(self, lo=-1.0, hi=1.0):
+        self.op = (CLIP, (lo, hi, 0.0))
+
+
+class Fade(Elementwise):
+    """
+    Linear fade in over the first `fade_in` samples and, when the total
+    length is known (offline), fade out over the last `fade_out`.
+    """
+
+    def __init__(self, fade_in=0, fade_out=0, length=0):
+        self.op = (FADE, (fade_in, fade_out, length))
+
+
+class Fused(Node):
+    """A run of elementwise nodes applied in place on one block, gains folded together."""
+
+    def __init__(self, nodes):
+        self.nodes = nodes
+        self.ops = _fold([node.op for node in nodes])
+        self.pos = 0
+
+    def set_length(self, length):
+        for k, (code, params) in enumerate(self.ops):
+            if code == FADE:
+                self.ops[k] = (code, (params[0], params[1], float(length)))
+
+    def process(self, x, out):
+        out = out[:len(x)]
+        _chain(x, self.ops, self.pos, out)
+        self.pos += len(x)
+        return out
+
+    def reset(self):
+        self.pos = 0
+
+
+def _fold(ops):
+    """Merges gain into a following gain or drive, so each costs nothing extra."""
+    folded = []
+    for code, params in ops:
+        if folded and folded[-1][0] == GAIN and code in (GAIN, DRIVE):
+            _, (g, _, _) = folded.pop()
+            params = (params[0] * g, params[1], params[2])
+        folded.append((code, tuple(float(p) for p in params)))
+    return folded
+
+
+class Echo(Node):
+    """x + decay * x delayed by `delay` samples (the feed-forward half of dsp.delay_reverb)."""
+
+    def __init__(self, delay, decay=0.4):
+        self.ring = np.zeros(max(1, int(delay)), dtype=np.float32)
+        self.idx = 0
+        self.decay = float(decay)
+        self.tmp = np.zeros(0, dtype=np.float32)
+
+    def process(self, x, out):
+        n = len(x)
+        out = out[:n]
+        if len(self.tmp) < len(self.ring):
+            self.tmp = np.zeros(len(self.ring), dtype=np.float32)
+        d, done = len(self.ring), 0
+        while done < n:
+            k = min(n - done, d - self.idx)
+            ring, tmp = self.ring[self.idx:self.idx + k], self.tmp[:k]
+            np.multiply(ring, self.decay, out=tmp)
+            ring[:] = x[done:done + k]
+            np.add(x[done:done + k], tmp, out=out[done:done + k])
+            done += k
+            self.idx = (self.idx + k) % d
+        return out
+
+    def reset(self):
+        self.ring.fill(0)
+        self.idx = 0
+
+
+class Comb(Node):
+    """Feedback comb y[n] = x[n] + decay * y[n - delay] (jit.Comb)."""
+
+    def __init__(self, delay, decay):
+        self.delay, self.decay = delay, decay
+        self.comb = jit.Comb(delay, decay)
+
+    def process(self, x, out):
+        return self.comb.process(x, out[:len(x)])
+
+    def reset(self):
+        self.comb = jit.Comb(self.delay, self.decay)
+
+
+class Filter(Node):
+    """IIR filter with its state carried from block to block (jit.IIRFilter)."""
+
+    def __init__(self, b, a):
+        self.iir = jit.IIRFilter(b, a)
+
+    def process(self, x, out):
+        return self.iir.process(x, out[:len(x)])
+
+    def reset(self):
+        self.iir.zi[:] = 0
+
+
+class Stretch(Node):
+    """
+    Streaming linear resample by `factor` (> 1 is slower and lower, as
+    dsp.stretch). The read position and the last input sample carry over,
+    so blocks join without a seam; each block yields about len * factor samples.
+    """
+
+    def __init__(self, factor):
+        self.factor = float(factor)
+        self.step = 1.0 / self.factor
+        self.ext = np.zeros(0, dtype=np.float32)
+        self.reset()
+
+    def out_length(self, n):
+        return int(math.ceil(n * self.factor)) + 1
+
+    def process(self, x, out):
+        n = len(x)
+        if len(self.ext) < n + 1:
+            self.ext = np.zeros(n + 1, dtype=np.float32)
+        ext = self.ext[:n + 1]
+        ext[0] = self.prev
+        ext[1:] = x
+        m = max(0, int(math.ceil((n - self.pos) / self.step)))
+        p = self.pos + self.step * np.arange(m)
+        i = p.astype(np.intp)
+        frac = (p - i).astype(np.float32)
+        out = out[:m]
+        np.subtract(ext[i + 1], ext[i], out=out)
+        out *= frac
+        out += ext[i]
+        self.pos += self.step * m - n
+        if n:
+            self.prev = x[-1]
+        return out
+
+    def reset(self):
+        self.pos = 1.0  # Position in [previous sample, block]; the first output is x[0]
+        self.prev = 0.0
+
+
+class Resample(Stretch):
+    """
+    Stretch through a windowed-sinc polyphase filter (resample.Resampler)
+    instead of linear interpolation; adds one filter window of latency.
+    """
+
+    def __init__(self, factor, quality='good'):
+        self.factor = float(factor)
+        self.resampler = resample.Resampler(factor, quality)
+
+    def out_length(self, n):
+        return self.resampler.out_length(n)
+
+    def process(self, x, out):
+        return self.resampler.process(x, out)
+
+    def reset(self):
+        self.resampler.reset()
+
+
+# --- Factories ---
+
+def reverb(delay, decay=0.4, gain=0.5):
+    """dsp.delay_reverb as nodes: the gain fuses with whatever elementwise node follows."""
+    return [Echo(delay, decay), Gain(gain)]
+
+
+def lowpass(cutoff, fs, order=2):
+    b, a = butter(order, cutoff / (0.5 * fs), btype='low')
+    return Filter(b, a)
+
+
+def _flatten(nodes):
+    for node in nodes:
+        if isinstance(node, (list, tuple)):
+            yield from _flatten(node)
+        else:
+            yield node
+
+
+def _fuse(nodes):
+    fused, run = [], []
+    for node in nodes:
+        if node.elementwise:
+            run.append(node)
+            continue
+        if run:
+            fused.append(Fused(run))
+            run = []
+        fused.append(node)
+    if run:
+        fused.append(Fused(run))
+    return fused
+
+
+# --- Graph ---
+
+class Graph:
+    """
+    A chain of nodes run on fixed blocks of `block` samples, state carried
+    between blocks. Adjacent elementwise nodes (gain, drive, clip, fade) are
+    fused into one in-place step (gains folded together).
+
+      process(x)       live: the next piece of a stream, on this graph's state
+      callback(...)    sounddevice duplex callback around process()
+      render(data)     offline: a whole buffer through a fresh copy of the graph
+    """
+
+    def __init__(self, nodes, block=BLOCK, max_pending_sec=2.0, fs=44100):
+        self.spec = list(_flatten(nodes))
+        self.nodes = _fuse(self.spec)
+        self.block = block
+        sizes = [block]
+        for node in self.nodes:
+            sizes.append(node.out_length(sizes[-1]))
+        self.cap = max(sizes)
+        self.block_out = sizes[-1]  # Most output one input block can produce
+        self.bufs = [np.zeros(self.cap, dtype=np.float32) for _ in range(2)]
+        self.out = np.zeros(0, dtype=np.float32)
+        # Output waiting for the callback when a Stretch makes more samples than come in
+        self.pending = np.zeros(int(max_pending_sec * fs), dtype=np.float32)
+        self.filled = 0
+        self.dropped = 0
+
+    @property
+    def rate(self):
+        """Output samples per input sample."""
+        r = 1.0
+        for node in self.spec:
+            if isinstance(node, Stretch):
+                r *= node.factor
+        return r
+
+    def describe(self):
+        parts = []
+        for node in self.nodes:
+            if isinstance(node, Fused):
+                parts.append("[" + " * ".join(type(n).__name__.lower() for n in node.nodes) + "]")
+            else:
+                parts.append(type(node).__name__.lower())
+        return " -> ".join(parts)
+
+    def reset(self):
+        for node in self.nodes:
+            node.reset()
+        self.filled = 0
+
+    def fresh(self):
+        """An independent copy of this graph with cleared state (same nodes, same block size)."""
+        clone = copy.deepcopy(self)
+        clone.reset()
+        return clone
+
+    def _run_block(self, x):
+        src = x
+        for k, node in enumerate(self.nodes):
+            src = node.process(src, self.bufs[k % 2])
+        return src
+
+    def process(self, x, out=None):
+        """
+        Runs `x` through the graph a block at a time. Returns the output,
+        len(x) * rate samples (exactly len(x) without a Stretch).
+        """
+        x = dsp.as_f32(x)
+        need = -(-len(x) // self.block) * self.block_out
+        if out is None:
+            if len(self.out) < need:
+                self.out = np.zeros(need, dtype=np.float32)
+            out = self.out
+        done = 0
+        for start in range(0, len(x), self.block):
+            y = self._run_block(x[start:start + self.block])
+            out[done:done + len(y)] = y
+            done += len(y)
+        return out[:done]
+
+    def callback(self, indata, outdata, frames, time_info, status):
+        y = self.process(indata[:, 0])
+        if len(y) == frames and self.filled == 0:
+            outdata[:, 0] = y
+            return
+        # Rate-changing graph: queue the output, play what's due, drop the oldest on overflow
+        room = len(self.pending) - self.filled
+        if len(y) > room:
+            drop = len(y) - room
+            self.pending[:self.filled - drop] = self.pending[drop:self.filled]
+            self.filled -= drop
+            self.dropped += drop
+        self.pending[self.filled:self.filled + len(y)] = y
+        self.filled += len(y)
+        k = min(frames, self.filled)
+        outdata[:k, 0] = self.pending[:k]
+        outdata[k:, 0] = 0
+        self.pending[:self.filled - k] = self.pending[k:self.filled]
+        self.filled -= k
+
+    def render(self, data):
+        """Offline: all of `data` through a fresh copy of the graph (this one's state is untouched)."""
+        data = dsp.as_f32(data)
+        graph = self.fresh()
+        length = len(data)
+        for node in graph.nodes:
+            if isinstance(node, Fused):
+                node.set_length(length)
+            length = int(round(length * node.factor)) if isinstance(node, Stretch) else length
+        out = np.zeros(-(-len(data) // graph.block) * graph.block_out, dtype=np.float32)
+        return graph.process(data, out).copy()
@@ -0,0 +1,250 @@
+# churn/jit.py
+# Sample-recursive kernels (feedback comb, stateful IIR, fractional read head, reverb)
+# and the spectral multiply-accumulate of the partitioned convolver.
+# Uses Numba when it is installed (`pip3 install numba`), plain numpy otherwise.
+import numpy as np
+from scipy.signal import lfilter
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+# --- numpy backend ---
+
+def _comb_np(x, ring, idx, decay, out):
+    """y[n] = x[n] + decay * y[n - delay], walked in runs no longer than the delay."""
+    d = len(ring)
+    done = 0
+    while done < len(x):
+        k = min(len(x) - done, d - idx)
+        y = out[done:done + k]
+        np.multiply(ring[idx:idx + k], decay, out=y)
+        y += x[done:done + k]
+        ring[idx:idx + k] = y
+        done += k
+        idx = (idx + k) % d
+    return idx
+
+
+def _iir_np(b, a, x, zi, out):
+    y, zf = lfilter(b, a, x, zi=zi)
+    zi[:] = zf
+    out[:] = y
+    return out
+
+
+def _varispeed_np(data, pos, rate, out):
+    n = len(data)
+    p = pos + rate * np.arange(len(out))
+    i0 = p.astype(np.intp)
+    frac = (p - i0).astype(np.float32)
+    i0 %= n
+    i1 = (i0 + 1) % n
+    np.subtract(data[i1], data[i0], out=out)
+    out *= frac
+    out += data[i0]
+    return (pos + rate * len(out)) % n
+
+
+def _reverb_np(x, combs, comb_delays, allpasses, allpass_delays, prev, col, coefs, out):
+    """
+    One reverb sub-block (len(x) <= every delay, so no line reads what it
+    writes). Line k writes sample t at column t + delay_k and reads
+    column t: all combs are one (lines x samples) slice.
+    """
+    a, b, in_gain, g, wet, dry, gain = coefs
+    n = len(x)
+    delayed = combs[:, col:col + n]
+    damped = delayed * np.float32(a)
+    damped[:, 1:] += delayed[:, :-1] * np.float32(b)
+    damped[:, :1] += prev * np.float32(b)
+    prev[:] = delayed[:, -1:]
+    damped += x * np.float32(in_gain)
+    s = delayed.sum(axis=0, dtype=np.float32)
+    for k in range(len(comb_delays)):
+        d = comb_delays[k]
+        combs[k, col + d:col + d + n] = damped[k]
+    for k in range(len(allpass_delays)):
+        d = allpass_delays[k]
+        held = allpasses[k, col:col + n]
+        np.multiply(held, np.float32(g), out=allpasses[k, col + d:col + d + n])
+        allpasses[k, col + d:col + d + n] += s
+        s = held - s
+    np.multiply(s, np.float32(wet), out=s)
+    np.multiply(x, np.float32(dry), out=out)
+    out += s
+    out *= np.float32(gain)
+    return col + n
+
+
+def _spectral_mac_np(delay, spectra, acc, scratch):
+    """acc[k] = sum over p of delay[p, k] * spectra[p, k]; scratch is one (p x k) product."""
+    np.multiply(delay, spectra, out=scratch)
+    scratch.sum(axis=0, out=acc)
+    return acc
+
+
+KERNELS = {"numpy": (_comb_np, _iir_np, _varispeed_np, _reverb_np, _spectral_mac_np)}
+
+
+# --- numba backend ---
+
+if numba is not None:
+    @numba.njit(cache=True)
+    def _comb_nb(x, ring, idx, decay, out):
+        d = len(ring)
+        for n in range(len(x)):
+            y = x[n] + decay * ring[idx]
+            ring[idx] = y
+            out[n] = y
+            idx += 1
+            if idx == d:
+                idx = 0
+        return idx
+
+    @numba.njit(cache=True)
+    def _iir_nb(b, a, x, zi, out):
+        order = len(zi)
+        for n in range(len(x)):
+            xn = x[n]
+            yn = b[0] * xn + zi[0]
+            for k in range(1, order):
+                zi[k - 1] = b[k] * xn + zi[k] - a[k] * yn
+            zi[order - 1] = b[order] * xn - a[order] * yn
+            out[n] = yn
+        return out
+
+    @numba.njit(cache=True)
+    def _varispeed_nb(data, pos, rate, out):
+        n = len(data)
+        pos = pos % n  # A start past the end wraps, as in the numpy kernel (Numba does not bounds-check)
+        for k in range(len(out)):
+            i0 = int(pos)
+            frac = pos - i0
+            i1 = i0 + 1
+            if i1 == n:
+                i1 = 0
+            out[k] = data[i0] + (data[i1] - data[i0]) * frac
+            pos += rate
+            while pos >= n:
+                pos -= n
+        return pos
+
+    @numba.njit(cache=True)
+    def _reverb_nb(x, combs, comb_delays, allpasses, allpass_delays, prev, col, coefs, out):
+        a, b, in_gain, g, wet, dry, gain = coefs[0], coefs[1], coefs[2], coefs[3], coefs[4], coefs[5], coefs[6]
+        for t in range(len(x)):
+            c = col + t
+            s = 0.0
+            for k in range(len(comb_delays)):
+                v = combs[k, c]
+                combs[k, c + comb_delays[k]] = x[t] * in_gain + a * v + b * prev[k, 0]
+                prev[k, 0] = v
+                s += v
+            for k in range(len(allpass_delays)):
+                held = allpasses[k, c]
+                allpasses[k, c + allpass_delays[k]] = s + g * held
+                s = held - s
+            out[t] = (dry * x[t] + wet * s) * gain
+        return col + len(x)
+
+    @numba.njit(cache=True, fastmath=True)
+    def _spectral_mac_nb(delay, spectra, acc, scratch):
+        acc[:] = 0
+        for p in range(delay.shape[0]):
+            for k in range(delay.shape[1]):
+                acc[k] += delay[p, k] * spectra[p, k]
+        return acc
+
+    KERNELS["numba"] = (_comb_nb, _iir_nb, _varispeed_nb, _reverb_nb, _spectral_mac_nb)
+
+BACKEND = "numba" if "numba" in KERNELS else "numpy"
+
+
+def use_backend(name):
+    """Switches every kernel to `name` ('numba' or 'numpy')."""
+    global BACKEND
+    if name not in KERNELS:
+        raise ValueError(f"Backend {name!r} not available (have {sorted(KERNELS)})")
+    BACKEND = name
+
+
+def warmup():
+    """Compiles every kernel up front (and fills Numba's on-disk cache) before a stream opens."""
+    x = np.zeros(64, dtype=np.float32)
+    for name in KERNELS:
+        comb, iir, varispeed, reverb, spectral_mac = KERNELS[name]
+        comb(x, np.zeros(8, dtype=np.float32), 0, 0.5, np.empty_like(x))
+        iir(np.ones(3), np.ones(3), x, np.zeros(2), np.empty_like(x))
+        varispeed(x, 0.0, 0.84, np.empty_like(x))
+        delays = np.array([64], dtype=np.intp)
+        reverb(x, np.zeros((1, 192), dtype=np.float32), delays, np.zeros((1, 192), dtype=np.float32), delays,
+               np.zeros((1, 1), dtype=np.float32), 0, np.ones(7), np.empty_like(x))
+        spectra = np.zeros((2, 33), dtype=np.complex64)
+        spectral_mac(spectra, spectra, np.empty(33, dtype=np.complex64), np.empty_like(spectra))
+    return BACKEND
+
+
+# --- Stateful wrappers (state carries across blocks) ---
+
+class Comb:
+    """Feedback comb: y[n] = x[n] + decay * y[n - delay]."""
+
+    def __init__(self, delay, decay):
+        self.ring = np.zeros(max(1, int(delay)), dtype=np.float32)
+        self.idx = 0
+        self.decay = float(decay)
+
+    def process(self, block, out=None):
+        if out is None:
+            out = np.empty(len(block), dtype=np.float32)
+        self.idx = KERNELS[BACKEND][0](block, self.ring, self.idx, self.decay, out)
+        return out
+
+
+class IIRFilter:
+    """lfilter(b, a) with its state kept between blocks, so block edges don't click."""
+
+    def __init__(self, b, a):
+        a = np.asarray(a, dtype=np.float64)
+        self.b = np.asarray(b, dtype=np.float64) / a[0]
+        self.a = a / a[0]
+        order = max(len(self.a), len(self.b)) - 1
+        self.b = np.pad(self.b, (0, order + 1 - len(self.b)))
+        self.a = np.pad(self.a, (0, order + 1 - len(self.a)))
+        self.zi = np.zeros(order)
+
+    def process(self, block, out=None):
+        if out is None:
+            out = np.empty(len(block), dtype=np.float32)
+        return KERNELS[BACKEND][1](self.b, self.a, block, self.zi, out)
+
+
+class Varispeed:
+    """Fractional read head looping over `data`; rate < 1 plays slower and lower."""
+
+    def __init__(self, data, rate, pos=0.0):
+        self.data = data
+        self.rate = float(rate)
+        self.pos = float(pos)
+
+    def read(self, out):
+        self.pos = KERNELS[BACKEND][2](self.data, self.pos, self.rate, out)
+        return out
+
+
+def reverb_block(x, combs, comb_delays, allpasses, allpass_delays, prev, col, coefs, out):
+    """One sub-block of churn.reverb.Reverb on the current backend; returns the next column."""
+    return KERNELS[BACKEND][3](x, combs, comb_delays, allpasses, allpass_delays, prev, col, coefs, out)
+
+
+def spectral_mac(delay, spectra, acc, scratch):
+    """churn.convolve's delay-line sum on the current backend (scratch is only used by numpy)."""
+    return KERNELS[BACKEND][4](delay, spectra, acc, scratch)
+
+
+def comb(data, delay, decay, out=None):
+    """Whole-buffer feedback comb (the classic `out[i] += out[i - delay] * decay` loop)."""
+    return Comb(delay, decay).process(np.asarray(data, dtype=np.float32), out)
@@ -0,0 +1,124 @@
+# churn/memory.py
+import itertools
+import threading
+
+import numpy as np
+
+
+class MemoryBudget:
+    """
+    Byte budget shared by every engine's layer buffers.
+
+    Engines register each layer (anything whose audio lives in `.data`, or a
+    custom `buffer` getter) with an on_evict callback. enforce() evicts
+    unpinned entries by policy until the total fits again:
+
+      'oldest'   - earliest registered first
+      'quietest' - lowest RMS first
+      'longest'  - biggest buffer first
+      'lru'      - least recently audible first (engines call touch())
+    """
+
+    POLICIES = ('oldest', 'quietest', 'longest', 'lru')
+
+    def __init__(self, max_bytes=512 * 1024 * 1024, policy='oldest'):
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.entries = {}
+        self.order = itertools.count()
+        self.clock = itertools.count()
+        self.evicted = {}
+        self.peak_bytes = 0
+        self.lock = threading.Lock()
+
+    def configure(self, max_mb=None, policy=None):
+        if max_mb is not None:
+            self.max_bytes = int(max_mb * 1024 * 1024)
+        if policy is not None:
+            if policy not in self.POLICIES:
+                raise ValueError(f"Unknown eviction policy {policy!r} (choose from {self.POLICIES})")
+            self.policy = policy
+        return self
+
+    def register(self, engine, item, on_evict=None, pinned=False, buffer=None):
+        """Pinned entries count towards usage but are never evicted."""
+        with self.lock:
+            self.entries[id(item)] = {
+                "engine": engine,
+                "item": item,
+                "on_evict": on_evict,
+                "pinned": pinned or on_evict is None,
+                "buffer": buffer or (lambda obj: obj.data),
+                "seq": next(self.order),
+                "used": next(self.clock),
+            }
+        return item
+
+    def unregister(self, item):
+        with self.lock:
+            self.entries.pop(id(item), None)
+
+    def touch(self, item):
+        """Marks `item` as just heard (for the 'lru' policy)."""
+        entry = self.entries.get(id(item))
+        if entry is not None:
+            entry["used"] = next(self.clock)
+
+    def _nbytes(self, entry):
+        data = entry["buffer"](entry["item"])
+        return 0 if data is None else data.nbytes
+
+    def _rank(self, entry):
+        if self.policy == 'quietest':
+            data = entry["buffer"](entry["item"])
+            if data is None or len(data) == 0:
+                return 0.0
+            if hasattr(data, "power"):  # churn.compress.CompressedBuffer
+                return data.power
+            return float(np.dot(data, data)) / len(data)
+        if self.policy == 'longest':
+            return -self._nbytes(entry)
+        if self.policy == 'lru':
+            return entry["used"]
+        return entry["seq"]
+
+    def usage(self):
+        """Bytes held per engine."""
+        with self.lock:
+            per_engine = {}
+            for entry in self.entries.values():
+                per_engine[entry["engine"]] = per_engine.get(entry["engine"], 0) + self._nbytes(entry)
+        return per_engine
+
+    def total(self):
+        return sum(self.usage().values())
+
+    def enforce(self):
+        """Evicts until usage fits the budget; returns the evicted items."""
+        victims = []
+        with self.lock:
+            total = sum(self._nbytes(e) for e in self.entries.values())
+            self.peak_bytes = max(self.peak_bytes, total)
+            if total > self.max_bytes:
+                candidates = sorted((e for e in self.entries.values() if not e["pinned"]), key=self._rank)
+                for entry in candidates:
+                    if total <= self.max_bytes:
+                        break
+                    total -= self._nbytes(entry)
+                    del self.entries[id(entry["item"])]
+                    self.evicted[entry["engine"]] = self.evicted.get(entry["engine"], 0) + 1
+                    victims.append(entry)
+        # Callbacks run outside our lock so they can take the engine's own lock
+        for entry in victims:
+            entry["on_evict"](entry["item"])
+        return [entry["item"] for entry in victims]
+
+    def report(self):
+        parts = [f"{engine} {nbytes / 1e6:.1f} MB" for engine, nbytes in sorted(self.usage().items())]
+        evicted = sum(self.evicted.values())
+        return (f"memory: {' | '.join(parts) or 'empty'} "
+                f"(budget {self.max_bytes / 1e6:.0f} MB, {self.policy}, {evicted} evicted)")
+
+
+# One budget per process, shared by every engine running in it
+budget = MemoryBudget()
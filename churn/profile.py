@@ -0,0 +1,217 @@
+# churn/profile.py
+import atexit
+import functools
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter, deque
+
+import numpy as np
+
+SAMPLE_HZ = 200      # Stack samples per second while profiling
+KEEP = 8192          # Most recent durations kept per stage for the percentiles
+MAX_DEPTH = 64       # Innermost frames kept per sampled stack
+
+
+class Stage:
+    """
+    A named timer, usable as a decorator or a `with` block. Costs one
+    attribute check while the profiler is off.
+    """
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.durations = deque(maxlen=KEEP)
+        self.count = 0
+        self.total = 0.0
+        self.worst = 0.0
+        self.local = threading.local()
+
+    def __call__(self, fn):
+        profiler = self.profiler
+
+        @functools.wraps(fn)
+        def timed(*args, **kwargs):
+            if not profiler.enabled:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.add(time.perf_counter() - start)
+        return timed
+
+    def __enter__(self):
+        if self.profiler.enabled:
+            local = self.local
+            if getattr(local, "run", None) != self.profiler.runs:
+                local.run, local.starts = self.profiler.runs, []  # Drop blocks left open by the last run
+            local.starts.append(time.perf_counter())
+        return self
+
+    def __exit__(self, *exc):
+        if self.profiler.enabled:
+            starts = getattr(self.local, "starts", None)
+            if starts and self.local.run == self.profiler.runs:  # Not when switched on inside the block
+                self.add(time.perf_counter() - starts.pop())
+        return False
+
+    def add(self, seconds):
+        self.durations.append(seconds)
+        self.count += 1
+        self.total += seconds
+        if seconds > self.worst:
+            self.worst = seconds
+
+    def reset(self):
+        self.durations.clear()
+        self.count, self.total, self.worst = 0, 0.0, 0.0
+
+    def summary(self):
+        d = np.fromiter(self.durations, dtype=np.float64) * 1e3
+        p50, p95, p99 = np.percentile(d, (50, 95, 99)) if len(d) else (0.0, 0.0, 0.0)
+        return {"count": self.count, "total_ms": self.total * 1e3,
+                "mean_ms": self.total * 1e3 / self.count if self.count else 0.0,
+                "p50_ms": p50, "p95_ms": p95, "p99_ms": p99, "max_ms": self.worst * 1e3}
+
+
+class Profiler:
+    """
+    Opt-in profiling shared by every engine.
+
+    Engines mark their DSP stages with stage(name) (stretch_and_verb,
+    low_pass, mix, fifo, evolve, callback, ...). While enabled, each stage
+    records its latency, and a sampler thread takes SAMPLE_HZ stack samples
+    of every other thread (audio callback and workers alike). disable()
+    writes the samples as collapsed stacks (`thread;outer;...;inner count`,
+    the input to flamegraph.pl / speedscope) next to a per-stage latency
+    table. The sampler's own wake-up lateness is reported as `gil_wait`:
+    it stays near zero unless some thread is holding the GIL.
+
+    install() starts it with CHURN_PROFILE=1 and toggles it on SIGUSR2, so
+    a running stream can be profiled without restarting.
+    """
+
+    def __init__(self, sample_hz=SAMPLE_HZ, directory="profiles"):
+        self.enabled = False
+        self.sample_hz = sample_hz
+        self.directory = directory
+        self.engine = "churn"
+        self.stages = {}
+        self.stacks = Counter()
+        self.gil = Stage(self, "gil_wait")
+        self.lock = threading.Lock()
+        self.sampler = None
+        self.started = None
+        self.runs = 0
+
+    def stage(self, name):
+        found = self.stages.get(name)
+        if found is not None:
+            return found
+        with self.lock:
+            if name not in self.stages:
+                self.stages[name] = Stage(self, name)
+            return self.stages[name]
+
+    # --- Switching ---
+
+    def enable(self):
+        if self.enabled:
+            return
+        for s in self.stages.values():
+            s.reset()
+        self.gil.reset()
+        self.stacks.clear()
+        self.started = time.perf_counter()
+        self.enabled = True
+        self.sampler = threading.Thread(target=self._sample, name="churn-profiler", daemon=True)
+        self.sampler.start()
+        print(f"[profile] on ({self.sample_hz} Hz stack samples)")
+
+    def disable(self, write=True):
+        if not self.enabled:
+            return None
+        self.enabled = False
+        self.sampler.join()
+        self.runs += 1
+        return self.write() if write else None
+
+    def toggle(self, *_):
+        if self.enabled:
+            self.disable()
+        else:
+            self.enable()
+
+    def install(self, engine, signame="SIGUSR2"):
+        """Call from the engine's main thread before opening the stream."""
+        self.engine = engine
+        if hasattr(signal, signame):
+            signal.signal(getattr(signal, signame), self.toggle)
+        if os.environ.get("CHURN_PROFILE", "") not in ("", "0"):
+            self.enable()
+        atexit.register(self.disable)  # A profile still running at exit is written out
+        return self
+
+    # --- Stack sampling ---
+
+    def _sample(self):
+        period = 1.0 / self.sample_hz
+        me = threading.get_ident()
+        due = time.perf_counter() + period
+        while self.enabled:
+            time.sleep(max(0.0, due - time.perf_counter()))
+            woke = time.perf_counter()
+            self.gil.add(max(0.0, woke - due))
+            due = max(due + period, woke)
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident != me:
+                    self.stacks[self._collapse(names.get(ident, str(ident)), frame)] += 1
+
+    @staticmethod
+    def _collapse(thread, frame):
+        frames = []
+        while frame is not None and len(frames) < MAX_DEPTH:
+            code = frame.f_code
+            if code.co_filename != __file__:  # Hide the stage wrappers
+                frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        frames.append(thread)
+        return ";".join(reversed(frames))
+
+    # --- Output ---
+
+    def summary(self):
+        rows = {name: s.summary() for name, s in sorted(self.stages.items()) if s.count}
+        if self.gil.count:
+            rows["gil_wait"] = self.gil.summary()
+        return rows
+
+    def report(self):
+        lines = [f"{'stage':<18} {'calls':>8} {'mean':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}  (ms)"]
+        for name, r in self.summary().items():
+            lines.append(f"{name:<18} {r['count']:>8} {r['mean_ms']:8.3f} {r['p50_ms']:8.3f} "
+                         f"{r['p95_ms']:8.3f} {r['p99_ms']:8.3f} {r['max_ms']:8.3f}")
+        return "\n".join(lines)
+
+    def write(self):
+        """Writes <engine>-<pid>-<run>.folded and .txt; returns the .folded path."""
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory, f"{self.engine}-{os.getpid()}-{self.runs}")
+        with open(base + ".folded", "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        elapsed = time.perf_counter() - self.started
+        report = self.report()
+        with open(base + ".txt", "w") as f:
+            f.write(f"{self.engine}: {elapsed:.1f} s profiled, {sum(self.stacks.values())} stack samples\n{report}\n")
+        print(f"[profile] off after {elapsed:.1f} s -> {base}.folded\n{report}")
+        return base + ".folded"
+
+
+profiler = Profiler()
+stage = profiler.stage
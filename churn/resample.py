@@ -0,0 +1,174 @@
+# churn/resample.py
+import threading
+from fractions import Fraction
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from churn import dsp
+
+MAX_DOWN = 200     # Largest denominator used when approximating a factor as up / down
+ROWS = 4096        # Frames per matmul pass; bounds the scratch copy of the input windows
+
+# quality -> (taps per phase, Kaiser beta, passband edge as a fraction of the lower Nyquist)
+QUALITY = {
+    'linear': (2, None, 1.0),
+    'fast': (8, 5.0, 0.85),
+    'good': (16, 7.0, 0.9),
+    'best': (32, 9.0, 0.95),
+}
+
+_kernels = {}
+_kernels_lock = threading.Lock()
+
+
+def ratio(factor):
+    """`factor` as (up, down): the closest fraction with down <= MAX_DOWN (1.19 -> 119 / 100)."""
+    f = Fraction(float(factor)).limit_denominator(MAX_DOWN)
+    if f <= 0:
+        raise ValueError(f"Resample factor must be positive, got {factor!r}")
+    return f.numerator, f.denominator
+
+
+def _weights(d, quality, cutoff):
+    taps, beta, edge = QUALITY[quality]
+    if beta is None:
+        return np.maximum(0.0, 1.0 - np.abs(d))  # Triangle: linear interpolation
+    fc = cutoff * edge
+    x = d / (taps // 2)
+    window = np.i0(beta * np.sqrt(np.clip(1.0 - x * x, 0.0, None))) / np.i0(beta)
+    return fc * np.sinc(fc * d) * window
+
+
+def kernel(up, down, quality='good'):
+    """
+    Cached (down + taps - 1) x up matrix. Column j holds the taps of output
+    phase j (outputs k with k % up == j) at that phase's offset within a
+    frame's input window, each column summing to 1. Every `down` input
+    samples then give `up` outputs with one window-times-matrix product.
+    """
+    key = (up, down, quality)
+    found = _kernels.get(key)
+    if found is not None:
+        return found
+    with _kernels_lock:
+        found = _kernels.get(key)
+        if found is None:
+            taps = QUALITY[quality][0]
+            half = taps // 2 - 1
+            t = np.arange(taps)
+            j = np.arange(up)[:, None]
+            base, rem = np.divmod(j * down, up)
+            w = _weights(t - half - rem / up, quality, min(1.0, up / down))  # up x taps
+            bank = np.zeros((down + taps - 1, up))
+            bank[base + t, j] = w / w.sum(axis=1, keepdims=True)
+            found = bank.astype(np.float32)
+            found.flags.writeable = False
+            _kernels[key] = found
+    return found
+
+
+def _frames(src, frames, bank, down, out, scratch):
+    """out[:frames * up] = frame-by-frame products of `src`'s input windows with `bank`."""
+    width, up = bank.shape
+    windows = sliding_window_view(src, width)[::down]
+    for start in range(0, frames, ROWS):
+        k = min(ROWS, frames - start)
+        rows = scratch[:k]
+        np.copyto(rows, windows[start:start + k])  # Contiguous rows, so the product goes to BLAS
+        np.matmul(rows, bank, out=out[start * up:(start + k) * up].reshape(k, up))
+    return out
+
+
+def _scratch(width, frames):
+    return np.empty((min(ROWS, max(frames, 1)), width), dtype=np.float32)
+
+
+def resample(data, factor, quality='good', out=None):
+    """
+    Resamples to int(len * factor) samples (> 1 is slower and lower, as
+    dsp.stretch) with a windowed-sinc polyphase filter of the given quality.
+    Output k is read at input position k / factor; the ends are held at the
+    first and last sample so a looped buffer doesn't fade at its seam.
+    """
+    data = dsp.as_f32(data)
+    n = len(data)
+    m = int(n * factor)
+    out = np.empty(m, dtype=np.float32) if out is None else out[:m]
+    if m == 0:
+        return out
+    up, down = ratio(factor)
+    bank = kernel(up, down, quality)
+    width = bank.shape[0]
+    half = QUALITY[quality][0] // 2 - 1
+    frames = -(-m // up)
+
+    src = np.empty((frames - 1) * down + width, dtype=np.float32)
+    k = min(n, len(src) - half)
+    src[:half] = data[0]
+    src[half:half + k] = data[:k]
+    src[half + k:] = data[-1]
+
+    whole = m // up
+    scratch = _scratch(width, frames)
+    _frames(src, whole, bank, down, out, scratch)
+    if whole < frames:
+        tail = np.empty(up, dtype=np.float32)
+        _frames(src[whole * down:], 1, bank, down, tail, scratch)
+        out[whole * up:] = tail[:m - whole * up]
+    return out
+
+
+class Resampler:
+    """
+    Block-streaming resample: the same filter and output grid as resample(),
+    with the last frame's window carried over so block boundaries leave no
+    seam. Each process() call returns every output whose input window is
+    complete, `up` samples per `down` inputs; latency is one window.
+    """
+
+    def __init__(self, factor, quality='good'):
+        self.factor = float(factor)
+        self.quality = quality
+        self.up, self.down = ratio(factor)
+        self.bank = kernel(self.up, self.down, quality)
+        self.width = self.bank.shape[0]
+        self.half = QUALITY[quality][0] // 2 - 1
+        self.buf = np.zeros(0, dtype=np.float32)
+        self.scratch = _scratch(self.width, 1)
+        self.reset()
+
+    def reset(self):
+        self.held = 0        # Input samples kept for the next window
+        self.started = False
+
+    def out_length(self, n):
+        """Most output one call with `n` input samples can produce (under a window is ever held over)."""
+        return ((self.width - 1 + n) // self.down + 1) * self.up
+
+    def process(self, x, out=None):
+        x = dsp.as_f32(x)
+        if not self.started and len(x):
+            self._grow(self.half)
+            self.buf[:self.half] = x[0]  # Held like resample()'s leading edge
+            self.held = self.half
+            self.started = True
+        need = self.held + len(x)
+        self._grow(need)
+        self.buf[self.held:need] = x
+        frames = (need - self.width) // self.down + 1 if need >= self.width else 0
+        out = np.empty(frames * self.up, dtype=np.float32) if out is None else out[:frames * self.up]
+        if frames:
+            if len(self.scratch) < min(ROWS, frames):
+                self.scratch = _scratch(self.width, frames)
+            _frames(self.buf[:need], frames, self.bank, self.down, out, self.scratch)
+        used = frames * self.down
+        self.buf[:need - used] = self.buf[used:need]
+        self.held = need - used
+        return out
+
+    def _grow(self, n):
+        if len(self.buf) < n:
+            buf = np.zeros(max(n, 2 * len(self.buf)), dtype=np.float32)
+            buf[:self.held] = self.buf[:self.held]
+            self.buf = buf
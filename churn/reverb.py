@@ -0,0 +1,117 @@
+# churn/reverb.py
+import time
+
+import numpy as np
+
+from churn import dsp, jit
+
+# Freeverb tunings at 44.1 kHz, scaled to the stream's rate
+COMBS = (1116, 1188, 1277, 1356, 1422, 1491, 1557, 1617)
+ALLPASSES = (556, 441, 341, 225)
+IN_GAIN = 0.015    # Input level into the comb bank (8 lines with ~0.84 feedback add up fast)
+WET_SCALE = 3.0
+ALLPASS_FEEDBACK = 0.5
+BUDGET = 0.05      # Share of a block's duration one voice may spend in a callback
+HISTORY = 8192     # Columns written between compactions of the delay-line history
+
+_costs = {}  # (backend, combs, allpasses, block) -> measured seconds per block
+
+
+class Reverb:
+    """
+    Schroeder/Freeverb reverb: parallel feedback combs (damped by a low-pass
+    in the loop) into series allpass diffusers, block-streaming with its
+    state carried between calls.
+
+    Each delay line writes sample t at column t + delay of a shared
+    history, so the sample from `delay` ago is always at column t. The
+    numpy kernel (jit.reverb_block) runs sub-blocks no longer than the
+    shortest delay, where no line reads what it writes: all combs are one
+    (lines x samples) slice and array op, each allpass a couple more.
+
+    Cost per voice (one Reverb, 8 combs + 4 allpasses, mono) per
+    256-sample block, one core: ~150 us with numpy, ~20 us with Numba,
+    against the block's 5.8 ms. cost() measures it on this machine; fit()
+    drops comb lines until a voice stays within BUDGET of the block.
+
+    out = (dry * x + wet * reverb(x)) * gain
+    """
+
+    def __init__(self, fs=44100, room=0.84, damp=0.2, wet=0.4, dry=1.0, gain=1.0,
+                 combs=len(COMBS), allpasses=len(ALLPASSES)):
+        self.fs = fs
+        self.room, self.damp = room, damp
+        self.wet, self.dry, self.gain = wet, dry, gain
+        self._lines(combs, allpasses)
+
+    def _lines(self, combs, allpasses):
+        scale = self.fs / 44100
+        self.comb_delays = np.array([max(1, int(d * scale)) for d in COMBS[:combs]], dtype=np.intp)
+        self.allpass_delays = np.array([max(1, int(d * scale)) for d in ALLPASSES[:allpasses]], dtype=np.intp)
+        self.step = int(min(self.comb_delays.min(), self.allpass_delays.min(initial=HISTORY)))  # Longest sub-block
+        self.span = int(max(self.comb_delays.max(), self.allpass_delays.max(initial=0)))
+        self.reset()
+
+    def reset(self):
+        columns = self.span + HISTORY
+        self.combs = np.zeros((len(self.comb_delays), columns), dtype=np.float32)
+        self.allpasses = np.zeros((len(self.allpass_delays), columns), dtype=np.float32)
+        self.prev = np.zeros((len(self.comb_delays), 1), dtype=np.float32)  # Last delayed sample per comb
+        self.col = 0
+
+    def _compact(self):
+        # Keep the last `span` columns (everything a future read can reach) at the start
+        keep = slice(self.col, self.col + self.span)
+        self.combs[:, :self.span] = self.combs[:, keep]
+        self.allpasses[:, :self.span] = self.allpasses[:, keep]
+        self.col = 0
+
+    def process(self, x, out=None):
+        """The next len(x) samples of the stream (any shape; returned in the same shape)."""
+        shape = np.shape(x)
+        x = dsp.as_f32(x)
+        if out is None:
+            out = np.empty(len(x), dtype=np.float32)
+        flat = out.reshape(-1)
+        coefs = np.array([(1.0 - self.damp) * self.room, self.damp * self.room, IN_GAIN,
+                          ALLPASS_FEEDBACK, self.wet * WET_SCALE, self.dry, self.gain])
+        for start in range(0, len(x), self.step):
+            block = x[start:start + self.step]
+            if self.col + self.span + len(block) > self.combs.shape[1]:
+                self._compact()
+            self.col = jit.reverb_block(block, self.combs, self.comb_delays, self.allpasses,
+                                        self.allpass_delays, self.prev, self.col, coefs,
+                                        flat[start:start + self.step])
+        return out.reshape(shape)
+
+    def render(self, data):
+        """Offline: all of `data` from silence (this voice's own state is untouched)."""
+        voice = Reverb(self.fs, self.room, self.damp, self.wet, self.dry, self.gain,
+                       len(self.comb_delays), len(self.allpass_delays))
+        return voice.process(data)
+
+    def cost(self, block=256):
+        """Measured seconds per `block` samples for a voice of this size on the current backend (cached)."""
+        key = (jit.BACKEND, len(self.comb_delays), len(self.allpass_delays), block)
+        if key not in _costs:
+            probe = Reverb(self.fs, combs=key[1], allpasses=key[2])
+            x = (np.random.randn(block) * 0.1).astype(np.float32)
+            out = np.empty(block, dtype=np.float32)
+            probe.process(x, out)
+            start = time.perf_counter()
+            for _ in range(50):
+                probe.process(x, out)
+            _costs[key] = (time.perf_counter() - start) / 50
+        return _costs[key]
+
+    def fit(self, block=256, budget=BUDGET):
+        """Drops comb lines until one block costs at most `budget` of its duration; returns the cost."""
+        limit = budget * block / self.fs
+        while self.cost(block) > limit and len(self.comb_delays) > 1:
+            self._lines(len(self.comb_delays) - 1, len(self.allpass_delays))
+        return self.cost(block)
+
+
+def render(data, fs=44100, **params):
+    """A whole buffer through a fresh Reverb (a capture's one-off stretch_and_verb)."""
+    return Reverb(fs, **params).process(data)
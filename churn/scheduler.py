@@ -0,0 +1,79 @@
+# churn/scheduler.py
+import heapq
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class SampleScheduler:
+    """
+    Fires events at exact sample positions on the audio stream's clock.
+
+    The audio callback calls advance(frames) once per block; every event whose
+    sample position falls inside that block is returned with its offset into
+    the block, so captures line up with the samples instead of with whenever
+    a sleeping thread happens to wake up. Heavy work goes to a small worker
+    pool via submit(), so the thread count does not grow with the layers.
+    """
+
+    def __init__(self, fs, workers=2):
+        self.fs = fs
+        self.clock = 0  # Samples elapsed on the stream
+        self.events = []
+        self.counter = itertools.count()
+        self.lock = threading.Lock()
+        self.in_flight = 0  # Jobs handed to the pool and not finished yet
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="churn-worker")
+
+    def schedule_at(self, sample_pos, action):
+        with self.lock:
+            heapq.heappush(self.events, (int(sample_pos), next(self.counter), action))
+
+    def schedule_in(self, seconds, action, origin=None):
+        """Schedules relative to `origin` (a sample position) or the current clock."""
+        start = self.clock if origin is None else origin
+        self.schedule_at(start + int(round(seconds * self.fs)), action)
+
+    def advance(self, frames):
+        """Returns [(sample_pos, offset, action)] due in this block and moves the clock on."""
+        end = self.clock + frames
+        due = []
+        with self.lock:
+            while self.events and self.events[0][0] < end:
+                pos, _, action = heapq.heappop(self.events)
+                due.append((pos, max(0, pos - self.clock), action))
+        self.clock = end
+        return due
+
+    def submit(self, fn, *args):
+        with self.lock:
+            self.in_flight += 1
+        future = self.pool.submit(fn, *args)
+        future.add_done_callback(self._job_done)
+        return future
+
+    def _job_done(self, future):
+        with self.lock:
+            self.in_flight -= 1
+
+    def backlog(self):
+        """Number of worker jobs still queued or running."""
+        with self.lock:
+            return self.in_flight
+
+    def pending(self):
+        with self.lock:
+            return len(self.events)
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False)
+
+
+def capture_window(fifo, frames, offset, length):
+    """
+    Slices `length` samples ending exactly at `offset` inside the block that
+    was just written to the end of `fifo` (a block of `frames` samples).
+    """
+    end = len(fifo) - (frames - offset)
+    start = max(0, end - length)
+    return fifo[start:end].copy()
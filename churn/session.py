@@ -0,0 +1,308 @@
+# churn/session.py
+import hashlib
+import itertools
+import json
+import os
+import queue
+import random
+import secrets
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+
+import numpy as np
+from scipy.io import wavfile
+
+CHECKPOINT = 100  # Blocks between output digests written to the log
+
+
+class Divergence(RuntimeError):
+    """A replay took a different decision (or produced different output) than the recording."""
+
+
+class Session:
+    """
+    One run's randomness and nondeterminism, made reproducible.
+
+    Stochastic choices go through the session's seeded generators
+    (uniform / randint / chance / normal). Timing-dependent ones, such as
+    admission decisions, go through decide(). Both are logged with the
+    block they happened in. Recording also keeps every input block, the
+    block in which each worker result reached the mixer, and a running
+    digest of the output.
+
+    replay() pushes the recorded input through the engine's callback at
+    full speed. Worker jobs run inline and their results are held until
+    their logged block. decide() returns the logged values, and each
+    random draw and output digest is checked against the recording.
+    """
+
+    def __init__(self, seed=None, path=None, mode='live', checkpoint=CHECKPOINT):
+        if mode not in ('live', 'record', 'replay'):
+            raise ValueError(f"Unknown session mode {mode!r}")
+        self.mode = mode
+        self.path = path
+        self.checkpoint = checkpoint
+        self.block = -1
+        self.captures = itertools.count()
+        self.digest = hashlib.blake2b(digest_size=16)
+        self.local = threading.local()
+        self.verified = 0
+
+        if mode == 'replay':
+            with open(os.path.join(path, "meta.json")) as f:
+                self.meta = json.load(f)
+            seed = self.meta["seed"]
+            self.checkpoint = self.meta["checkpoint"]
+            self.draws = deque()
+            self.decisions = defaultdict(deque)
+            self.arrivals = defaultdict(deque)
+            self.checkpoints = deque()
+            with open(os.path.join(path, "log.jsonl")) as f:
+                for line in f:
+                    entry = json.loads(line)
+                    kind = entry["k"]
+                    if kind == "draw":
+                        self.draws.append(entry)
+                    elif kind == "decide":
+                        self.decisions[entry["t"]].append(entry["v"])
+                    elif kind == "arrive":
+                        self.arrivals[entry["b"]].append(entry["v"])
+                    elif kind == "digest":
+                        self.checkpoints.append(entry)
+            self.held = {}
+
+        self.seed = seed if seed is not None else secrets.randbits(32)
+        self.rng = random.Random(self.seed)
+        self.np_rng = np.random.RandomState(self.seed)
+
+        if mode == 'record':
+            os.makedirs(path, exist_ok=True)
+            self.meta = {"seed": self.seed, "checkpoint": self.checkpoint, "created": time.time()}
+            self._write_meta()
+            self.log_file = open(os.path.join(path, "log.jsonl"), "w")
+            self.input_file = open(os.path.join(path, "input.f32"), "wb")
+            self.frames_file = open(os.path.join(path, "frames.u32"), "wb")
+            self.pending = queue.Queue()
+            self.writer = threading.Thread(target=self._writer, daemon=True)
+            self.writer.start()
+
+    @classmethod
+    def from_argv(cls, engine, argv=None, checkpoint=CHECKPOINT):
+        """
+        Reads `--seed N`, `--record [DIR]` and `--replay DIR` from the command
+        line. A recording goes to sessions/<engine>-<seed> unless DIR is given.
+        """
+        argv = sys.argv[1:] if argv is None else argv
+        seed = int(argv[argv.index("--seed") + 1]) if "--seed" in argv else None
+        if "--replay" in argv:
+            session = cls(path=argv[argv.index("--replay") + 1], mode='replay')
+        elif "--record" in argv:
+            i = argv.index("--record")
+            path = argv[i + 1] if i + 1 < len(argv) and not argv[i + 1].startswith("--") else None
+            seed = seed if seed is not None else secrets.randbits(32)
+            session = cls(seed, path or os.path.join("sessions", f"{engine}-{seed}"), 'record', checkpoint)
+        else:
+            session = cls(seed, checkpoint=checkpoint)
+        session.engine = engine
+        print(f"--- Session seed {session.seed} ({session.mode}{': ' + session.path if session.path else ''}) ---")
+        return session
+
+    # --- Recording ---
+
+    def _write_meta(self):
+        with open(os.path.join(self.path, "meta.json"), "w") as f:
+            json.dump(self.meta, f)
+
+    def _writer(self):
+        # File I/O stays off the audio thread
+        while True:
+            item = self.pending.get()
+            if item is None:
+                break
+            kind, payload = item
+            if kind == "log":
+                self.log_file.write(json.dumps(payload) + "\n")
+            else:
+                self.input_file.write(payload.tobytes())
+                self.frames_file.write(np.uint32(len(payload)).tobytes())
+
+    def _log(self, kind, tag, value):
+        if self.mode == 'record':
+            self.pending.put(("log", {"b": self.block, "k": kind, "t": tag, "v": value}))
+
+    def save_source(self, data):
+        """Keeps an offline engine's source audio with the recording."""
+        if self.mode == 'record':
+            np.save(os.path.join(self.path, "source.npy"), np.asarray(data, dtype=np.float32))
+
+    def source(self):
+        return np.load(os.path.join(self.path, "source.npy"))
+
+    # --- Random draws ---
+
+    def _draw(self, tag, value, logged=None):
+        logged = value if logged is None else logged
+        if self.mode == 'replay':
+            expected = self.draws.popleft() if self.draws else None
+            if expected is None or expected["t"] != tag or expected["v"] != logged:
+                raise Divergence(f"block {self.block}: draw {tag}={logged!r}, recording has {expected}")
+            self.verified += 1
+        else:
+            self._log("draw", tag, logged)
+        return value
+
+    def uniform(self, tag, a, b):
+        return self._draw(tag, self.rng.uniform(a, b))
+
+    def randint(self, tag, a, b):
+        return self._draw(tag, self.rng.randint(a, b))
+
+    def chance(self, tag):
+        """random.random() from the session generator."""
+        return self._draw(tag, self.rng.random())
+
+    def normal(self, tag, loc=0.0, scale=1.0, size=None):
+        value = self.np_rng.normal(loc, scale, size)
+        return self._draw(tag, value, hashlib.blake2b(np.asarray(value).tobytes(), digest_size=8).hexdigest())
+
+    # --- Timing-dependent decisions ---
+
+    def decide(self, tag, fn):
+        """fn() live (logged); the recorded value on replay."""
+        if self.mode == 'replay':
+            values = self.decisions[tag]
+            if not values:
+                raise Divergence(f"block {self.block}: no recorded decision left for {tag}")
+            return values.popleft()
+        value = fn()
+        self._log("decide", tag, value)
+        return value
+
+    # --- Blocks ---
+
+    def tick(self, indata=None):
+        """Start of an audio callback (or offline iteration): advances the block count and records the input."""
+        self.block += 1
+        if self.mode == 'record' and indata is not None:
+            self.pending.put(("input", np.array(indata, dtype=np.float32).reshape(-1)))
+
+    def end_block(self, out):
+        """End of an audio callback (or one offline iteration): folds the output into the digest."""
+        if self.mode == 'live':
+            return
+        self.digest.update(np.ascontiguousarray(out, dtype=np.float32).tobytes())
+        if (self.block + 1) % self.checkpoint:
+            return
+        value = self.digest.hexdigest()
+        if self.mode == 'record':
+            self._log("digest", "output", value)
+            return
+        expected = self.checkpoints.popleft() if self.checkpoints else None
+        if expected is not None:
+            if expected["b"] != self.block or expected["v"] != value:
+                raise Divergence(f"block {self.block}: output digest differs from the recording")
+            self.verified += 1
+
+    # --- Worker results ---
+
+    def mixer_queue(self):
+        return SessionQueue(self)
+
+    def submit(self, scheduler, fn, *args):
+        """scheduler.submit(fn, *args), tagging whatever fn puts on a SessionQueue with a capture id."""
+        cid = next(self.captures)
+        self._log("capture", "job", cid)
+
+        def job():
+            self.local.cid = cid
+            try:
+                fn(*args)
+            finally:
+                self.local.cid = None
+
+        if self.mode == 'replay':
+            job()  # Inline; the SessionQueue holds the result until its recorded block
+            return None
+        return scheduler.submit(job)
+
+    # --- Replay ---
+
+    def replay(self, callback, fs, channels=1):
+        """
+        Runs the recorded input through callback(indata, outdata, frames,
+        time, status). Returns the output and writes it to replay.wav.
+        """
+        frames = np.fromfile(os.path.join(self.path, "frames.u32"), dtype=np.uint32)
+        samples = np.fromfile(os.path.join(self.path, "input.f32"), dtype=np.float32)
+        output = np.empty(len(samples), dtype=np.float32)
+        outdata = np.empty((int(frames.max()) if len(frames) else 0, channels), dtype=np.float32)
+        start = time.perf_counter()
+        pos = 0
+        for n in frames:
+            n = int(n)
+            indata = samples[pos:pos + n].reshape(n, 1)
+            callback(indata, outdata[:n], n, None, None)
+            output[pos:pos + n] = outdata[:n, 0]
+            pos += n
+        wall = time.perf_counter() - start
+        audio = pos / fs
+        print(f"--- Replayed {len(frames)} blocks ({audio:.1f} s of audio) in {wall:.2f} s "
+              f"({audio / wall if wall else 0:.0f}x real time); {self.verified} draws/digests matched ---")
+        wavfile.write(os.path.join(self.path, "replay.wav"), fs, output)
+        return output
+
+    def close(self):
+        if self.mode == 'record':
+            self.pending.put(None)
+            self.writer.join()
+            for f in (self.log_file, self.input_file, self.frames_file):
+                f.close()
+            self.meta["blocks"] = self.block + 1
+            self._write_meta()
+
+
+class SessionQueue(queue.Queue):
+    """
+    mixer_queue that remembers which capture produced each item. Recording
+    logs the block each item is taken in. On replay, items are held and
+    released in exactly those blocks.
+    """
+
+    def __init__(self, session):
+        super().__init__()
+        self.session = session
+
+    def put(self, item, block=True, timeout=None):
+        cid = getattr(self.session.local, "cid", None)
+        if self.session.mode == 'replay':
+            self.session.held[cid] = item
+            return
+        super().put((cid, item), block, timeout)
+
+    def _due(self):
+        return self.session.arrivals.get(self.session.block)
+
+    def empty(self):
+        if self.session.mode == 'replay':
+            return not self._due()
+        return super().empty()
+
+    def qsize(self):
+        if self.session.mode == 'replay':
+            return len(self._due() or ())
+        return super().qsize()
+
+    def get_nowait(self):
+        if self.session.mode == 'replay':
+            due = self._due()
+            if not due:
+                raise queue.Empty
+            cid = due.popleft()
+            if cid not in self.session.held:
+                raise Divergence(f"block {self.session.block}: capture {cid} was never produced")
+            return self.session.held.pop(cid)
+        cid, item = super().get_nowait()
+        self.session._log("arrive", "mixer", cid)
+        return item
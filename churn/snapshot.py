@@ -0,0 +1,155 @@
+# churn/snapshot.py
+import json
+import os
+import random
+import shutil
+import signal
+import time
+from collections import deque
+
+import numpy as np
+
+from churn.compress import CompressedBuffer
+
+POLL = 0.2  # Seconds between checks for a signalled save while the main loop sleeps
+TRANSIENT = ("buf", "activity", "source", "pending")  # Layer attributes rebuilt on demand, never saved
+
+
+def layer_state(layer, transient=TRANSIENT):
+    """Every attribute of a layer object except scratch buffers."""
+    return {k: v for k, v in vars(layer).items() if k not in transient}
+
+
+def apply(obj, state):
+    for k, v in state.items():
+        setattr(obj, k, v)
+    return obj
+
+
+def rng_state():
+    return {"random": random.getstate(), "numpy": np.random.get_state()}
+
+
+def restore_rng(state):
+    version, internal, gauss = state["random"]
+    random.setstate((version, tuple(internal), gauss))
+    np.random.set_state(tuple(state["numpy"]))
+
+
+def _pack(obj, arrays):
+    if isinstance(obj, CompressedBuffer):
+        return {"__compressed__": [_pack(obj.q, arrays), _pack(obj.scales, arrays), obj.length, obj.block, obj.power]}
+    if isinstance(obj, np.ndarray):
+        name = f"{len(arrays)}.npy"
+        arrays.append((name, obj))
+        return {"__array__": name}
+    if isinstance(obj, dict):
+        return {k: _pack(v, arrays) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_pack(v, arrays) for v in obj]
+    if isinstance(obj, np.generic):
+        return obj.item()
+    return obj
+
+
+def _unpack(obj, path):
+    if isinstance(obj, dict):
+        if "__array__" in obj:
+            return np.load(os.path.join(path, obj["__array__"]), mmap_mode='r')
+        if "__compressed__" in obj:
+            q, scales, length, block, power = obj["__compressed__"]
+            return CompressedBuffer.from_parts(_unpack(q, path), _unpack(scales, path), length, block, power)
+        return {k: _unpack(v, path) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_unpack(v, path) for v in obj]
+    return obj
+
+
+def save(path, state):
+    """
+    Writes `state` (nested dicts/lists of scalars, arrays and compressed
+    buffers) as a directory of .npy files plus state.json. The previous
+    snapshot is only replaced once the new one is complete.
+    """
+    arrays = []
+    doc = _pack(state, arrays)
+    tmp = path + ".new"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    for name, array in arrays:
+        np.save(os.path.join(tmp, name), np.ascontiguousarray(array))
+    with open(os.path.join(tmp, "state.json"), "w") as f:
+        json.dump(doc, f)
+    if os.path.exists(path):
+        old = path + ".old"
+        shutil.rmtree(old, ignore_errors=True)
+        os.rename(path, old)
+        os.rename(tmp, path)
+        shutil.rmtree(old, ignore_errors=True)  # Mapped arrays from it stay readable until released
+    else:
+        os.rename(tmp, path)
+    return sum(a.nbytes for _, a in arrays)
+
+
+def load(path):
+    """The saved state with every array memory-mapped read-only (pages load as they are played)."""
+    with open(os.path.join(path, "state.json")) as f:
+        return _unpack(json.load(f), path)
+
+
+def exists(path):
+    return os.path.exists(os.path.join(path, "state.json"))
+
+
+class SignalSaves:
+    """
+    Saves requested by signal but run by the main loop. The handler only
+    queues the signal number: save_fn takes the engine's lock, and a handler
+    runs on the main thread wherever it was interrupted, possibly while
+    that thread already holds the lock. The main loop sleeps with sleep()
+    (or calls poll()), which runs the save within POLL seconds.
+    """
+
+    def __init__(self, save_fn, stops):
+        self.save_fn = save_fn
+        self.stops = stops
+        self.requested = deque()  # Appended by the handler; no lock is taken there
+
+    def handler(self, signum, frame):
+        self.requested.append(signum)
+
+    def poll(self):
+        """Runs a requested save; after a stop signal, raises SystemExit so streams close cleanly."""
+        if not self.requested:
+            return False
+        signums = set()
+        while self.requested:
+            signums.add(self.requested.popleft())
+        self.save_fn()  # One save serves every signal that arrived since the last poll
+        if signums & self.stops:
+            raise SystemExit(0)
+        return True
+
+    def sleep(self, seconds):
+        """time.sleep() that serves requested saves as it goes."""
+        end = time.monotonic() + seconds
+        while True:
+            self.poll()
+            left = end - time.monotonic()
+            if left <= 0:
+                return
+            time.sleep(min(POLL, left))
+
+
+def on_signal(save_fn, keep_running=("SIGUSR1",), stop=("SIGTERM",)):
+    """
+    Requests save_fn() on SIGUSR1 and keeps going; on SIGTERM saves, then
+    raises SystemExit. The save runs in the main loop through the returned
+    SignalSaves, never in the handler. Call from the main thread. Signals
+    the platform lacks are skipped.
+    """
+    saves = SignalSaves(save_fn, {getattr(signal, name) for name in stop if hasattr(signal, name)})
+    for name in keep_running + stop:
+        if hasattr(signal, name):
+            signal.signal(getattr(signal, name), saves.handler)
+    return saves
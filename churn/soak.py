@@ -0,0 +1,408 @@
+# churn/soak.py
+# Run from the repo root with: python3 -m churn.soak [engine ...] [--hours H] [--slope MB/h]
+#
+# Drives each engine headless on a simulated clock (no audio device, no
+# sleeping) for hours of stream time, one fresh process per engine. Traced
+# heap (tracemalloc) and RSS are sampled along the way; an engine fails when
+# either keeps growing after warm-up faster than the allowed slope, and its
+# report lists the allocation sites that grew the most. RSS counts anonymous
+# memory only, so archive segments mapped from disk don't read as growth. The engines under the
+# memory budget (aardvark, xavier, viktor, wilma) also check that their layer buffers stay inside
+# it for the whole run, and tobias that its loop stays within max_loop_dur.
+#
+# Not soaked: isabella and johan render a fixed number of loops and exit (python3 -m churn.batch
+# covers them, worker reuse included), and udvar's clips grow 19% per cycle with no bound by
+# design, its state local to auto_layered_loop.
+import argparse
+import atexit
+import contextlib
+import importlib
+import multiprocessing
+import os
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import psutil
+
+from churn.memory import budget
+
+FS = 44100
+MB = 1024 * 1024
+BLOCK_SEC = 5.0        # Simulated callback size for the layer engines; coarser blocks run faster
+SAMPLES = 24           # Memory samples per run
+WARMUP = 0.25          # Share of the run before the slope counts (caches and budgets fill first)
+SLOPE_MB_H = 1.0       # Allowed traced-heap growth after warm-up
+RSS_SLOPE_MB_H = 4.0   # Allowed RSS growth (allocator slack and fragmentation included)
+TOP_SITES = 5          # Allocation sites listed per engine
+MIN_SITE = 0.01 * 1024 * 1024  # Bytes a site must have grown by to be listed
+MAX_RSS_MB = 1024      # A run stops early (and fails) once RSS passes this
+ARCHIVE_MB = 256       # Disk cap for the layer archives, so they (and their index) fill well inside warm-up
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_rng = np.random.default_rng(0)
+
+
+def _noise(n):
+    return _rng.standard_normal((n, 1)).astype(np.float32) * 0.1
+
+
+# --- Engine drivers ---
+# Each returns (step(block), seconds per block, check() -> failure message or None)
+# and stands in for the engine's stream callback and background threads.
+
+def _budget_check():
+    """(note, check): note() after each enforce records layer memory; check() fails a run that went over budget."""
+    worst = [0]
+
+    def note():
+        worst[0] = max(worst[0], budget.total())
+
+    def check():
+        if worst[0] > budget.max_bytes:
+            return f"layer memory {worst[0] / MB:.1f} MB exceeded the {budget.max_bytes / MB:.0f} MB budget"
+        return None
+
+    return note, check
+
+
+def _aardvark(budget_mb, policy):
+    import aardvark as engine
+
+    budget.configure(budget_mb, policy)
+    engine.stretch_cache.max_bytes = budget_mb * MB
+    engine.archive.max_disk_bytes = ARCHIVE_MB * MB
+    seed_len = int(engine.capture_dur * FS)
+    for _ in range(5):
+        engine.add_layer(engine.Layer(_noise(seed_len), volume=0.2))
+
+    frames = int(BLOCK_SEC * FS)
+    out = np.zeros((frames, 1), dtype=np.float32)
+    per_cycle = max(1, int(engine.grand_loop_dur / BLOCK_SEC))
+    note, check = _budget_check()
+
+    def step(block):
+        engine.audio_callback(out, frames, None, None)
+        engine.evolver.wait()  # Generations keep pace with the simulated clock
+        if block % per_cycle:
+            return
+        # The grand loop: resample the output, harvest 5 seeds, recall from the archive
+        engine.resample_master()
+        for _ in range(5):
+            engine.add_layer(engine.Layer(_noise(seed_len), volume=0.15))
+        engine.recall_layers()
+        budget.enforce()
+        note()
+
+    return step, BLOCK_SEC, check
+
+
+def _xavier(budget_mb, policy):
+    import xavier as engine
+
+    budget.configure(budget_mb, policy)
+    engine.stretch_cache.max_bytes = budget_mb * MB
+    engine.archive.max_disk_bytes = ARCHIVE_MB * MB
+    for i in range(5):
+        engine.add_seed(i, _noise(int(engine.capture_dur * FS)))
+
+    block_sec = engine.grand_loop_dur  # One grand loop per callback
+    frames = int(block_sec * FS)
+    out = np.zeros((frames, 1), dtype=np.float32)
+    note, check = _budget_check()
+
+    def step(block):
+        engine.audio_callback(out, frames, None, None)
+        engine.evolver.wait()
+        engine.grand_loop_step()  # Enforces the budget once per grand loop
+        note()
+
+    return step, block_sec, check
+
+
+def _drone(name):
+    """viktor / wilma: seeds, then the callback forever, with the main loop's budget check every 30 s."""
+    def driver(budget_mb, policy):
+        engine = importlib.import_module(name)
+        budget.configure(budget_mb, policy)
+        engine.stretch_cache.max_bytes = budget_mb * MB
+        for i in range(5):
+            engine.add_seed(i, _noise(int(engine.capture_dur * FS)))
+
+        frames = int(BLOCK_SEC * FS)
+        out = np.zeros((frames, 1), dtype=np.float32)
+        per_check = max(1, int(30 / BLOCK_SEC))
+        note, check = _budget_check()
+
+        def step(block):
+            engine.audio_callback(out, frames, None, None)
+            engine.evolver.wait()
+            if block % per_check == 0:
+                budget.enforce()
+                note()
+
+        return step, BLOCK_SEC, check
+    return driver
+
+
+def _tobias(budget_mb, policy):
+    """Seed loop, then a merge of fresh input every step_duration with the callback playing in between."""
+    import tobias as engine
+
+    step_len = int(engine.step_duration * FS)
+    engine.loop_buffer = engine.dsp.as_f32(_noise(step_len))
+    frames = int(BLOCK_SEC * FS)
+    out = np.zeros((frames, 1), dtype=np.float32)
+    per_merge = max(1, int(engine.step_duration / BLOCK_SEC))
+    longest = [0]
+
+    def step(block):
+        engine.audio_callback(out, frames, None, None)
+        if block % per_merge == 0:
+            longest[0] = max(longest[0], len(engine.merge_layer(engine.dsp.as_f32(_noise(step_len)))))
+
+    def check():
+        if longest[0] > int(engine.max_loop_dur * FS):
+            return f"loop reached {longest[0] / FS:.1f} s (max_loop_dur {engine.max_loop_dur} s)"
+        return None
+
+    return step, BLOCK_SEC, check
+
+
+def _klaus(budget_mb, policy):
+    import klaus
+
+    proc = klaus.SmartAudioProcessor()
+    frames = FS  # One second per duplex callback
+    out = np.zeros((frames, 1), dtype=np.float32)
+
+    def step(block):
+        proc.stream_callback(_noise(frames), out, frames, None, None)
+
+    return step, frames / FS, None
+
+
+def _segments(make):
+    """klaus --segment / liliana: one 3 s input segment, then the 1024-frame output callbacks for 3 s."""
+    def driver(budget_mb, policy):
+        proc = make()
+        out = np.zeros((1024, 1), dtype=np.float32)
+        calls = -(-proc.segment_len // 1024)
+
+        def step(block):
+            proc.input_callback(_noise(proc.segment_len), proc.segment_len, None, None)
+            for _ in range(calls):
+                proc.output_callback(out, 1024, None, None)
+
+        return step, proc.segment_len / proc.fs, None
+    return driver
+
+
+def _klaus_segment():
+    import klaus
+    return klaus.SmartAudioProcessor(mode='segment')
+
+
+def _liliana():
+    import liliana
+    return liliana.LoFiFeedbackProcessor()
+
+
+def _sven(budget_mb, policy):
+    sys.path.insert(0, os.path.join(ROOT, "sven"))
+    from audio.effects import AudioTransformer
+    from audio.io import InputStream
+    from audio.sample import Sampler
+
+    mic = InputStream()  # Never started: the driver calls its callback
+    fx = AudioTransformer()
+    loops = [(Sampler(name, mic), dur) for name, dur in (("2s-Loop", 2.0), ("8s-Loop", 8.0), ("5s-Loop", 5.0))]
+    chunk = mic.chunk_size
+
+    def step(block):
+        mic._callback(_noise(chunk), chunk, None, None)
+        # Each sampler loop records as soon as its take is queued (speakers.feed is left out: it plays)
+        for sampler, dur in loops:
+            if sampler.queue.qsize() >= int(dur * mic.rate / chunk):
+                sampler.record_from_stream(dur).transform(fx)
+
+    return step, chunk / FS, None
+
+
+def _quincy(budget_mb, policy):
+    """One second captured, then processed (speakers.play is left out: it plays)."""
+    sys.path.insert(0, os.path.join(ROOT, "quincy"))
+    from audio.effects import AudioTransformer
+    from audio.sample import Sample
+
+    fx = AudioTransformer()
+
+    def step(block):
+        Sample(_noise(FS).flatten(), FS).transform(fx)
+
+    return step, 1.0, None
+
+
+def _rebecca(budget_mb, policy):
+    sys.path.insert(0, os.path.join(ROOT, "rebecca"))
+    from audio.effects import AudioTransformer
+    from audio.io import InputStream
+    from audio.sample import Sampler
+
+    mic = InputStream()  # Never started: the driver calls its callback
+    fx = AudioTransformer()
+    sampler = Sampler()
+    chunk = mic.chunk_size
+    take = int(2.0 * mic.rate / chunk)
+
+    def step(block):
+        mic._callback(_noise(chunk), chunk, None, None)
+        if mic.buffer.qsize() >= take:  # The main loop samples 2 seconds at a time
+            sampler.record_from_stream(mic, 2.0).transform(fx)
+
+    return step, chunk / FS, None
+
+
+# name -> (driver, default simulated hours); the per-sample queue engines are far slower to simulate
+ENGINES = {
+    "aardvark": (_aardvark, 24),
+    "xavier": (_xavier, 24),
+    "viktor": (_drone("viktor"), 24),
+    "wilma": (_drone("wilma"), 24),
+    "klaus": (_klaus, 24),
+    "klaus-segment": (_segments(_klaus_segment), 0.25),
+    "liliana": (_segments(_liliana), 0.25),
+    "sven": (_sven, 6),
+    "tobias": (_tobias, 24),
+    "quincy": (_quincy, 24),
+    "rebecca": (_rebecca, 6),
+}
+
+
+# --- Harness ---
+
+def _site(frame):
+    path = os.path.abspath(frame.filename)
+    if path.startswith(ROOT + os.sep):
+        path = os.path.relpath(path, ROOT)
+    return f"{path}:{frame.lineno}"
+
+
+def _rss(process):
+    info = process.memory_info()
+    return info.rss - getattr(info, "shared", 0)  # Linux: minus file-backed pages
+
+
+def _slope(hours, values):
+    return float(np.polyfit(hours, values, 1)[0]) if len(hours) > 1 else 0.0
+
+
+def soak(name, hours=None, budget_mb=24, policy='oldest', slope=SLOPE_MB_H, rss_slope=RSS_SLOPE_MB_H):
+    """Runs one engine on the simulated clock; returns its samples, slopes, top growth sites and failures."""
+    driver, default_hours = ENGINES[name]
+    hours = default_hours if hours is None else hours
+    process = psutil.Process()
+    tracemalloc.start()
+    with contextlib.redirect_stdout(None):  # The engines' own prints
+        step, block_sec, check = driver(budget_mb, policy)
+    blocks = max(SAMPLES, int(hours * 3600 / block_sec))
+    every = blocks // SAMPLES
+    warm = max(1, int(SAMPLES * WARMUP))
+    points, base, failures = [], None, []
+    start = time.perf_counter()
+
+    for block in range(1, blocks + 1):
+        with contextlib.redirect_stdout(None):
+            step(block)
+        if block % every:
+            continue
+        traced, _ = tracemalloc.get_traced_memory()
+        points.append((block * block_sec / 3600, traced / MB, _rss(process) / MB))
+        print(f"  [{name} {points[-1][0]:6.2f} h] traced {points[-1][1]:7.1f} MB | RSS {points[-1][2]:7.1f} MB",
+              flush=True)
+        if len(points) in (1, warm):  # The first sample stands in if the run is stopped before warm-up ends
+            base = tracemalloc.take_snapshot()
+        if points[-1][2] > MAX_RSS_MB:
+            failures.append(f"stopped at {points[-1][0]:.2f} h: RSS passed {MAX_RSS_MB} MB")
+            break
+
+    ignore = (tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "<frozen *>"),
+              tracemalloc.Filter(False, "<unknown>"), tracemalloc.Filter(False, __file__))
+    grown = tracemalloc.take_snapshot().filter_traces(ignore).compare_to(base.filter_traces(ignore), "lineno")
+    tracemalloc.stop()
+
+    settled = points[warm - 1:] if len(points) > warm else points
+    h, traced, rss = (np.array(column) for column in zip(*settled))
+    result = {
+        "engine": name,
+        "hours": points[-1][0],  # Simulated hours actually run
+        "wall": time.perf_counter() - start,
+        "traced": (points[0][1], points[-1][1]),
+        "rss": (points[0][2], points[-1][2]),
+        "slope": _slope(h, traced),
+        "rss_slope": _slope(h, rss),
+        "sites": [f"{s.size_diff / MB:+8.2f} MB {s.count_diff:+9d} blocks  {_site(s.traceback[0])}"
+                  for s in grown[:TOP_SITES] if s.size_diff >= MIN_SITE],
+        "failures": failures,
+    }
+    if result["slope"] > slope:
+        result["failures"].append(f"traced heap grows {result['slope']:.2f} MB/h (limit {slope:g})")
+    if result["rss_slope"] > rss_slope:
+        result["failures"].append(f"RSS grows {result['rss_slope']:.2f} MB/h (limit {rss_slope:g})")
+    failure = check() if check else None
+    if failure:
+        result["failures"].append(failure)
+    atexit._run_exitfuncs()  # Pool workers exit without atexit hooks; archive segment files are removed here
+    return result
+
+
+def report(result):
+    r = result
+    verdict = "FAIL" if r["failures"] else "OK"
+    lines = [f"\n--- {r['engine']}: {r['hours']:.2f} simulated h in {r['wall']:.0f} s | {verdict} ---",
+             f"  traced {r['traced'][0]:.1f} -> {r['traced'][1]:.1f} MB ({r['slope']:+.2f} MB/h after warm-up) | "
+             f"RSS {r['rss'][0]:.1f} -> {r['rss'][1]:.1f} MB ({r['rss_slope']:+.2f} MB/h)"]
+    lines += [f"  FAIL: {failure}" for failure in r["failures"]]
+    if r["sites"]:
+        lines.append("  grew most since warm-up:")
+        lines += ["    " + site for site in r["sites"]]
+    return "\n".join(lines)
+
+
+def run(engines=None, hours=None, budget_mb=24, policy='oldest', slope=SLOPE_MB_H, rss_slope=RSS_SLOPE_MB_H):
+    """Soaks each engine in its own process (module state and RSS don't carry over); returns the results."""
+    results = []
+    for name in engines or ENGINES:
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            result = pool.submit(soak, name, hours, budget_mb, policy, slope, rss_slope).result()
+        print(report(result), flush=True)
+        results.append(result)
+    failed = [r["engine"] for r in results if r["failures"]]
+    print(f"\n{len(results) - len(failed)}/{len(results)} engines within the growth limits"
+          + (f"; failed: {', '.join(failed)}" if failed else ""))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulated long runs with memory-growth gates")
+    parser.add_argument("engines", nargs="*", metavar="engine",
+                        help=f"engines to soak (default: all of {', '.join(ENGINES)})")
+    parser.add_argument("--hours", type=float, default=None, help="simulated hours per engine (engine default)")
+    parser.add_argument("--slope", type=float, default=SLOPE_MB_H, help="allowed traced-heap growth, MB/h")
+    parser.add_argument("--rss-slope", type=float, default=RSS_SLOPE_MB_H, help="allowed RSS growth, MB/h")
+    parser.add_argument("--budget", type=float, default=24, help="layer memory budget, MB")
+    parser.add_argument("--policy", default='oldest', help="eviction policy for the layer budget")
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.engines if name not in ENGINES]
+    if unknown:
+        parser.error(f"unknown engine {unknown[0]!r} (choose from {', '.join(ENGINES)})")
+    results = run(args.engines, args.hours, args.budget, args.policy, args.slope, args.rss_slope)
+    if any(r["failures"] for r in results):
+        raise SystemExit("FAIL: memory grew past the limits")
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
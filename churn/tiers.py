@@ -0,0 +1,152 @@
+# churn/tiers.py
+import threading
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.signal import firwin, upfirdn
+
+from churn import compress, dsp
+
+TAPS = 16          # Filter taps per polyphase branch
+PROBE_WINDOWS = 16 # Spectrum windows sampled when deciding a layer's tier
+PROBE_SIZE = 8192
+
+_filters = {}
+_filters_lock = threading.Lock()
+
+
+def _prototype(factor, taps=TAPS):
+    """Windowed-sinc low-pass at the reduced Nyquist, length factor * taps, unity passband gain."""
+    h = firwin(factor * taps + 1, 1.0 / factor, window=('kaiser', 8.0))[:-1]
+    return (h * factor).astype(np.float32)
+
+
+def polyphase(factor, taps=TAPS):
+    """
+    Cached (factor x taps) branch matrix. Row r holds the taps that produce
+    output samples n with n % factor == r, reversed so a sliding window of
+    the low-rate input can be matrix-multiplied against it directly.
+    """
+    key = (factor, taps)
+    bank = _filters.get(key)
+    if bank is None:
+        with _filters_lock:
+            bank = _filters.get(key)
+            if bank is None:
+                h = _prototype(factor, taps)
+                bank = np.ascontiguousarray(h.reshape(taps, factor).T[:, ::-1])
+                bank.flags.writeable = False
+                _filters[key] = bank
+    return bank
+
+
+def decimate(data, factor, taps=TAPS):
+    """
+    Low-pass and keep every factor-th sample. The input is zero-padded to a
+    multiple of `factor`, so the loop is at most factor - 1 samples longer.
+    """
+    data = dsp.as_f32(data)
+    if factor == 1:
+        return data
+    pad = -len(data) % factor
+    n = (len(data) + pad) // factor
+    # Treat the buffer as a loop: wrap `delay` samples around each end so
+    # the seam is filtered like any other point
+    h = _prototype(factor, taps)
+    delay = len(h) // 2
+    looped = np.concatenate([data[len(data) - delay:], data, np.zeros(pad, dtype=np.float32), data[:delay]])
+    out = upfirdn(h / factor, looped, down=factor)
+    return dsp.as_f32(out[delay // factor * 2:][:n])
+
+
+def read(data, factor, ptr, out, taps=TAPS):
+    """
+    Like dsp.loop_read, but `data` (float32 or compressed) is stored at
+    1/factor of the output rate: fills len(out) full-rate samples starting
+    at full-rate position `ptr`.
+    """
+    if factor == 1:
+        return compress.read(data, ptr, out)
+    frames = len(out)
+    bank = polyphase(factor, taps)
+    first = ptr // factor
+    rows = (ptr + frames - 1) // factor - first + 1
+    seg = np.empty(rows + taps - 1, dtype=np.float32)
+    compress.read(data, first - taps // 2 + 1, seg)
+    windows = sliding_window_view(seg, taps)            # rows x taps, no copy
+    full = np.matmul(windows, bank.T)                   # rows x factor
+    phase = ptr % factor
+    out[:] = full.reshape(-1)[phase:phase + frames]
+    return out
+
+
+def band_fraction(data, factor, windows=PROBE_WINDOWS, size=PROBE_SIZE):
+    """Share of the energy that lies above the Nyquist of a 1/factor rate (sampled, hann-windowed)."""
+    data = dsp.as_f32(data)
+    size = min(size, len(data))
+    if size < 64:
+        return 0.0
+    starts = np.linspace(0, len(data) - size, min(windows, len(data) // size + 1)).astype(int)
+    frames = np.stack([data[s:s + size] for s in starts]) * np.hanning(size).astype(np.float32)
+    power = np.abs(np.fft.rfft(frames, axis=1)) ** 2
+    total = power.sum()
+    if total <= 0:
+        return 0.0
+    edge = int(power.shape[1] / factor * 0.9)  # Leave the filter's transition band inside
+    return float(power[:, edge:].sum() / total)
+
+
+def error_db(data, factor, taps=TAPS):
+    """Round-trip error of storing `data` at 1/factor rate (decimate + read), in dB relative to the signal."""
+    data = dsp.as_f32(data)
+    if factor == 1:
+        return -np.inf
+    low = decimate(data, factor, taps)
+    back = read(low, factor, 0, np.empty(len(low) * factor, dtype=np.float32), taps)[:len(data)]
+    err = float(np.dot(back - data, back - data))
+    sig = float(np.dot(data, data))
+    if sig <= 0:
+        return -np.inf
+    return 10 * np.log10(max(err, 1e-30) / sig)
+
+
+class TierStore:
+    """
+    Moves layer buffers down to 1/2 or 1/4 rate once their content fits the
+    reduced band, and reads them back at full rate with read().
+
+    Layers hold (data, factor); settle() only ever moves a buffer down, since
+    every 1.19x stretch narrows its band further.
+    """
+
+    def __init__(self, fs, factors=(1, 2, 4), tolerance_db=-45.0, taps=TAPS):
+        self.fs = fs
+        self.factors = factors
+        self.tolerance = 10 ** (tolerance_db / 10)
+        self.tolerance_db = tolerance_db
+        self.taps = taps
+        self.moves = {f: 0 for f in factors}
+        self.saved_bytes = 0
+        self.lock = threading.Lock()
+
+    def settle(self, data, factor=1):
+        """Returns (data, factor), decimated to the lowest rate its content allows."""
+        target = factor
+        for f in self.factors:
+            if f > target and band_fraction(data, f // factor) <= self.tolerance:
+                target = f
+        if target == factor:
+            return data, factor
+        low = decimate(data, target // factor, self.taps)
+        low.flags.writeable = False
+        with self.lock:
+            self.moves[target] += 1
+            self.saved_bytes += data.nbytes - low.nbytes
+        return low, target
+
+    def read(self, data, factor, ptr, out):
+        return read(data, factor, ptr, out, self.taps)
+
+    def report(self):
+        moved = ", ".join(f"{self.fs // f} Hz x{n}" for f, n in self.moves.items() if f > 1)
+        return f"tiers: {moved} | {self.saved_bytes / 1e6:.1f} MB saved"
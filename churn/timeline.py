@@ -0,0 +1,70 @@
+# churn/timeline.py
+import queue
+import threading
+
+import numpy as np
+
+
+def render(clips, offsets, out=None):
+    """Overlap-adds each clip at its sample offset into one float32 buffer."""
+    length = max(off + len(clip) for clip, off in zip(clips, offsets))
+    if out is None or len(out) < length:
+        out = np.zeros(length, dtype=np.float32)
+    else:
+        out = out[:length]
+        out.fill(0)
+    for clip, off in zip(clips, offsets):
+        out[off:off + len(clip)] += clip
+    return out
+
+
+class TimelinePlayer:
+    """
+    Plays pre-rendered buffers back to back on one persistent output stream.
+
+    A background thread calls render_next() to build the following buffer
+    while the current one plays; the stream callback only copies samples
+    and swaps to the next buffer when the current one runs out.
+    """
+
+    def __init__(self, render_next, prefetch=1):
+        self.render_next = render_next
+        self.ready = queue.Queue(maxsize=prefetch)
+        self.current = None
+        self.pos = 0
+        self.cycles_played = 0
+        self.underruns = 0
+        self.thread = threading.Thread(target=self._renderer, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def position(self):
+        """(buffer playing, sample position in it), for snapshots."""
+        return self.current, self.pos
+
+    def resume(self, current, pos):
+        """Continues from a position() taken earlier; call before start()."""
+        self.current, self.pos = current, int(pos)
+
+    def _renderer(self):
+        while True:
+            self.ready.put(self.render_next())  # Blocks while `prefetch` buffers are waiting
+
+    def callback(self, outdata, frames, time_info, status):
+        written = 0
+        while written < frames:
+            if self.current is None or self.pos >= len(self.current):
+                try:
+                    self.current = self.ready.get_nowait()
+                    self.pos = 0
+                    self.cycles_played += 1
+                except queue.Empty:
+                    outdata[written:, 0] = 0
+                    if self.current is not None:
+                        self.underruns += 1
+                    return
+            k = min(frames - written, len(self.current) - self.pos)
+            outdata[written:written + k, 0] = self.current[self.pos:self.pos + k]
+            self.pos += k
+            written += k
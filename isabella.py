@@ -3,18 +3,27 @@
 # transformations: kitchen sink
 # limitations: gaps in audio due to (1) working with files and (2) alternating between processing audio and playing audio back
 
-import sounddevice as sd
+try:
+    import sounddevice as sd
+except (ImportError, OSError):  # No PortAudio (e.g. a render box); headless mode doesn't need it
+    sd = None
 import numpy as np
 from scipy.io import wavfile
-import scipy.interpolate as interp
 import os
 import time
-import random
 import sys
 import psutil 
+from churn import dsp, resample
+from churn.accumulator import Accumulator
+from churn.profile import profiler, stage
+from churn.memory import budget
+from churn.session import Session
+
+STRETCH_QUALITY = 'good'  # churn.resample level for the stretch: 'linear' | 'fast' | 'good' | 'best'
 
 class ChickenChurner:
-    def __init__(self, base_input="chickens.wav", loops=28, fade_decrement=0.25):
+    def __init__(self, base_input="chickens.wav", loops=28, fade_decrement=0.25, memory_mb=512,
+                 headless=False, seed=None, out_dir=".", prefix="chickens", session=None):
         self.base_input = base_input
         self.num_loops = loops
         self.fade_decrement = fade_decrement
@@ -25,6 +34,34 @@ class ChickenChurner:
         self.previous_iteration = None # This is the key for evolution
         self.accumulator = None 
         self.created_files = [] 
+        # Batch mode (churn.batch): no prompt, no playback, only the final iteration is written
+        # Every FX choice and reverb IR is drawn from the session (seeded; --record / --replay)
+        self.session = session or Session(seed, checkpoint=1)
+        self.seed = self.session.seed
+        if self.session.mode == 'replay':
+            headless, out_dir = True, self.session.path
+        self.headless = headless
+        self.out_dir = out_dir
+        self.prefix = prefix
+        budget.configure(memory_mb)
+
+    def _track_accumulator(self):
+        # Only the RAM copy counts; a spilled accumulator is mixed in place through its file mapping
+        budget.register("isabella", self, on_evict=self._spill_accumulator,
+                        buffer=lambda c: None if c.accumulator.spilled else c.accumulator.buf)
+
+    def _spill_accumulator(self, _):
+        # Over budget: move the accumulated history to disk instead of holding it in RAM
+        if self.accumulator is not None and not self.accumulator.spilled:
+            print("\n[memory] accumulator spilled to disk")
+            self.accumulator.spill()
+        self._track_accumulator()
+
+    def close(self):
+        """Releases the budget entry and the spill file (one batch worker renders many churners)."""
+        budget.unregister(self)
+        if self.accumulator is not None:
+            self.accumulator.close()
 
     def _progress_bar(self, current, total, prefix=''):
         percent = float(current) / total
@@ -37,11 +74,19 @@ class ChickenChurner:
         if current >= total: print()
 
     def get_sound(self):
-        choice = input("Press 'M' to record from Mic, or 'F' to use file: ").strip().lower()
-        if choice == 'm':
+        if self.session.mode == 'replay':
+            choice = 'replay'
+        elif self.headless:
+            choice = 'f'
+        else:
+            choice = input("Press 'M' to record from Mic, or 'F' to use file: ").strip().lower()
+        if choice == 'replay':
+            self.source_audio = self.session.source()
+        elif choice == 'm':
             self.source_audio = self._capture_live_audio(duration=3.0)
         else:
             self.source_audio = self._load_file_audio()
+        self.session.save_source(self.source_audio)
         # Seed the first iteration with the source
         self.previous_iteration = self.source_audio
         return self.source_audio
@@ -52,7 +97,7 @@ class ChickenChurner:
         fs, data = wavfile.read(self.base_input)
         self.fs = fs
         if data.dtype == np.int16: data = data.astype(np.float32) / 32768.0
-        return data[:, 0] if len(data.shape) > 1 else data
+        return dsp.as_f32(data[:, 0] if len(data.shape) > 1 else data)
 
     def _capture_live_audio(self, duration=3.0):
         print(f"Recording for {duration} seconds...")
@@ -60,33 +105,39 @@ class ChickenChurner:
         sd.wait()
         return recording.flatten()
 
+    @stage("stretch")
     def transform_slow_down(self, audio_data):
-        old_indices = np.arange(len(audio_data))
-        new_indices = np.linspace(0, len(audio_data) - 1, int(len(audio_data) * self.ghost_factor))
-        interpolant = interp.interp1d(old_indices, audio_data, kind='linear')
-        return interpolant(new_indices)
+        return resample.resample(audio_data, self.ghost_factor, STRETCH_QUALITY)
 
+    @stage("fade")
     def apply_curved_fade(self, audio_data, duration):
+        """Squared fade-in, applied in place."""
         if duration <= 0: return audio_data
         fade_samples = min(int(duration * self.fs), len(audio_data))
-        curve = np.power(np.linspace(0.0, 1.0, fade_samples), 2)
-        output = audio_data.copy()
-        output[:fade_samples] *= curve
-        return output
+        return dsp.fade_in(audio_data, fade_samples, power=2)
 
+    @stage("output")
     def output(self, audio_data, iteration):
-        filename = f"chickens_{iteration:02d}.wav"
+        filename = os.path.join(self.out_dir, f"{self.prefix}_{iteration:02d}.wav")
+        if self.headless:
+            if iteration == self.num_loops:
+                self.created_files.append(filename)
+                wavfile.write(filename, self.fs, audio_data.astype(np.float32, copy=False))
+            return
         self.created_files.append(filename)
         print(f"\n[Playing {filename}]")
         sd.play(audio_data, self.fs)
         sd.wait()
-        wavfile.write(filename, self.fs, audio_data.astype(np.float32))
+        wavfile.write(filename, self.fs, audio_data.astype(np.float32, copy=False))
 
     def perform(self):
         self.get_sound()
+        self.accumulator = Accumulator(self.source_audio)
+        self._track_accumulator()
         initial_fade_len = len(self.source_audio) / self.fs
 
         for i in range(1, self.num_loops + 1):
+            self.session.tick()
             print(f"\n{'='*55}\n   LOOP {i} / {self.num_loops}\n{'='*55}")
             
             # --- 1. GENERATE NEW GHOST FROM THE PREVIOUS LOOP ---
@@ -94,47 +145,44 @@ class ChickenChurner:
             new_ghost_layer = self.transform_slow_down(self.previous_iteration)
             
             # Stochastic FX
-            if random.random() > 0.5:
-                new_ghost_layer = np.clip(new_ghost_layer * 2.5, -1.0, 1.0)
-            if random.random() > 0.5:
-                ir = np.random.normal(0, 0.01, int(self.fs * 0.5)) * np.exp(-5 * np.linspace(0, 1, int(self.fs * 0.5)))
-                new_ghost_layer = np.convolve(new_ghost_layer, ir, mode='full')
+            if self.session.chance("distortion") > 0.5:
+                dsp.clip(np.multiply(new_ghost_layer, 2.5, out=new_ghost_layer), out=new_ghost_layer)
+            if self.session.chance("reverb") > 0.5:
+                ir = (self.session.normal("reverb_ir", 0, 0.01, int(self.fs * 0.5)) * np.exp(-5 * np.linspace(0, 1, int(self.fs * 0.5)))).astype(np.float32)
+                with stage("reverb"):
+                    new_ghost_layer = np.convolve(new_ghost_layer, ir, mode='full')
 
             # --- 2. SCALE AND FADE NEW LAYER ---
-            scaled_layer = new_ghost_layer * (1.0 / i)
+            scaled_layer = np.multiply(new_ghost_layer, 1.0 / i, out=new_ghost_layer)
             fade_len = max(0, initial_fade_len - (self.fade_decrement * (i - 1)))
             faded_new_layer = self.apply_curved_fade(scaled_layer, fade_len)
 
             # --- 3. MERGE INTO ACCUMULATOR ---
-            if self.accumulator is None:
-                self.accumulator = faded_new_layer
-            else:
-                max_len = max(len(self.accumulator), len(faded_new_layer))
-                temp_acc = np.zeros(max_len)
-                temp_acc[:len(self.accumulator)] += self.accumulator
-                temp_acc[:len(faded_new_layer)] += faded_new_layer
-                self.accumulator = temp_acc
+            # The source went in first, so the sum already is Source + Accumulator
+            self.accumulator.add(faded_new_layer)
 
             # --- 4. FINAL MIX: Source + Accumulator ---
-            total_len = max(len(self.source_audio), len(self.accumulator))
-            final_mix = np.zeros(total_len)
-            final_mix[:len(self.source_audio)] += self.source_audio
-            final_mix[:len(self.accumulator)] += self.accumulator
-            
-            # Normalize
-            max_val = np.max(np.abs(final_mix))
-            if max_val > 0: final_mix /= max_val
+            # Normalize (in place: final_mix is a view of the accumulator's buffer)
+            final_mix = self.accumulator.normalize()
 
             # --- 5. STORE FOR NEXT GENERATION ---
             self.previous_iteration = final_mix
             
+            self.session.end_block(final_mix)
             self.output(final_mix, i)
-            time.sleep(0.5)
+            budget.enforce()
+            if not self.headless:
+                time.sleep(0.5)
         
         # Cleanup
         for file in self.created_files[1:]:
             if os.path.exists(file): os.remove(file)
 
 if __name__ == "__main__":
-    churner = ChickenChurner()
-    churner.perform()
\ No newline at end of file
+    session = Session.from_argv("isabella", checkpoint=1)
+    profiler.install("isabella")
+    try:
+        churner = ChickenChurner(session=session)
+        churner.perform()
+    finally:
+        session.close()
\ No newline at end of file
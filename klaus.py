@@ -4,12 +4,22 @@
 
 import sounddevice as sd
 import numpy as np
-from scipy.interpolate import interp1d
 import queue
+import sys
 import time
+from churn import dsp, graph, resample, reverb
+from churn.drift import DriftBuffer, POLICIES
+from churn.profile import profiler, stage
+
+# --- Streaming mode (default) ---
+STREAM_BLOCK = 512        # Duplex block: input -> stretch -> output in one callback
+STRETCH = 1.19
+STRETCH_QUALITY = 'good'  # churn.resample level for the stretch: 'linear' | 'fast' | 'good' | 'best'
+TARGET_MS = 50            # Output latency the drift policy holds the buffer at
+DRIFT_POLICY = 'crossfade'  # 'resync' | 'crossfade' | 'ratematch' (or 'segment' for the 3 s block mode)
 
 class SmartAudioProcessor:
-    def __init__(self, sample_rate=44100, segment_duration=3):
+    def __init__(self, sample_rate=44100, segment_duration=3, mode='stream', drift_policy=DRIFT_POLICY):
         self.fs = sample_rate
         self.segment_len = int(sample_rate * segment_duration)
         self.buffer = queue.Queue()
@@ -17,28 +27,28 @@ class SmartAudioProcessor:
         
         # Threshold for "50% utilization" (half of the 3s segment duration)
         self.limit_threshold = segment_duration * 0.5 
+        self.reverb = reverb.Reverb(sample_rate, gain=0.6)  # Tail carries from segment to segment
+
+        # Streaming mode: the stretch carries its read position across small blocks and the
+        # drift policy keeps the extra 19% from piling up, so no flush is ever needed
+        self.mode = mode
+        self.stretcher = graph.Graph([graph.Resample(STRETCH, STRETCH_QUALITY)], block=STREAM_BLOCK, fs=sample_rate)
+        self.drift = DriftBuffer(sample_rate, target=int(TARGET_MS * sample_rate / 1000), policy=drift_policy)
 
+    @stage("stretch")
     def stretch_audio(self, audio_data, factor=1.19):
-        n_samples = len(audio_data)
-        new_n_samples = int(n_samples * factor)
-        old_indices = np.linspace(0, n_samples - 1, n_samples)
-        new_indices = np.linspace(0, n_samples - 1, new_n_samples)
-        
-        interpolator = interp1d(old_indices, audio_data, axis=0, kind='linear')
-        return interpolator(new_indices).astype(np.float32)
+        return resample.resample(audio_data, factor, STRETCH_QUALITY).reshape(-1, 1)
 
+    @stage("reverb")
     def add_reverb(self, audio_data):
-        delay = int(self.fs * 0.15)
-        decay = 0.4
-        out = np.zeros_like(audio_data)
-        out[delay:] = audio_data[:-delay] * decay
-        return (audio_data + out) * 0.6
+        return self.reverb.process(audio_data)
 
+    @stage("input_callback")
     def input_callback(self, indata, frames, time_info, status):
         start_time = time.time()
         
         # --- THE TRANSFORMATION ---
-        stretched = self.stretch_audio(indata.copy(), factor=1.19)
+        stretched = self.stretch_audio(indata, factor=1.19)
         #transformed = self.add_reverb(stretched)
         transformed = stretched
         
@@ -57,6 +67,13 @@ class SmartAudioProcessor:
         for sample in transformed:
             self.buffer.put(sample)
 
+    @stage("callback")
+    def stream_callback(self, indata, outdata, frames, time_info, status):
+        stretched = self.stretcher.process(indata[:, 0])
+        self.drift.write(stretched)
+        self.drift.read(outdata[:, 0])
+
+    @stage("output_callback")
     def output_callback(self, outdata, frames, time_info, status):
         for i in range(frames):
             try:
@@ -64,7 +81,18 @@ class SmartAudioProcessor:
             except queue.Empty:
                 outdata[i] = 0 # Silence if we run out of audio
 
+    def run_stream(self):
+        print(f"Streaming {STRETCH}x stretch, {STREAM_BLOCK}-sample blocks, {self.drift.policy} drift policy.")
+        with sd.Stream(channels=1, samplerate=self.fs, blocksize=STREAM_BLOCK,
+                       callback=self.stream_callback):
+            print("Live. Press Ctrl+C to stop.")
+            while True:
+                sd.sleep(5000)
+                print(self.drift.report())
+
     def run(self):
+        if self.mode == 'stream':
+            return self.run_stream()
         print(f"Monitoring load. Limit: {self.limit_threshold}s processing time.")
         
         with sd.InputStream(channels=1, samplerate=self.fs, 
@@ -80,7 +108,15 @@ class SmartAudioProcessor:
                     sd.sleep(1000)
 
 if __name__ == "__main__":
-    proc = SmartAudioProcessor()
+    profiler.install("klaus")
+    # python3 klaus.py [resync|crossfade|ratematch|segment]
+    choice = sys.argv[1] if len(sys.argv) > 1 else DRIFT_POLICY
+    if choice == 'segment':
+        proc = SmartAudioProcessor(mode='segment')
+    elif choice in POLICIES:
+        proc = SmartAudioProcessor(drift_policy=choice)
+    else:
+        sys.exit(f"usage: klaus.py [{'|'.join(POLICIES)}|segment]")
     try:
         proc.run()
     except KeyboardInterrupt:
@@ -2,10 +2,13 @@
 # gaps: yes
 import sounddevice as sd
 import numpy as np
-from scipy.interpolate import interp1d
 from scipy.signal import butter, lfilter
 import queue
 import time
+from churn import dsp, resample, reverb
+from churn.profile import profiler, stage
+
+STRETCH_QUALITY = 'good'  # churn.resample level for the stretch: 'linear' | 'fast' | 'good' | 'best'
 
 class LoFiFeedbackProcessor:
     def __init__(self, sample_rate=44100, segment_duration=3):
@@ -17,35 +20,28 @@ class LoFiFeedbackProcessor:
         self.last_output_segment = np.zeros((self.segment_len, 1), dtype=np.float32)
         self.sample_from_mic = True
         self.limit_threshold = segment_duration * 0.5 
+        # One reverb voice for the whole stream: its tail carries from segment to segment
+        self.reverb = reverb.Reverb(sample_rate, gain=0.6)
 
+    @stage("low_pass")
     def low_pass_filter(self, data, cutoff=2500):
         """Removes harsh high frequencies from the feedback loop."""
         nyquist = 0.5 * self.fs
         normal_cutoff = cutoff / nyquist
         # 2nd order Butterworth for a smooth roll-off
         b, a = butter(2, normal_cutoff, btype='low', analog=False)
-        return lfilter(b, a, data, axis=0)
+        return lfilter(b, a, data, axis=0).astype(np.float32)
 
+    @stage("stretch")
     def stretch_audio(self, audio_data, factor=1.19):
-        data_flat = audio_data.flatten()
-        n_samples = len(data_flat)
-        new_n_samples = int(n_samples * factor)
-        
-        old_indices = np.linspace(0, n_samples - 1, n_samples)
-        new_indices = np.linspace(0, n_samples - 1, new_n_samples)
-        
-        # Fast interpolation
-        stretched = np.interp(new_indices, old_indices, data_flat)
-        return stretched.astype(np.float32).reshape(-1, 1)
+        # Fast interpolation, float32 all the way
+        return resample.resample(audio_data, factor, STRETCH_QUALITY).reshape(-1, 1)
 
+    @stage("reverb")
     def add_reverb(self, audio_data):
-        delay = int(self.fs * 0.15)
-        decay = 0.4
-        out = np.zeros_like(audio_data)
-        if len(audio_data) > delay:
-            out[delay:] = audio_data[:-delay] * decay
-        return (audio_data + out) * 0.6
+        return self.reverb.process(audio_data)
 
+    @stage("input_callback")
     def input_callback(self, indata, frames, time_info, status):
         start_time = time.time()
         
@@ -54,7 +50,7 @@ class LoFiFeedbackProcessor:
             source_name = "MIC"
         else:
             # Apply Low-Pass Filter ONLY to the feedback loop
-            source_material = self.low_pass_filter(self.last_output_segment.copy())
+            source_material = self.low_pass_filter(self.last_output_segment)
             source_name = "FILTERED FEEDBACK"
         
         print(f"Source: {source_name} | Toggle: {self.sample_from_mic}")
@@ -76,16 +72,19 @@ class LoFiFeedbackProcessor:
             
         self.sample_from_mic = not self.sample_from_mic
 
+    @stage("output_callback")
     def output_callback(self, outdata, frames, time_info, status):
+        played = 0
         for i in range(frames):
             try:
-                val = self.buffer.get_nowait()
-                outdata[i] = val
-                # Keep the "tape" rolling
-                self.last_output_segment = np.roll(self.last_output_segment, -1, axis=0)
-                self.last_output_segment[-1] = val
+                outdata[i] = self.buffer.get_nowait()
+                played = i + 1
             except queue.Empty:
                 outdata[i] = 0
+        # Keep the "tape" rolling: one in-place shift per block instead of an np.roll per sample
+        if played:
+            with stage("fifo"):
+                dsp.push(self.last_output_segment, outdata[:played])
 
     def run(self):
         with sd.InputStream(channels=1, samplerate=self.fs, 
@@ -99,6 +98,7 @@ class LoFiFeedbackProcessor:
                     sd.sleep(1000)
 
 if __name__ == "__main__":
+    profiler.install("liliana")
     proc = LoFiFeedbackProcessor()
     try:
         proc.run()
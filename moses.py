@@ -4,6 +4,10 @@ import threading
 import queue
 import time
 from scipy.signal import butter, lfilter
+from churn import dsp, resample, reverb
+from churn.profile import profiler, stage
+
+STRETCH_QUALITY = 'good'  # churn.resample level for the stretch: 'linear' | 'fast' | 'good' | 'best'
 
 class LayerThread(threading.Thread):
     def __init__(self, layer_id, source_type, duration, fs, mixer_queue, processor):
@@ -16,55 +20,55 @@ class LayerThread(threading.Thread):
         self.processor = processor
         self.running = True
 
+    @stage("stretch_and_verb")
     def stretch_and_verb(self, data):
         if data.size == 0: 
             return None
         try:
             # Time Stretch +19%
-            n_samples = len(data)
-            new_indices = np.linspace(0, n_samples - 1, int(n_samples * 1.19))
-            stretched = np.interp(new_indices, np.arange(n_samples), data.flatten())
+            stretched = resample.resample(data, 1.19, STRETCH_QUALITY)
             
             # Reverb
-            delay = int(self.fs * 0.15)
-            out = np.zeros_like(stretched)
-            if len(stretched) > delay:
-                out[delay:] = stretched[:-delay] * 0.4
-            return ((stretched + out) * 0.5).astype(np.float32)
+            return reverb.render(stretched, self.fs, gain=0.5)
         except Exception as e:
             return None
 
+    @stage("low_pass")
     def low_pass(self, data):
         nyquist = 0.5 * self.fs
         b, a = butter(2, 2500 / nyquist, btype='low')
-        return lfilter(b, a, data, axis=0)
+        return lfilter(b, a, data, axis=0).astype(np.float32)
+
+    def capture_once(self):
+        """One pass of the loop; returns the seconds to sleep before the next."""
+        captured_chunk = self.processor.get_source_data(self.source_type)
+        
+        # Only process if we have a full 3s buffer
+        if len(captured_chunk) < (self.fs * 3):
+            return 0.5
+
+        if self.source_type == 'output':
+            captured_chunk = self.low_pass(captured_chunk)
+        
+        processed = self.stretch_and_verb(captured_chunk)
+        
+        if processed is not None:
+            self.mixer_queue.put(processed)
+        
+        return self.duration
 
     def run(self):
         print(f"Layer {self.layer_id} ({self.source_type}) initialized.")
         while self.running:
-            captured_chunk = self.processor.get_source_data(self.source_type)
-            
-            # Only process if we have a full 3s buffer
-            if len(captured_chunk) < (self.fs * 3):
-                time.sleep(0.5)
-                continue
-
-            if self.source_type == 'output':
-                captured_chunk = self.low_pass(captured_chunk)
-            
-            processed = self.stretch_and_verb(captured_chunk)
-            
-            if processed is not None:
-                self.mixer_queue.put(processed)
-            
-            time.sleep(self.duration)
+            time.sleep(self.capture_once())
 
 class MultiLayerProcessor:
     def __init__(self):
         self.fs = 44100
         self.buffer_size = int(self.fs * 3)
-        self.mic_fifo = np.zeros(self.buffer_size)
-        self.out_fifo = np.zeros(self.buffer_size)
+        self.mic_fifo = np.zeros(self.buffer_size, dtype=np.float32)
+        self.out_fifo = np.zeros(self.buffer_size, dtype=np.float32)
+        self.mix_buffer = np.zeros(0, dtype=np.float32)
         self.mixer_queue = queue.Queue()
         self.active_layers = []
         self.lock = threading.Lock()
@@ -75,45 +79,49 @@ class MultiLayerProcessor:
                 return self.mic_fifo.copy()
             return self.out_fifo.copy()
 
+    @stage("callback")
     def audio_callback(self, indata, outdata, frames, time_info, status):
         # 1. Update Input Buffer (Rolling)
-        with self.lock:
-            self.mic_fifo = np.roll(self.mic_fifo, -frames)
-            self.mic_fifo[-frames:] = indata[:, 0]
+        with self.lock, stage("fifo"):
+            dsp.push(self.mic_fifo, indata[:, 0])
         
         # 2. Pull new processed audio from threads
         while not self.mixer_queue.empty():
             self.active_layers.append(self.mixer_queue.get_nowait())
 
         # 3. Mixing
-        mixed_buffer = np.zeros(frames)
+        if len(self.mix_buffer) < frames:
+            self.mix_buffer = np.zeros(frames, dtype=np.float32)
+        mixed_buffer = self.mix_buffer[:frames]
+        mixed_buffer.fill(0)
         to_remove = []
 
-        for i, data in enumerate(self.active_layers):
-            take = min(len(data), frames)
-            mixed_buffer[:take] += data[:take]
-            self.active_layers[i] = data[take:]
-            if len(self.active_layers[i]) == 0:
-                to_remove.append(i)
+        with stage("mix"):
+            for i, data in enumerate(self.active_layers):
+                take = min(len(data), frames)
+                mixed_buffer[:take] += data[:take]
+                self.active_layers[i] = data[take:]
+                if len(self.active_layers[i]) == 0:
+                    to_remove.append(i)
 
-        for i in reversed(to_remove):
-            self.active_layers.pop(i)
+            for i in reversed(to_remove):
+                self.active_layers.pop(i)
 
         # 4. Output + Loopback Recording
-        final_out = np.clip(mixed_buffer, -1.0, 1.0)
+        final_out = dsp.clip(mixed_buffer, out=mixed_buffer)
         outdata[:, 0] = final_out
         
-        with self.lock:
-            self.out_fifo = np.roll(self.out_fifo, -frames)
-            self.out_fifo[-frames:] = final_out
+        with self.lock, stage("fifo"):
+            dsp.push(self.out_fifo, final_out)
+
+    def spawn_layers(self, x, y):
+        return [LayerThread(1, 'mic', x, self.fs, self.mixer_queue, self),
+                LayerThread(2, 'output', y, self.fs, self.mixer_queue, self),
+                LayerThread(3, 'mic', x, self.fs, self.mixer_queue, self)]
 
     def run(self, x, y):
         # Start Threads
-        l1 = LayerThread(1, 'mic', x, self.fs, self.mixer_queue, self)
-        l2 = LayerThread(2, 'output', y, self.fs, self.mixer_queue, self)
-        l3 = LayerThread(3, 'mic', x, self.fs, self.mixer_queue, self)
-        
-        for thread in [l1, l2, l3]: 
+        for thread in self.spawn_layers(x, y): 
             thread.start()
 
         with sd.Stream(channels=1, samplerate=self.fs, callback=self.audio_callback):
@@ -123,6 +131,7 @@ class MultiLayerProcessor:
                 sd.sleep(1000)
 
 if __name__ == "__main__":
+    profiler.install("moses")
     try:
         MultiLayerProcessor().run(x=2, y=4)
     except KeyboardInterrupt:
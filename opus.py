@@ -1,123 +1,147 @@
 # start time for capture layers is delayed from previous
 import sounddevice as sd
 import numpy as np
-import threading
-import queue
-import time
-import random
 from scipy.signal import butter, lfilter
+from churn.scheduler import SampleScheduler, capture_window
+from churn import activity, compress, dsp, resample, reverb
+from churn.profile import profiler, stage
+from churn.session import Session
 
-class LayerThread(threading.Thread):
-    def __init__(self, layer_id, source_type, duration_range, fs, mixer_queue, processor, initial_delay=4):
-        super().__init__(daemon=True)
+FIFO_PAD = 8192  # Extra history so a capture can end in the middle of a block
+COMPRESS_SOUNDS = True  # Queue processed sounds as int16 + per-block scales (half the RAM)
+STRETCH_QUALITY = 'good'  # churn.resample level for the stretch: 'linear' | 'fast' | 'good' | 'best'
+
+class CaptureLayer:
+    def __init__(self, layer_id, source_type, duration_range, fs, mixer_queue, session, initial_delay=4):
         self.layer_id = layer_id
         self.source_type = source_type
         self.min_dur, self.max_dur = duration_range
         self.fs = fs
         self.mixer_queue = mixer_queue
-        self.processor = processor
+        self.session = session
         self.initial_delay = initial_delay
 
     def apply_fade(self, audio, fade_len=2000):
         if len(audio) < fade_len: return audio
-        fade_out = np.linspace(1., 0., fade_len)
-        audio[-fade_len:] *= fade_out
-        return audio
+        return dsp.fade_out(audio, fade_len)
 
+    @stage("stretch_and_verb")
     def stretch_and_verb(self, data):
-        if data.size == 0 or np.max(np.abs(data)) < 0.005: 
+        data = activity.gate(data)  # Trimmed to its loud blocks; None if no block is loud
+        if data is None:
             return None
         
-        n_samples = len(data)
         # Stretch +19%
-        new_indices = np.linspace(0, n_samples - 1, int(n_samples * 1.19))
-        stretched = np.interp(new_indices, np.arange(n_samples), data.flatten())
-        
-        delay = int(self.fs * 0.15)
-        out = np.zeros_like(stretched)
-        if len(stretched) > delay:
-            out[delay:] = stretched[:-delay] * 0.4
-        
-        combined = (stretched + out) * 0.4
-        return self.apply_fade(combined.astype(np.float32))
+        stretched = resample.resample(data, 1.19, STRETCH_QUALITY)
+        combined = reverb.render(stretched, self.fs, gain=0.4)
+        return self.apply_fade(combined)
 
-    def run(self):
+    def start(self, scheduler):
         # --- THE NEW INITIAL DELAY ---
         print(f"Layer {self.layer_id} [{self.source_type}] waiting {self.initial_delay}s to warm up...")
-        time.sleep(self.initial_delay)
-        
-        print(f"Layer {self.layer_id} [{self.source_type}] starting capture loop.")
-        while True:
-            # Random interval between 2 and 7 seconds
-            current_interval = random.uniform(self.min_dur, self.max_dur)
-            time.sleep(current_interval)
-            
-            data = self.processor.get_source_data(self.source_type)
-            processed = self.stretch_and_verb(data)
-            if processed is not None:
-                self.mixer_queue.put(processed)
+        interval = self.session.uniform(f"interval {self.layer_id}", self.min_dur, self.max_dur)
+        scheduler.schedule_in(self.initial_delay + interval, self)
+
+    def schedule(self, scheduler, origin=None):
+        # Random interval between 2 and 7 seconds, counted on the sample clock
+        interval = self.session.uniform(f"interval {self.layer_id}", self.min_dur, self.max_dur)
+        scheduler.schedule_in(interval, self, origin)
+
+    def process(self, data):
+        """Runs on the worker pool with the window captured at the event's sample."""
+        processed = self.stretch_and_verb(data)
+        if processed is not None:
+            self.mixer_queue.put(compress.pack(processed, COMPRESS_SOUNDS))
 
 class MultiLayerProcessor:
-    def __init__(self):
+    def __init__(self, session=None):
         self.fs = 44100
         self.buffer_size = int(self.fs * 3)
-        self.mic_fifo = np.zeros(self.buffer_size)
-        self.out_fifo = np.zeros(self.buffer_size)
-        self.mixer_queue = queue.Queue()
-        self.active_sounds = [] 
-        self.lock = threading.Lock()
+        self.mic_fifo = np.zeros(self.buffer_size + FIFO_PAD, dtype=np.float32)
+        self.out_fifo = np.zeros(self.buffer_size + FIFO_PAD, dtype=np.float32)
+        self.mix_buffer = np.zeros(0, dtype=np.float32)
+        self.session = session or Session()
+        self.mixer_queue = self.session.mixer_queue()
+        self.active_sounds = []
+        self.scheduler = SampleScheduler(self.fs)
 
-    def get_source_data(self, source_type):
-        with self.lock:
-            return self.mic_fifo.copy() if source_type == 'mic' else self.out_fifo.copy()
+    def get_source_data(self, source_type, frames, offset):
+        fifo = self.mic_fifo if source_type == 'mic' else self.out_fifo
+        return capture_window(fifo, frames, offset, self.buffer_size)
 
+    @stage("callback")
     def audio_callback(self, indata, outdata, frames, time_info, status):
+        self.session.tick(indata)
         # 1. Update Microphone Buffer
-        with self.lock:
-            self.mic_fifo = np.roll(self.mic_fifo, -frames)
-            self.mic_fifo[-frames:] = indata[:, 0]
+        with stage("fifo"):
+            dsp.push(self.mic_fifo, indata[:, 0])
         
         # 2. Collect new layers
         while not self.mixer_queue.empty():
-            self.active_sounds.append(self.mixer_queue.get_nowait())
+            self.active_sounds.append((self.mixer_queue.get_nowait(), 0))
 
         # 3. Mixdown active sounds
-        mixed_out = np.zeros(frames)
+        if len(self.mix_buffer) < frames:
+            self.mix_buffer = np.zeros(frames, dtype=np.float32)
+        mixed_out = self.mix_buffer[:frames]
+        mixed_out.fill(0)
         still_playing = []
         
-        for sound in self.active_sounds:
-            take = min(len(sound), frames)
-            mixed_out[:take] += sound[:take]
-            if len(sound) > frames:
-                still_playing.append(sound[frames:])
+        with stage("mix"):
+            for sound, pos in self.active_sounds:
+                take = min(len(sound) - pos, frames)
+                compress.mix(sound, pos, mixed_out[:take])
+                if pos + take < len(sound):
+                    still_playing.append((sound, pos + take))
         
         self.active_sounds = still_playing
 
         # 4. Limit and Stream Out
-        final_signal = np.clip(mixed_out, -1.0, 1.0)
+        final_signal = dsp.clip(mixed_out, out=mixed_out)
         outdata[:, 0] = final_signal
+        self.session.end_block(final_signal)
         
         # 5. Update Output Memory
-        with self.lock:
-            self.out_fifo = np.roll(self.out_fifo, -frames)
-            self.out_fifo[-frames:] = final_signal
+        with stage("fifo"):
+            dsp.push(self.out_fifo, final_signal)
 
-    def run(self):
-        num_layers = random.randint(3, 6)
+        # 6. Fire captures due in this block at their exact sample; DSP goes to the pool
+        for pos, offset, layer in self.scheduler.advance(frames):
+            data = self.get_source_data(layer.source_type, frames, offset)
+            self.session.submit(self.scheduler, layer.process, data)
+            layer.schedule(self.scheduler, origin=pos)
+
+    def spawn_layers(self):
+        num_layers = self.session.randint("layers", 3, 6)
         print(f"--- Spawning {num_layers} Layers with 4s startup delay ---")
 
         for i in range(num_layers):
             source = 'mic' if i % 2 == 0 else 'output'
             # Each layer gets the 4s initial_delay
-            layer = LayerThread(i+1, source, (2, 7), self.fs, self.mixer_queue, self, initial_delay=4)
-            layer.start()
+            layer = CaptureLayer(i+1, source, (2, 7), self.fs, self.mixer_queue, self.session, initial_delay=4)
+            layer.start(self.scheduler)
 
+    def replay(self):
+        """Re-runs a recorded session offline at full speed (no audio device)."""
+        self.spawn_layers()
+        self.session.replay(self.audio_callback, self.fs)
+
+    def run(self):
+        self.spawn_layers()
         with sd.Stream(channels=1, samplerate=self.fs, callback=self.audio_callback):
             while True:
                 sd.sleep(1000)
 
 if __name__ == "__main__":
+    session = Session.from_argv("opus")
+    profiler.install("opus")
     try:
-        MultiLayerProcessor().run()
+        processor = MultiLayerProcessor(session)
+        if session.mode == 'replay':
+            processor.replay()
+        else:
+            processor.run()
     except KeyboardInterrupt:
-        print("\nStopping loopers...")
\ No newline at end of file
+        print("\nStopping loopers...")
+    finally:
+        session.close()
\ No newline at end of file
@@ -1,115 +1,133 @@
 import sounddevice as sd
 import numpy as np
 import threading
-import queue
 import time
-import random
 import librosa
+from churn.scheduler import SampleScheduler, capture_window
+from churn.admission import AdmissionController
+from churn import activity, dsp, reverb
+from churn.profile import profiler, stage
+from churn.session import Session
 
-class CaptureLayer(threading.Thread):
-    def __init__(self, layer_id, source_type, duration_range, fs, mixer_queue, processor, initial_delay=4):
-        super().__init__(daemon=True)
+FIFO_PAD = 8192  # Extra history so a capture can end in the middle of a block
+
+class CaptureLayer:
+    def __init__(self, layer_id, source_type, duration_range, fs, mixer_queue, session, initial_delay=4):
         self.layer_id = layer_id
         self.source_type = source_type
         self.min_dur, self.max_dur = duration_range
         self.fs = fs
         self.mixer_queue = mixer_queue
-        self.processor = processor
+        self.session = session
         self.initial_delay = initial_delay
 
+    @stage("stretch_and_verb")
     def stretch_and_verb(self, data):
-        if data.size == 0 or np.max(np.abs(data)) < 0.005: 
+        data = activity.gate(data)  # Trimmed to its loud blocks; None if no block is loud
+        if data is None:
             return None
         try:
-            stretched = librosa.effects.time_stretch(data.flatten(), rate=0.84)
-            delay = int(self.fs * 0.15)
-            out = np.zeros_like(stretched)
-            if len(stretched) > delay:
-                out[delay:] = stretched[:-delay] * 0.4
+            stretched = dsp.as_f32(librosa.effects.time_stretch(dsp.as_f32(data), rate=0.84))
+            combined = reverb.render(stretched, self.fs, gain=0.3)
             
             # Fade out last 2000 samples
-            if len(stretched) > 2000:
-                stretched[-2000:] *= np.linspace(1., 0., 2000)
+            if len(combined) > 2000:
+                dsp.fade_out(combined, 2000)
                 
-            return ((stretched + out) * 0.3).astype(np.float32)
+            return combined
         except:
             return None
 
-    def run(self):
-        time.sleep(self.initial_delay)
-        while True:
-            time.sleep(random.uniform(self.min_dur, self.max_dur))
-            
-            # Check current allowed capacity from processor
-            if self.processor.get_writing_layer_count() >= self.processor.allowed_capacity:
-                continue
-            
-            data = self.processor.get_source_data(self.source_type)
-            processed = self.stretch_and_verb(data)
-            if processed is not None:
-                self.mixer_queue.put(processed)
+    def start(self, scheduler):
+        interval = self.session.uniform(f"interval {self.layer_id}", self.min_dur, self.max_dur)
+        scheduler.schedule_in(self.initial_delay + interval, self)
+
+    def schedule(self, scheduler, origin=None):
+        interval = self.session.uniform(f"interval {self.layer_id}", self.min_dur, self.max_dur)
+        scheduler.schedule_in(interval, self, origin)
+
+    def process(self, data):
+        """Runs on the worker pool with the window captured at the event's sample."""
+        processed = self.stretch_and_verb(data)
+        if processed is not None:
+            self.mixer_queue.put(processed)
 
 class MultiLayerProcessor:
-    def __init__(self):
+    def __init__(self, session=None):
         self.fs = 44100
         self.buffer_size = int(self.fs * 3)
-        self.mic_fifo = np.zeros(self.buffer_size)
-        self.out_fifo = np.zeros(self.buffer_size)
-        self.mixer_queue = queue.Queue()
+        self.mic_fifo = np.zeros(self.buffer_size + FIFO_PAD, dtype=np.float32)
+        self.out_fifo = np.zeros(self.buffer_size + FIFO_PAD, dtype=np.float32)
+        self.mix_buffer = np.zeros(0, dtype=np.float32)
+        self.session = session or Session()
+        self.mixer_queue = self.session.mixer_queue()
         self.writing_layers = []  
         self.lock = threading.Lock()
+        self.scheduler = SampleScheduler(self.fs)
         
-        # Capacity Logic
+        # Capacity Logic: measured load sets the limit, the oscillation caps it
         self.allowed_capacity = 2
         self.num_capture_layers = 0
+        self.admission = AdmissionController(self.fs, floor=2)
+        self.admission.cap = self.allowed_capacity
 
     def get_writing_layer_count(self):
         with self.lock:
             return len(self.writing_layers)
 
-    def get_source_data(self, source_type):
-        with self.lock:
-            return self.mic_fifo.copy() if source_type == 'mic' else self.out_fifo.copy()
+    def get_source_data(self, source_type, frames, offset):
+        fifo = self.mic_fifo if source_type == 'mic' else self.out_fifo
+        return capture_window(fifo, frames, offset, self.buffer_size)
 
     def capacity_controller(self):
-        """Slowly oscillates allowed_capacity between 2 and 2*Z."""
-        target_max = self.num_capture_layers * 2
+        """Slowly oscillates the upper bound on capacity between 2 and 2*Z."""
         direction = 1 # 1 for increasing, -1 for decreasing
         
         while True:
             time.sleep(10) # Change limit every 10 seconds
+            direction = self.shift_capacity(direction)
+
+    def shift_capacity(self, direction):
+        """One step of the oscillation; returns the direction of the next one."""
+        target_max = self.num_capture_layers * 2
+        new_val = self.allowed_capacity + direction
             
-            new_val = self.allowed_capacity + direction
+        if new_val >= target_max:
+            new_val = target_max
+            direction = -1
+            print(f"\n--- Capacity Peak: {new_val} (Decreasing...) ---")
+        elif new_val <= 2:
+            new_val = 2
+            direction = 1
+            print(f"\n--- Capacity Floor: {new_val} (Increasing...) ---")
+        else:
+            print(f"\n--- Capacity Shift: {new_val} Layers Allowed ---")
             
-            if new_val >= target_max:
-                new_val = target_max
-                direction = -1
-                print(f"\n--- Capacity Peak: {new_val} (Decreasing...) ---")
-            elif new_val <= 2:
-                new_val = 2
-                direction = 1
-                print(f"\n--- Capacity Floor: {new_val} (Increasing...) ---")
-            else:
-                print(f"\n--- Capacity Shift: {new_val} Layers Allowed ---")
-                
-            self.allowed_capacity = new_val
+        self.allowed_capacity = new_val
+        self.admission.cap = new_val
+        print(f"    {self.admission.report()}")
+        return direction
 
+    @stage("callback")
     def audio_callback(self, indata, outdata, frames, time_info, status):
-        with self.lock:
-            self.mic_fifo = np.roll(self.mic_fifo, -frames)
-            self.mic_fifo[-frames:] = indata[:, 0]
+        self.session.tick(indata)
+        started = self.admission.block_started()
+        with self.lock, stage("fifo"):
+            dsp.push(self.mic_fifo, indata[:, 0])
         
         while not self.mixer_queue.empty():
             with self.lock:
-                if len(self.writing_layers) < self.allowed_capacity:
-                    self.writing_layers.append(self.mixer_queue.get_nowait())
-                else:
-                    try: self.mixer_queue.get_nowait()
-                    except: pass
+                sound = self.mixer_queue.get_nowait()
+                # Load-driven, so logged for replay
+                if self.session.decide("admit", lambda: self.admission.admit(len(self.writing_layers))):
+                    self.writing_layers.append(sound)
 
-        mixed_out = np.zeros(frames)
+        if len(self.mix_buffer) < frames:
+            self.mix_buffer = np.zeros(frames, dtype=np.float32)
+        mixed_out = self.mix_buffer[:frames]
+        mixed_out.fill(0)
         still_writing = []
-        with self.lock:
+        with self.lock, stage("mix"):
             for sound in self.writing_layers:
                 take = min(len(sound), frames)
                 mixed_out[:take] += sound[:take]
@@ -118,30 +136,55 @@ class MultiLayerProcessor:
                     still_writing.append(still_playing)
             self.writing_layers = still_writing
 
-        final_signal = np.clip(mixed_out, -1.0, 1.0)
+        final_signal = dsp.clip(mixed_out, out=mixed_out)
         outdata[:, 0] = final_signal
+        self.session.end_block(final_signal)
         
-        with self.lock:
-            self.out_fifo = np.roll(self.out_fifo, -frames)
-            self.out_fifo[-frames:] = final_signal
+        with self.lock, stage("fifo"):
+            dsp.push(self.out_fifo, final_signal)
 
-    def run(self):
-        self.num_capture_layers = random.randint(3, 6)
+        for pos, offset, layer in self.scheduler.advance(frames):
+            # Check current allowed capacity before spending a worker on it
+            if len(self.writing_layers) < self.session.decide("allowed", self.admission.allowed):
+                data = self.get_source_data(layer.source_type, frames, offset)
+                self.session.submit(self.scheduler, layer.process, data)
+            layer.schedule(self.scheduler, origin=pos)
+
+        self.admission.block_finished(started, frames, self.scheduler.backlog() + self.mixer_queue.qsize())
+
+    def spawn_layers(self):
+        self.num_capture_layers = self.session.randint("layers", 3, 6)
         print(f"--- {self.num_capture_layers} Capture Layers Spawned ---")
-        
-        # Start Capacity Controller
-        threading.Thread(target=self.capacity_controller, daemon=True).start()
 
         for i in range(self.num_capture_layers):
             source = 'mic' if i % 2 == 0 else 'output'
-            CaptureLayer(i+1, source, (2, 7), self.fs, self.mixer_queue, self).start()
+            CaptureLayer(i+1, source, (2, 7), self.fs, self.mixer_queue, self.session).start(self.scheduler)
+
+    def replay(self):
+        """Re-runs a recorded session offline at full speed (no audio device, admission taken from the log)."""
+        self.spawn_layers()
+        self.session.replay(self.audio_callback, self.fs)
+
+    def run(self):
+        self.spawn_layers()
+        
+        # Start Capacity Controller
+        threading.Thread(target=self.capacity_controller, daemon=True).start()
 
         with sd.Stream(channels=1, samplerate=self.fs, callback=self.audio_callback):
             while True:
                 sd.sleep(1000)
 
 if __name__ == "__main__":
+    session = Session.from_argv("penny")
+    profiler.install("penny")
     try:
-        MultiLayerProcessor().run()
+        processor = MultiLayerProcessor(session)
+        if session.mode == 'replay':
+            processor.replay()
+        else:
+            processor.run()
     except KeyboardInterrupt:
-        print("\nExit.")
\ No newline at end of file
+        print("\nExit.")
+    finally:
+        session.close()
\ No newline at end of file
@@ -1,4 +1,4 @@
 # audio/__init__.py
-from .io import InputStream, OutputStream
+from .io import InputStream, OutputStream, DuplexStream
 from .sample import Sample
 from .effects import AudioTransformer
\ No newline at end of file
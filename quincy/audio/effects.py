@@ -1,20 +1,28 @@
 import numpy as np
 from audio.sample import Sample
+from churn import graph, jit
+from churn.profile import stage
 
 class AudioTransformer:
+    def __init__(self, rate=44100, block=graph.BLOCK):
+        # Distortion -> reverb as a block-streaming graph (same graph live and offline)
+        self.graph = graph.Graph([
+            graph.Drive(2.5),
+            graph.Comb(int(0.100 * rate), 0.3),
+            # Example: Slow down by 50% without pitch correction
+            # graph.Stretch(1.5),
+        ], block=block, fs=rate)
+
+    @stage("process")
     def process(self, sample):
-        """Pipeline entry point."""
-        data = sample.data
-        
-        # Example: Apply effects in sequence
-        data = self.distortion(data, gain=2.5)
-        data = self.reverb(data, delay_ms=100, decay=0.3, sample_rate=sample.rate)
-        
-        # Example: Slow down by 50% without pitch correction
-        # data = self.stretch(data, factor=1.5, retain_pitch=False)
-        
-        return Sample(data, sample.rate)
+        """Pipeline entry point: the whole Sample through a fresh copy of the graph."""
+        return Sample(self.graph.render(sample.data), sample.rate)
+
+    def callback(self, indata, outdata, frames, time, status):
+        """Live: runs the graph on each block of a duplex stream (one block of latency)."""
+        self.graph.callback(indata, outdata, frames, time, status)
 
+    @stage("stretch")
     def stretch(self, data, factor, retain_pitch=False):
         """
         factor > 1.0 = Slower
@@ -34,14 +42,13 @@ class AudioTransformer:
                 data
             )
 
+    @stage("reverb")
     def reverb(self, data, delay_ms, decay, sample_rate):
         """Simple Feedback Delay (Comb Filter)"""
         delay_samples = int((delay_ms / 1000) * sample_rate)
-        out = np.copy(data)
-        for i in range(delay_samples, len(data)):
-            out[i] += out[i - delay_samples] * decay
-        return out
+        return jit.comb(data, delay_samples, decay)
 
+    @stage("distortion")
     def distortion(self, data, gain):
         """Soft-clipping using Hyperbolic Tangent"""
         return np.tanh(data * gain)
\ No newline at end of file
@@ -19,4 +19,16 @@ class OutputStream:
         """Sends the Sample data to your speakers."""
         print(f"Playing {len(sample.data)} samples...")
         sd.play(sample.data, sample.rate)
-        sd.wait() # Wait until audio finishes playing
\ No newline at end of file
+        sd.wait() # Wait until audio finishes playing
+
+class DuplexStream:
+    """Mic -> AudioTransformer graph -> speakers in one stream: one graph block of latency."""
+    def __init__(self, transformer, rate=44100):
+        self.transformer = transformer
+        self.rate = rate
+
+    def run(self):
+        with sd.Stream(samplerate=self.rate, channels=1, blocksize=self.transformer.graph.block,
+                       callback=self.transformer.callback):
+            while True:
+                sd.sleep(1000)
\ No newline at end of file
@@ -1,17 +1,31 @@
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # for 'churn'
 
 from audio.io import InputStream
 from audio.effects import AudioTransformer
 
-from audio.io import InputStream, OutputStream
+from audio.io import InputStream, OutputStream, DuplexStream
 from audio.effects import AudioTransformer
+from churn import jit
+from churn.profile import profiler
 
 def main():
     mic = InputStream()
     speakers = OutputStream()
     fx = AudioTransformer()
+    print(f"DSP backend: {jit.warmup()}")
+    profiler.install("quincy")
+
+    if "--stream" in sys.argv[1:]:
+        # Live: the effect graph runs inside one duplex callback, block by block
+        print(f"Streaming {fx.graph.describe()} ({fx.graph.block} samples of latency). Press Ctrl+C to stop.")
+        try:
+            DuplexStream(fx).run()
+        except KeyboardInterrupt:
+            print("\nStream stopped.")
+        return
 
     print("Processing... Press Ctrl+C to stop.")
     
@@ -1,26 +1,37 @@
 # audio/effects.py
 import numpy as np
+from churn import graph, jit
+from churn.profile import stage
 
 class AudioTransformer:
+    def __init__(self, rate=44100, block=graph.BLOCK):
+        # Chain your effects: stateful nodes run block by block, elementwise ones fused
+        self.rate = rate
+        self.graph = graph.Graph([
+            graph.Drive(2.0),
+            graph.Comb(int(0.100 * rate), 0.4),
+        ], block=block, fs=rate)
+
+    @stage("process")
     def process(self, data, rate):
         """Processes raw numpy data and returns raw numpy data."""
-        # Chain your effects
-        data = self.distortion(data, gain=2.0)
-        data = self.reverb(data, delay_ms=100, decay=0.4, sample_rate=rate)
-        
-        return data  # Returning raw numpy array
+        return self.graph.render(data)  # Fresh graph state per buffer
+
+    def callback(self, indata, outdata, frames, time, status):
+        """Live: the same graph on each block of a duplex stream."""
+        self.graph.callback(indata, outdata, frames, time, status)
 
+    @stage("stretch")
     def stretch(self, data, factor, retain_pitch=False):
         # ... (Your stretch logic)
         return data
 
+    @stage("reverb")
     def reverb(self, data, delay_ms, decay, sample_rate):
         delay_samples = int((delay_ms / 1000) * sample_rate)
-        out = np.copy(data)
-        # Simple feedback loop
-        for i in range(delay_samples, len(data)):
-            out[i] += out[i - delay_samples] * decay
-        return out
+        # Simple feedback loop (compiled when Numba is installed)
+        return jit.comb(data, delay_samples, decay)
 
+    @stage("distortion")
     def distortion(self, data, gain):
         return np.tanh(data * gain)
\ No newline at end of file
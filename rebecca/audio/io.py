@@ -43,4 +43,16 @@ class OutputStream:
 
     def feed(self, sample):
         """Accepts a Sample object and puts its raw data into the playback queue."""
-        self.queue.put(sample.data)
\ No newline at end of file
+        self.queue.put(sample.data)
+
+class DuplexStream:
+    """Mic -> AudioTransformer graph -> speakers in one stream: one graph block of latency."""
+    def __init__(self, transformer, rate=44100):
+        self.transformer = transformer
+        self.rate = rate
+
+    def run(self):
+        with sd.Stream(samplerate=self.rate, channels=1, blocksize=self.transformer.graph.block,
+                       callback=self.transformer.callback):
+            while True:
+                sd.sleep(1000)
\ No newline at end of file
@@ -1,6 +1,12 @@
-from audio.io import InputStream, OutputStream
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # for 'churn'
+
+from audio.io import InputStream, OutputStream, DuplexStream
 from audio.sample import Sampler
 from audio.effects import AudioTransformer
+from churn import jit
+from churn.profile import profiler
 
 def main():
     # Setup hardware
@@ -10,6 +16,17 @@ def main():
     # Setup logic
     sampler = Sampler()
     fx = AudioTransformer()
+    print(f"DSP backend: {jit.warmup()}")
+    profiler.install("rebecca")
+
+    if "--stream" in sys.argv[1:]:
+        # Live: the effect graph runs inside one duplex callback, block by block
+        print(f"Streaming {fx.graph.describe()} ({fx.graph.block} samples of latency). Press Ctrl+C to stop.")
+        try:
+            DuplexStream(fx).run()
+        except KeyboardInterrupt:
+            print("\nStopping...")
+        return
 
     # Start independent threads
     mic.start()
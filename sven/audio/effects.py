@@ -1,13 +1,27 @@
 import numpy as np
+from churn import graph, jit
+from churn.profile import stage
 
 class AudioTransformer:
+    def __init__(self, rate=44100, block=graph.BLOCK):
+        """Standard DSP pipeline, as a block-streaming graph."""
+        self.rate = rate
+        self.graph = graph.Graph([
+            # graph.Stretch(1.5),  # Example: 1.5x slower, lower pitch
+            graph.Drive(1.5),
+            graph.Comb(int(0.150 * rate), 0.3),
+        ], block=block, fs=rate)
+
+    @stage("process")
     def process(self, data, rate):
-        """Standard DSP pipeline."""
-        # data = self.stretch(data, factor=1.5) # Example: 1.5x slower, lower pitch
-        data = self.distortion(data, gain=1.5)
-        data = self.reverb(data, delay_ms=150, decay=0.3, sample_rate=rate)
-        return data
+        # Each sampler thread renders through its own fresh copy of the graph
+        return self.graph.render(data)
+
+    def callback(self, indata, outdata, frames, time, status):
+        """Live: the same graph on each block of a duplex stream."""
+        self.graph.callback(indata, outdata, frames, time, status)
 
+    @stage("stretch")
     def stretch(self, data, factor):
         """
         Resamples audio. Pitch and Speed are linked.
@@ -22,12 +36,11 @@ class AudioTransformer:
         # Map the original data onto the new indices
         return np.interp(new_indices, np.arange(len(data)), data)
 
+    @stage("reverb")
     def reverb(self, data, delay_ms, decay, sample_rate):
         delay_samples = int((delay_ms / 1000) * sample_rate)
-        out = np.copy(data)
-        for i in range(delay_samples, len(data)):
-            out[i] += out[i - delay_samples] * decay
-        return out
+        return jit.comb(data, delay_samples, decay)
 
+    @stage("distortion")
     def distortion(self, data, gain):
         return np.tanh(data * gain)
\ No newline at end of file
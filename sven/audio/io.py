@@ -50,4 +50,16 @@ class OutputStream:
         if delay_sec <= 0:
             threading.Thread(target=self._play_task, args=(sample.data,), daemon=True).start()
         else:
-            threading.Timer(delay_sec, self._play_task, args=(sample.data,)).start()
\ No newline at end of file
+            threading.Timer(delay_sec, self._play_task, args=(sample.data,)).start()
+
+class DuplexStream:
+    """Mic -> AudioTransformer graph -> speakers in one stream: one graph block of latency."""
+    def __init__(self, transformer, rate=44100):
+        self.transformer = transformer
+        self.rate = rate
+
+    def run(self):
+        with sd.Stream(samplerate=self.rate, channels=1, blocksize=self.transformer.graph.block,
+                       callback=self.transformer.callback):
+            while True:
+                sd.sleep(1000)
\ No newline at end of file
@@ -2,25 +2,72 @@ import sounddevice as sd
 import numpy as np
 import threading
 import time
+from churn import dsp, resample
+from churn.profile import profiler, stage
 
 # --- Global State ---
 fs = 44100
 step_duration = 5  # Length of each new mic capture
 stretch_factor = 1.19
+stretch_quality = 'good'  # churn.resample level: 'linear' | 'fast' | 'good' | 'best'
+max_loop_dur = 60        # Upper bound on the loop length in seconds
+max_loop_policy = 'fold' # 'fold' wraps the overflow onto the start, 'decimate' squeezes it in
+
+# The processor publishes a finished buffer by rebinding loop_buffer (an atomic
+# reference swap); the callback never waits on a lock while the next one is built.
 loop_buffer = np.zeros(int(step_duration * fs), dtype=np.float32)
-buffer_lock = threading.Lock()
+playing = None   # Buffer the callback is currently reading (callback-owned)
 current_ptr = 0
 
+@stage("callback")
 def audio_callback(outdata, frames, time_info, status):
-    global current_ptr
-    with buffer_lock:
-        n_samples = len(loop_buffer)
-        if n_samples == 0:
-            outdata.fill(0)
-            return
-        indices = (np.arange(current_ptr, current_ptr + frames)) % n_samples
-        outdata[:, 0] = loop_buffer[indices]
-        current_ptr = (current_ptr + frames) % n_samples
+    global current_ptr, playing
+    buf = loop_buffer
+    n_samples = len(buf)
+    if n_samples == 0:
+        outdata.fill(0)
+        return
+    if buf is not playing:
+        # New loop published: keep the same phase within the longer loop
+        if playing is not None and len(playing):
+            current_ptr = int(current_ptr * n_samples / len(playing)) % n_samples
+        playing = buf
+    dsp.loop_read(buf, current_ptr, outdata[:, 0])
+    current_ptr = (current_ptr + frames) % n_samples
+
+@stage("bound_length")
+def bound_length(data):
+    """Keeps the loop at or under max_loop_dur so memory and swap cost stay flat."""
+    max_samples = int(max_loop_dur * fs)
+    if len(data) <= max_samples:
+        return data
+    if max_loop_policy == 'decimate':
+        return resample.resample(data, max_samples / len(data), stretch_quality)
+    return dsp.fold(data, max_samples)
+
+def merge_layer(new_mic_data):
+    """Stretches the current loop, folds the new recording into its start and publishes the result."""
+    global loop_buffer
+    # Stretch the EXISTING loop (outside any lock; playback keeps reading the old one)
+    with stage("stretch"):
+        stretched_base = resample.resample(loop_buffer, stretch_factor, stretch_quality)
+    
+    # Fold the NEW mic recording into the start of the stretched buffer
+    # We use a 50/50 mix for the overlap area
+    n_mic = len(new_mic_data)
+    combined = stretched_base
+    
+    # Mix new mic data into the beginning of the expanded loop
+    combined[:n_mic] *= 0.6
+    combined[:n_mic] += new_mic_data * 0.4
+    
+    # Bound the length, then normalize to prevent buildup distortion
+    combined = bound_length(combined)
+    dsp.normalize(combined, 0.8, floor=0.01)
+    
+    # Publish with a single reference swap
+    loop_buffer = combined
+    return combined
 
 def processor_thread():
     global loop_buffer
@@ -30,44 +77,23 @@ def processor_thread():
     # 1. Initial Seed Capture
     print(f"Initial capture: Speak now for {step_duration}s...")
     recording = sd.rec(int(step_duration * fs), samplerate=fs, channels=1, blocking=True)
-    with buffer_lock:
-        loop_buffer = recording.flatten().astype(np.float32)
+    loop_buffer = dsp.as_f32(recording)
 
     iteration = 1
     while True:
         # 2. Record NEW audio while the old loop continues to play
         print(f"\n[Iteration {iteration}] Recording new layer...")
         new_mic_data = sd.rec(int(step_duration * fs), samplerate=fs, channels=1, blocking=True)
-        new_mic_data = new_mic_data.flatten().astype(np.float32)
+        new_mic_data = dsp.as_f32(new_mic_data)
 
-        with buffer_lock:
-            # 3. Stretch the EXISTING loop
-            old_data = loop_buffer
-            n_old = len(old_data)
-            n_new = int(n_old * stretch_factor)
-            
-            new_indices = np.linspace(0, n_old - 1, n_new)
-            stretched_base = np.interp(new_indices, np.arange(n_old), old_data)
-            
-            # 4. Fold the NEW mic recording into the start of the stretched buffer
-            # We use a 50/50 mix for the overlap area
-            n_mic = len(new_mic_data)
-            combined = stretched_base.copy()
-            
-            # Mix new mic data into the beginning of the expanded loop
-            combined[:n_mic] = (combined[:n_mic] * 0.6) + (new_mic_data * 0.4)
-            
-            # 5. Normalize to prevent buildup distortion
-            max_val = np.max(np.abs(combined))
-            if max_val > 0.01:
-                combined = (combined / max_val) * 0.8
-            
-            loop_buffer = combined
-            
-            print(f"Merged. New Loop Length: {len(loop_buffer)/fs:.2f}s")
-            iteration += 1
+        # 3. Stretch the existing loop, fold the recording in, bound, normalize and publish
+        merge_layer(new_mic_data)
+        
+        print(f"Merged. New Loop Length: {len(loop_buffer)/fs:.2f}s")
+        iteration += 1
 
 if __name__ == "__main__":
+    profiler.install("tobias")
     # Start the Output Stream (Non-blocking)
     stream = sd.OutputStream(channels=1, samplerate=fs, callback=audio_callback)
     
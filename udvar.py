@@ -1,61 +1,117 @@
 import sounddevice as sd
 import numpy as np
 import time
+from collections import deque
+from churn import capture, dsp, snapshot
+from churn.profile import profiler, stage
+from churn.cache import StretchCache
+from churn.timeline import TimelinePlayer, render
 
 def auto_layered_loop():
     fs = 44100
     capture_dur = 5
     stretch_factor = 1.19
     stagger_delay = 2.5
+    stretch_cache = StretchCache(max_bytes=256 * 1024 * 1024)
+    profiler.install("udvar")
+    snapshot_path = "udvar.snap"  # Written on SIGUSR1 / SIGTERM, restored on the next start
+    stream_first = True  # Open a duplex stream at once; each cycle takes in the next seed (False: record all 5 first)
     
     clips = []
+    iteration = 1
+    resume_at = None
+    input_ring = capture.InputRing(fs)  # Microphone side of the duplex stream
+    seeds = None
     
-    # --- PHASE 1: AUTOMATIC RECORDING ---
-    print("--- Phase 1: Capturing 5 Seeds (No stopping) ---")
-    for i in range(5):
-        print(f"Recording Clip {i+1}/5... (5 seconds)")
-        # blocking=True ensures we finish one 5s recording before starting the next
-        rec = sd.rec(int(capture_dur * fs), samplerate=fs, channels=1, blocking=True)
-        
-        # Prepare the clip: float32 and normalized volume for layering
-        clip = rec.flatten().astype(np.float32)
-        if np.max(np.abs(clip)) > 0:
-            clip = (clip / np.max(np.abs(clip))) * 0.3
-        clips.append(clip)
+    if snapshot.exists(snapshot_path):
+        start = time.perf_counter()
+        state = snapshot.load(snapshot_path)
+        clips, iteration = state["clips"], state["iteration"]
+        resume_at = (state["cycle"], state["pos"])
+        snapshot.restore_rng(state["rng"])
+        print(f"[Snapshot] Restored cycle {iteration - 1} at {state['pos'] / fs:.1f}s from {snapshot_path} "
+              f"in {(time.perf_counter() - start) * 1e3:.0f} ms")
+    elif stream_first:
+        print("--- Stream-first start: cycle N plays the first N seeds as they are captured ---")
+        seeds = capture.SeedCapture(input_ring, 5, capture_dur,
+                                    lambda i, rec: clips.append(dsp.normalize(dsp.as_f32(rec), 0.3)))
+    else:
+        # --- PHASE 1: AUTOMATIC RECORDING ---
+        print("--- Phase 1: Capturing 5 Seeds (No stopping) ---")
+        for i in range(5):
+            print(f"Recording Clip {i+1}/5... (5 seconds)")
+            # blocking=True ensures we finish one 5s recording before starting the next
+            rec = sd.rec(int(capture_dur * fs), samplerate=fs, channels=1, blocking=True)
+            
+            # Prepare the clip: float32 and normalized volume for layering
+            clip = dsp.normalize(dsp.as_f32(rec), 0.3)
+            clips.append(clip)
 
     # --- PHASE 2: EVOLVING LAYERS ---
     print("\n--- Phase 2: Starting Staggered Playback ---")
     
-    iteration = 1
+    # Voice i enters 2.5 seconds after voice i-1
+    offsets = [int(i * stagger_delay * fs) for i in range(5)]
+    # (cycle, clips, iteration) as they stood right after each recent render, so a
+    # snapshot resumes from the cycle being heard rather than one rendered ahead
+    rendered = deque(maxlen=4)
+
+    @stage("render_cycle")
+    def next_cycle():
+        nonlocal iteration
+        if seeds is not None:
+            seeds.wait(min(iteration, 5))  # Cycle N waits for seed N; cycles outlast a capture, so none is late
+        voices = len(clips)
+        print(f"\n--- Rendering Cycle {iteration} ---")
+        
+        for i in range(voices):
+            # 1. Slow down the current clip by 19%
+            clips[i] = stretch_cache.stretch(clips[i], stretch_factor, iteration)
+            print(f"Voice {i+1}: {len(clips[i])/fs:.2f}s at +{offsets[i]/fs:.1f}s")
+        
+        # 2. Overlap-add all five voices at their stagger offsets into one buffer.
+        # The cycle lasts until the final/longest clip finishes, then the next begins.
+        cycle = render(clips[:voices], offsets[:voices])
+        dsp.clip(cycle, out=cycle)
+        print(stretch_cache.report())
+        iteration += 1
+        rendered.append((cycle, list(clips), iteration))
+        return cycle
+
+    # 3. One persistent stream; the next cycle renders in the background while this one plays
+    player = TimelinePlayer(next_cycle)
+    if resume_at is not None:
+        player.resume(*resume_at)
+        rendered.append((resume_at[0], list(clips), iteration))
+
+    def save_snapshot():
+        cycle, pos = player.position()
+        for heard, heard_clips, heard_iteration in list(rendered):
+            if heard is cycle:
+                break
+        else:
+            return
+        state = {"cycle": cycle, "pos": pos, "clips": heard_clips, "iteration": heard_iteration,
+                 "rng": snapshot.rng_state()}
+        nbytes = snapshot.save(snapshot_path, state)
+        print(f"\n[Snapshot] cycle {heard_iteration - 1} at {pos / fs:.1f}s, {nbytes / 1e6:.1f} MB -> {snapshot_path}")
+
+    saves = snapshot.on_signal(save_snapshot)
     try:
-        while True:
-            print(f"\n--- Cycle {iteration} ---")
-            
-            for i in range(5):
-                # 1. Slow down the current clip by 19%
-                n_samples = len(clips[i])
-                new_n_samples = int(n_samples * stretch_factor)
-                new_indices = np.linspace(0, n_samples - 1, new_n_samples)
-                clips[i] = np.interp(new_indices, np.arange(n_samples), clips[i]).astype(np.float32)
-                
-                # 2. Trigger playback (Non-blocking)
-                # This layers the sound over whatever is currently playing
-                sd.play(clips[i], fs)
-                
-                print(f"Voice {i+1} playing: {len(clips[i])/fs:.2f}s")
-                
-                # 3. Wait 2.5 seconds before starting the next voice
-                if i < 4:
-                    time.sleep(stagger_delay)
-            
-            # 4. Wait for the final/longest clip of this cycle to finish
-            # before we start the next round of transformations.
-            sd.wait()
-            iteration += 1
+        callback = stage("callback")(player.callback)
+        if stream_first:
+            stream = sd.Stream(channels=1, samplerate=fs, callback=input_ring.duplex(callback))
+        else:
+            stream = sd.OutputStream(channels=1, samplerate=fs, callback=callback)
+        with stream:
+            if seeds is not None:
+                seeds.start()
+            player.start()
+            while True:
+                saves.sleep(1)  # Signalled snapshots are written here, not in the handler
 
     except KeyboardInterrupt:
-        print("\nStopping...")
-        sd.stop()
+        print(f"\nStopping... ({player.cycles_played} cycles, {player.underruns} underruns)")
 
 if __name__ == "__main__":
     try:
@@ -2,95 +2,192 @@ import sounddevice as sd
 import numpy as np
 import threading
 import time
+from churn import activity, capture, compress, dsp, snapshot
+from churn.profile import profiler, stage
+from churn.cache import StretchCache
+from churn.evolve import Evolver
+from churn.tiers import TierStore
+from churn.memory import budget
 
 # --- Configuration ---
 fs = 44100
 capture_dur = 2
 stretch_factor = 1.19
 stagger_delay = 0.5
+cache_mb = 256  # Byte budget for memoized stretch generations
+tier_db = -45   # Out-of-band energy (dB) a layer may lose when moved to a lower rate
+compress_layers = True  # Keep layer loops as int16 + per-block scales (half the RAM)
+memory_mb = 512  # Byte budget for all layer buffers
+evict_policy = 'longest'  # 'oldest', 'quietest', 'longest' or 'lru'
+snapshot_path = "viktor.snap"  # Written on SIGUSR1 / SIGTERM, restored on the next start
+stream_first = True  # Open a duplex stream at once and fold seeds in as they finish (False: record all 5 first)
+
+stretch_cache = StretchCache(max_bytes=cache_mb * 1024 * 1024)
+tier_store = TierStore(fs, tolerance_db=tier_db)
+budget.configure(memory_mb, evict_policy)
+
+@stage("evolve")
+def next_generation(data, rate, generation, source):
+    """Evolver worker: the next 19% stretch (normalized to keep layering balanced), settled, indexed and packed."""
+    data = stretch_cache.stretch(data, stretch_factor, generation, target=0.2, source=source)
+    data, rate = tier_store.settle(data, rate)
+    index = stretch_cache.activity(data) or activity.ActivityIndex(data)
+    return compress.pack(data, compress_layers), rate, index, generation
+
+evolver = Evolver(next_generation)  # Generations are built off the audio thread
 
 class Layer:
     def __init__(self, data):
-        self.data = data
+        self.data = compress.pack(data, compress_layers)
+        self.activity = activity.ActivityIndex(data)
         self.ptr = 0
+        self.generation = 0
+        self.source = stretch_cache.source()  # Cache identity of this layer's generations
+        self.rate = 1  # Stored at fs / rate once stretched dark enough
         self.is_active = False
+        self.pending = None  # Next generation, built by the evolver
+        self.buf = np.zeros(0, dtype=np.float32)
 
     def get_samples(self, frames):
         if not self.is_active:
-            return np.zeros(frames, dtype=np.float32)
+            return None
+        if self.pending is None:
+            evolver.request(self)
         
-        n_samples = len(self.data)
-        # Generate indices for the current chunk
-        indices = np.arange(self.ptr, self.ptr + frames)
-        chunk = self.data[indices % n_samples]
+        n_samples = len(self.data) * self.rate
+        chunk = None  # None (nothing to mix) while the index says this read is silent
+        if not activity.mixing.skip(self.activity, self.ptr, frames, self.rate):
+            if len(self.buf) < frames:
+                self.buf = np.zeros(frames, dtype=np.float32)
+            # Copy the current chunk (wrapping) into the layer's own buffer
+            chunk = tier_store.read(self.data, self.rate, self.ptr, self.buf[:frames])
+        budget.touch(self)
         
         # Check if we finished a full loop
         self.ptr += frames
         if self.ptr >= n_samples:
             self.ptr = 0
-            self.evolve()
+            evolver.advance(self)  # Swaps in the next generation if the worker has it ready
             
         return chunk
 
-    def evolve(self):
-        # Time stretch by 19%
-        n_old = len(self.data)
-        n_new = int(n_old * stretch_factor)
-        new_indices = np.linspace(0, n_old - 1, n_new)
-        
-        stretched = np.interp(new_indices, np.arange(n_old), self.data)
-        
-        # Normalize to keep layering balanced
-        max_val = np.max(np.abs(stretched))
-        if max_val > 0:
-            stretched = (stretched / max_val) * 0.2
-            
-        self.data = stretched.astype(np.float32)
-
 # Global list of layer objects
 layers = []
 lock = threading.Lock()
+input_ring = capture.InputRing(fs)  # Microphone side of the duplex stream
+
+def evict_layer(layer):
+    with lock:
+        if layer in layers:
+            layers.remove(layer)
 
+mix_buffer = np.zeros(0, dtype=np.float32)
+
+@stage("callback")
 def audio_callback(outdata, frames, time_info, status):
-    # Create a silent canvas for mixing
-    mixed = np.zeros(frames, dtype=np.float32)
+    global mix_buffer
+    # Reuse one silent canvas for mixing
+    if len(mix_buffer) < frames:
+        mix_buffer = np.zeros(frames, dtype=np.float32)
+    mixed = mix_buffer[:frames]
+    mixed.fill(0)
     
-    with lock:
+    with lock, stage("mix"):
         for layer in layers:
-            mixed += layer.get_samples(frames)
+            chunk = layer.get_samples(frames)
+            if chunk is not None:
+                mixed += chunk
     
     # Send the final mix to the single output stream
-    outdata[:, 0] = np.clip(mixed, -1.0, 1.0)
+    outdata[:, 0] = dsp.clip(mixed, out=mixed)
+
+def save_snapshot():
+    """Writes every layer (samples, position, generation, ...) and RNG state."""
+    start = time.perf_counter()
+    with lock:
+        saved = [snapshot.layer_state(layer) for layer in layers]
+    state = {
+        "layers": saved,
+        "rng": snapshot.rng_state(),
+    }
+    nbytes = snapshot.save(snapshot_path, state)
+    print(f"\n[Snapshot] {len(saved)} layers, {nbytes / 1e6:.1f} MB -> {snapshot_path} "
+          f"({(time.perf_counter() - start) * 1e3:.0f} ms)")
+
+def restore_snapshot():
+    start = time.perf_counter()
+    state = snapshot.load(snapshot_path)
+    for saved in state["layers"]:
+        layer = snapshot.apply(Layer(saved["data"]), saved)
+        layers.append(budget.register("viktor", layer, on_evict=evict_layer))
+    snapshot.restore_rng(state["rng"])
+    print(f"[Snapshot] Restored {len(layers)} layers from {snapshot_path} "
+          f"in {(time.perf_counter() - start) * 1e3:.0f} ms")
+
+def add_seed(i, rec):
+    raw_data = dsp.as_f32(rec)
+    dsp.normalize(raw_data, 0.2)
+    layer = budget.register("viktor", Layer(raw_data), on_evict=evict_layer)
+    layer.is_active = True
+    with lock:
+        layers.append(layer)
+    print(f"Seed {i+1}/5 active")
 
 def main():
     global layers
+    profiler.install("viktor")
     
-    # 1. Automatic Capture of 5 Seeds
-    print(f"--- Phase 1: Capturing 5 Seeds ({capture_dur}s each) ---")
-    for i in range(5):
-        print(f"Recording Clip {i+1}/5...")
-        rec = sd.rec(int(capture_dur * fs), samplerate=fs, channels=1, blocking=True)
-        raw_data = rec.flatten().astype(np.float32)
-        
-        # Initial normalization
-        if np.max(np.abs(raw_data)) > 0:
-            raw_data = (raw_data / np.max(np.abs(raw_data))) * 0.2
+    seeds = None
+    if snapshot.exists(snapshot_path):
+        restore_snapshot()
+    elif stream_first:
+        # 1. Seeds are cut from the running stream's input and join one by one
+        print(f"--- Stream-first start: 5 seeds ({capture_dur}s each) join as they are captured ---")
+        seeds = capture.SeedCapture(input_ring, 5, capture_dur, add_seed)
+    else:
+        # 1. Automatic Capture of 5 Seeds
+        print(f"--- Phase 1: Capturing 5 Seeds ({capture_dur}s each) ---")
+        for i in range(5):
+            print(f"Recording Clip {i+1}/5...")
+            rec = sd.rec(int(capture_dur * fs), samplerate=fs, channels=1, blocking=True)
+            raw_data = dsp.as_f32(rec)
             
-        layers.append(Layer(raw_data))
+            # Initial normalization
+            dsp.normalize(raw_data, 0.2)
+                
+            layers.append(budget.register("viktor", Layer(raw_data), on_evict=evict_layer))
+    saves = snapshot.on_signal(save_snapshot)
 
     # 2. Single Output Stream
     print("\n--- Phase 2: Running Unified Output Stream ---")
-    with sd.OutputStream(channels=1, samplerate=fs, callback=audio_callback):
-        for i, layer in enumerate(layers):
+    if stream_first:
+        stream = sd.Stream(channels=1, samplerate=fs, callback=input_ring.duplex(audio_callback))
+    else:
+        stream = sd.OutputStream(channels=1, samplerate=fs, callback=audio_callback)
+    with stream:
+        if seeds is not None:
+            seeds.start()
+        for i, layer in enumerate(list(layers)):
+            if layer.is_active:  # Restored layers are already playing
+                continue
             print(f"Activating Layer {i+1}...")
             with lock:
                 layer.is_active = True
             # Staggered entry into the mix
-            time.sleep(stagger_delay)
+            saves.sleep(stagger_delay)
+        if seeds is not None:
+            while not seeds.wait(timeout=snapshot.POLL):
+                saves.poll()
             
         print("All layers active. Droning indefinitely.")
         while True:
-            time.sleep(1)
+            saves.sleep(30)  # Signalled snapshots are written here, not in the handler
+            budget.enforce()
+            print(stretch_cache.report())
+            print(tier_store.report())
+            print(evolver.report())
+            print(activity.mixing.report(fs))
+            print(budget.report())
 
 if __name__ == "__main__":
     try:
@@ -2,103 +2,211 @@ import sounddevice as sd
 import numpy as np
 import threading
 import time
-from scipy.signal import butter, lfilter
+from scipy.signal import butter
+from churn import activity, capture, compress, convolve, dsp, jit, snapshot
+from churn.profile import profiler, stage
+from churn.cache import StretchCache
+from churn.evolve import Evolver
+from churn.tiers import TierStore
+from churn.memory import budget
 
 # --- Configuration ---
 fs = 44100
 capture_dur = 2
 stretch_factor = 1.19
 stagger_delay = 0.5
+cache_mb = 256  # Byte budget for memoized stretch generations
+tier_db = -45   # Out-of-band energy (dB) a layer may lose when moved to a lower rate
+compress_layers = True  # Keep layer loops as int16 + per-block scales (half the RAM)
+memory_mb = 512  # Byte budget for all layer buffers
+evict_policy = 'longest'  # 'oldest', 'quietest', 'longest' or 'lru'
+snapshot_path = "wilma.snap"  # Written on SIGUSR1 / SIGTERM, restored on the next start
+stream_first = True  # Open a duplex stream at once and fold seeds in as they finish (False: record all 5 first)
 
 # Effect Parameters
 CUTOFF_FREQ = 2000  # Low-pass filter frequency in Hz
 DRIVE = 1.5         # Saturation/Distortion intensity (1.0 = clean, 5.0 = heavy)
+REVERB_IR = None    # Impulse response WAV for the master reverb; None synthesizes a noise tail
+REVERB_SEC = 3.0    # Length of the synthesized tail (-60 dB point)
+REVERB_WET = 0.25   # Reverb level added to the master bus (0 = off)
 
 class Layer:
     def __init__(self, data):
-        self.data = data
+        self.data = compress.pack(data, compress_layers)
+        self.activity = activity.ActivityIndex(data)
         self.ptr = 0
+        self.generation = 0
+        self.source = stretch_cache.source()  # Cache identity of this layer's generations
+        self.rate = 1  # Stored at fs / rate once stretched dark enough
         self.is_active = False
+        self.pending = None  # Next generation, built by the evolver
+        self.buf = np.zeros(0, dtype=np.float32)
 
     def get_samples(self, frames):
         if not self.is_active:
-            return np.zeros(frames, dtype=np.float32)
+            return None
+        if self.pending is None:
+            evolver.request(self)
         
-        n_samples = len(self.data)
-        indices = np.arange(self.ptr, self.ptr + frames)
-        chunk = self.data[indices % n_samples]
+        n_samples = len(self.data) * self.rate
+        chunk = None  # None (nothing to mix) while the index says this read is silent
+        if not activity.mixing.skip(self.activity, self.ptr, frames, self.rate):
+            if len(self.buf) < frames:
+                self.buf = np.zeros(frames, dtype=np.float32)
+            chunk = tier_store.read(self.data, self.rate, self.ptr, self.buf[:frames])
+        budget.touch(self)
         
         self.ptr += frames
         if self.ptr >= n_samples:
             self.ptr = 0
-            self.evolve()
+            evolver.advance(self)  # Swaps in the next generation if the worker has it ready
             
         return chunk
 
-    def evolve(self):
-        n_old = len(self.data)
-        n_new = int(n_old * stretch_factor)
-        new_indices = np.linspace(0, n_old - 1, n_new)
-        stretched = np.interp(new_indices, np.arange(n_old), self.data)
-        
-        max_val = np.max(np.abs(stretched))
-        if max_val > 0:
-            stretched = (stretched / max_val) * 0.2
-            
-        self.data = stretched.astype(np.float32)
-
 layers = []
 lock = threading.Lock()
+stretch_cache = StretchCache(max_bytes=cache_mb * 1024 * 1024)
+tier_store = TierStore(fs, tolerance_db=tier_db)
+budget.configure(memory_mb, evict_policy)
+
+@stage("evolve")
+def next_generation(data, rate, generation, source):
+    """Evolver worker: the next 19% stretch (normalized to keep layering balanced), settled, indexed and packed."""
+    data = stretch_cache.stretch(data, stretch_factor, generation, target=0.2, source=source)
+    data, rate = tier_store.settle(data, rate)
+    index = stretch_cache.activity(data) or activity.ActivityIndex(data)
+    return compress.pack(data, compress_layers), rate, index, generation
+
+evolver = Evolver(next_generation)  # Generations are built off the audio thread
+
+def evict_layer(layer):
+    with lock:
+        if layer in layers:
+            layers.remove(layer)
+
+# Master Low Pass Filter: keeps its state between callbacks (no clicks at block edges)
+master_lpf = jit.IIRFilter(*butter(2, CUTOFF_FREQ / (0.5 * fs), btype='low', analog=False))
+
+# Master Convolution Reverb: partitioned, so even a multi-second IR costs the same every callback
+master_reverb = convolve.PartitionedConvolver(
+    convolve.load_ir(REVERB_IR, fs) if REVERB_IR else convolve.synthetic_ir(REVERB_SEC, fs), gain=REVERB_WET)
+
+# Microphone side of the duplex stream; seeds are cut from it in the background
+input_ring = capture.InputRing(fs)
 
-# Helper for Low Pass Filter
-def low_pass_filter(data, cutoff, fs, order=2):
-    nyq = 0.5 * fs
-    normal_cutoff = cutoff / nyq
-    b, a = butter(order, normal_cutoff, btype='low', analog=False)
-    return lfilter(b, a, data)
+mix_buffer = np.zeros(0, dtype=np.float32)
+wet_buffer = np.zeros(0, dtype=np.float32)
 
+@stage("callback")
 def audio_callback(outdata, frames, time_info, status):
-    mixed = np.zeros(frames, dtype=np.float32)
+    global mix_buffer, wet_buffer
+    if len(mix_buffer) < frames:
+        mix_buffer = np.zeros(frames, dtype=np.float32)
+        wet_buffer = np.zeros(frames, dtype=np.float32)
+    mixed = mix_buffer[:frames]
+    mixed.fill(0)
     
-    with lock:
+    with lock, stage("mix"):
         for layer in layers:
-            mixed += layer.get_samples(frames)
+            chunk = layer.get_samples(frames)
+            if chunk is not None:
+                mixed += chunk
     
     # --- EFFECT 1: Soft Clipping / Saturation ---
     # We use np.tanh to create a warm distortion/limiting effect
-    mixed = np.tanh(mixed * DRIVE)
+    mixed = dsp.drive(mixed, DRIVE, out=mixed)
     
     # --- EFFECT 2: Master Low Pass Filter ---
     # This removes harsh high frequencies
-    try:
-        mixed = low_pass_filter(mixed, CUTOFF_FREQ, fs).astype(np.float32)
-    except:
-        pass # Fallback if filter fails on a short frame
+    with stage("master_lpf"):
+        mixed = master_lpf.process(mixed, out=mixed)
+    
+    # --- EFFECT 3: Convolution Reverb ---
+    # The tail of the filtered bus, added back under the dry signal
+    if REVERB_WET:
+        with stage("master_reverb"):
+            mixed += master_reverb.process(mixed, out=wet_buffer[:frames])
     
     # Final Output Clipping (Hard Limit)
-    outdata[:, 0] = np.clip(mixed, -1.0, 1.0)
+    outdata[:, 0] = dsp.clip(mixed, out=mixed)
+
+def save_snapshot():
+    """Writes every layer (samples, position, generation, ...) and RNG state."""
+    start = time.perf_counter()
+    with lock:
+        saved = [snapshot.layer_state(layer) for layer in layers]
+    state = {
+        "layers": saved,
+        "master_lpf": master_lpf.zi.copy(),
+        "rng": snapshot.rng_state(),
+    }
+    nbytes = snapshot.save(snapshot_path, state)
+    print(f"\n[Snapshot] {len(saved)} layers, {nbytes / 1e6:.1f} MB -> {snapshot_path} "
+          f"({(time.perf_counter() - start) * 1e3:.0f} ms)")
+
+def restore_snapshot():
+    start = time.perf_counter()
+    state = snapshot.load(snapshot_path)
+    for saved in state["layers"]:
+        layer = snapshot.apply(Layer(saved["data"]), saved)
+        layers.append(budget.register("wilma", layer, on_evict=evict_layer))
+    master_lpf.zi[:] = state["master_lpf"]
+    snapshot.restore_rng(state["rng"])
+    print(f"[Snapshot] Restored {len(layers)} layers from {snapshot_path} "
+          f"in {(time.perf_counter() - start) * 1e3:.0f} ms")
+
+def add_seed(i, rec):
+    raw_data = dsp.as_f32(rec)
+    dsp.normalize(raw_data, 0.2)
+    layer = budget.register("wilma", Layer(raw_data), on_evict=evict_layer)
+    layer.is_active = True
+    with lock:
+        layers.append(layer)
+    print(f"Seed {i+1}/5 joined the FX chain")
 
 def main():
     global layers
-    print(f"--- Phase 1: Capturing 5 Seeds ---")
-    for i in range(5):
-        print(f"Recording {i+1}/5...")
-        rec = sd.rec(int(capture_dur * fs), samplerate=fs, channels=1, blocking=True)
-        raw_data = rec.flatten().astype(np.float32)
-        if np.max(np.abs(raw_data)) > 0:
-            raw_data = (raw_data / np.max(np.abs(raw_data))) * 0.2
-        layers.append(Layer(raw_data))
-
-    print("\n--- Phase 2: Unified Stream with Master Effects ---")
-    with sd.OutputStream(channels=1, samplerate=fs, callback=audio_callback):
-        for i, layer in enumerate(layers):
+    profiler.install("wilma")
+    seeds = None
+    if snapshot.exists(snapshot_path):
+        restore_snapshot()
+    elif stream_first:
+        print(f"--- Stream-first start: 5 seeds join as they are captured ---")
+        seeds = capture.SeedCapture(input_ring, 5, capture_dur, add_seed)
+    else:
+        print(f"--- Phase 1: Capturing 5 Seeds ---")
+        for i in range(5):
+            print(f"Recording {i+1}/5...")
+            rec = sd.rec(int(capture_dur * fs), samplerate=fs, channels=1, blocking=True)
+            raw_data = dsp.as_f32(rec)
+            dsp.normalize(raw_data, 0.2)
+            layers.append(budget.register("wilma", Layer(raw_data), on_evict=evict_layer))
+    saves = snapshot.on_signal(save_snapshot)
+
+    print(f"\n--- Phase 2: Unified Stream with Master Effects ({jit.warmup()} DSP) ---")
+    if stream_first:
+        stream = sd.Stream(channels=1, samplerate=fs, callback=input_ring.duplex(audio_callback))
+    else:
+        stream = sd.OutputStream(channels=1, samplerate=fs, callback=audio_callback)
+    with stream:
+        if seeds is not None:
+            seeds.start()
+        for i, layer in enumerate(list(layers)):
+            if layer.is_active:  # Restored layers are already playing
+                continue
             print(f"Adding Layer {i+1} to FX chain...")
             with lock:
                 layer.is_active = True
-            time.sleep(stagger_delay)
+            saves.sleep(stagger_delay)
         
         while True:
-            time.sleep(1)
+            saves.sleep(30)  # Signalled snapshots are written here, not in the handler
+            budget.enforce()
+            print(stretch_cache.report())
+            print(tier_store.report())
+            print(evolver.report())
+            print(activity.mixing.report(fs))
+            print(budget.report())
 
 if __name__ == "__main__":
     try:
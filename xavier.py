@@ -2,6 +2,13 @@ import sounddevice as sd
 import numpy as np
 import threading
 import time
+from churn import activity, capture, compress, dsp, snapshot
+from churn.profile import profiler, stage
+from churn.cache import StretchCache
+from churn.evolve import Evolver
+from churn.tiers import TierStore
+from churn.memory import budget
+from churn.archive import LayerArchive
 
 # --- Configuration ---
 fs = 44100
@@ -9,59 +16,92 @@ capture_dur = 1
 grand_loop_dur = .5    
 stretch_factor = 1.19
 stagger_delay = .4
+cache_mb = 256         # Byte budget for memoized stretch generations
+tier_db = -45          # Out-of-band energy (dB) a layer may lose when moved to a lower rate
+compress_layers = True # Keep layer loops as int16 + per-block scales (half the RAM)
+memory_mb = 512        # Byte budget for all layer buffers
+evict_policy = 'oldest' # 'oldest', 'quietest', 'longest' or 'lru'
+archive_recall_every = 20 # Grand loops between bringing an archived layer back
+snapshot_path = "xavier.snap" # Written on SIGUSR1 / SIGTERM, restored on the next start
+stream_first = True    # Open a duplex stream at once and fold seeds in as they finish (False: record all 5 first)
+
+stretch_cache = StretchCache(max_bytes=cache_mb * 1024 * 1024)
+tier_store = TierStore(fs, tolerance_db=tier_db)
+budget.configure(memory_mb, evict_policy)
+
+@stage("evolve")
+def next_generation(data, rate, generation, source):
+    """Evolver worker: the next 19% stretch (normalized to keep layering balanced), settled, indexed and packed."""
+    data = stretch_cache.stretch(data, stretch_factor, generation, target=1.0, source=source)
+    data, rate = tier_store.settle(data, rate)
+    index = stretch_cache.activity(data) or activity.ActivityIndex(data)
+    return compress.pack(data, compress_layers), rate, index, generation
+
+evolver = Evolver(next_generation)  # Generations are built off the audio thread
+archive = LayerArchive("xavier")  # Retired grand loops are spilled here instead of dropped
 
 class Layer:
     def __init__(self, data, volume=0.2):
-        self.data = data.flatten().astype(np.float32)
+        self.data = compress.pack(data, compress_layers)
+        self.activity = activity.ActivityIndex(data)
         self.ptr = 0
+        self.generation = 0
+        self.source = stretch_cache.source()  # Cache identity of this layer's generations
+        self.rate = 1  # Stored at fs / rate once stretched dark enough
         self.is_active = False
         self.volume = volume
+        self.pending = None  # Next generation, built by the evolver
+        self.buf = np.zeros(0, dtype=np.float32)
 
     def get_samples(self, frames):
         if not self.is_active:
-            return np.zeros(frames, dtype=np.float32)
+            return None
+        if self.pending is None:
+            evolver.request(self)
         
-        n_samples = len(self.data)
-        # Use modulo to wrap around the buffer
-        indices = (np.arange(self.ptr, self.ptr + frames)) % n_samples
-        chunk = self.data[indices]
+        n_samples = len(self.data) * self.rate
+        chunk = None  # None (nothing to mix) while the index says this read is silent
+        if not activity.mixing.skip(self.activity, self.ptr, frames, self.rate):
+            if len(self.buf) < frames:
+                self.buf = np.zeros(frames, dtype=np.float32)
+            # Copy with wrap-around into the layer's own buffer (no index array)
+            chunk = tier_store.read(self.data, self.rate, self.ptr, self.buf[:frames])
+            np.multiply(chunk, self.volume, out=chunk)
+        budget.touch(self)
         
         self.ptr += frames
         if self.ptr >= n_samples:
             self.ptr = 0
-            self.evolve()
-            
-        return chunk * self.volume
-
-    def evolve(self):
-        n_old = len(self.data)
-        n_new = int(n_old * stretch_factor)
-        new_indices = np.linspace(0, n_old - 1, n_new)
-        stretched = np.interp(new_indices, np.arange(n_old), self.data)
-        
-        max_val = np.max(np.abs(stretched))
-        if max_val > 0:
-            stretched = stretched / max_val
+            evolver.advance(self)  # Swaps in the next generation if the worker has it ready
             
-        self.data = stretched.astype(np.float32)
+        return chunk
 
 # --- Global State ---
 layers = []
 master_history = [] 
 lock = threading.Lock()
+input_ring = capture.InputRing(fs)  # Microphone side of the duplex stream
+mix_buffer = np.zeros(0, dtype=np.float32)
 
+@stage("callback")
 def audio_callback(outdata, frames, time_info, status):
+    global mix_buffer
     # Standard output callback signature
-    mixed = np.zeros(frames, dtype=np.float32)
+    if len(mix_buffer) < frames:
+        mix_buffer = np.zeros(frames, dtype=np.float32)
+    mixed = mix_buffer[:frames]
+    mixed.fill(0)
     
-    with lock:
+    with lock, stage("mix"):
         for layer in layers:
             # Basic additive mixing
-            mixed += layer.get_samples(frames)
+            chunk = layer.get_samples(frames)
+            if chunk is not None:
+                mixed += chunk
     
     # Saturation and Clipping
-    final_signal = np.tanh(mixed * 1.2)
-    final_signal = np.clip(final_signal, -1.0, 1.0)
+    final_signal = dsp.drive(mixed, 1.2, out=mixed)
+    final_signal = dsp.clip(final_signal, out=final_signal)
     
     # Send to the hardware output (ensuring correct shape)
     outdata[:, 0] = final_signal
@@ -69,62 +109,160 @@ def audio_callback(outdata, frames, time_info, status):
     # Store for the Grand Loop
     master_history.append(final_signal.copy())
 
+def archive_layer(layer):
+    archive.spill(layer.data, volume=layer.volume, rate=layer.rate, generation=layer.generation)
+
+def evict_layer(layer):
+    with lock:
+        if layer in layers:
+            layers.remove(layer)
+    archive_layer(layer)
+
+def add_grand_layer(layer):
+    retired = None
+    with lock:
+        layers.append(layer)
+        budget.register("xavier", layer, on_evict=evict_layer)
+        # Prevent memory explosion: keep 5 seeds + last 5 grand loops
+        if len(layers) > 10:
+            retired = layers.pop(5)
+    if retired is not None:
+        budget.unregister(retired)
+        archive_layer(retired)
+
+@stage("recall")
+def recall_layer():
+    """Brings an archived grand loop back; its samples page in from disk as it plays."""
+    recalled = archive.recall()
+    if recalled is None:
+        return
+    data, meta = recalled
+    layer = Layer(data, volume=meta["volume"])
+    layer.rate, layer.generation = meta["rate"], meta["generation"]
+    layer.is_active = True
+    add_grand_layer(layer)
+
+grand_loop_cycles = 0
+
+def grand_loop_step():
+    """One grand loop: the output heard since the last one becomes a new layer (nothing if none played)."""
+    global master_history, grand_loop_cycles
+    with lock:
+        if len(master_history) == 0:
+            return
+        # Combine all chunks collected during the sleep period
+        recorded_mix = np.concatenate(master_history)
+        master_history = [] 
+    
+    # Keep only the last 15 seconds worth of samples
+    target_samples = int(grand_loop_dur * fs)
+    if len(recorded_mix) > target_samples:
+        recorded_mix = recorded_mix[-target_samples:]
+        
+    print(f"\n[Grand Loop] Resampling and adding new master layer... ({stretch_cache.report()})")
+    print(f"[Grand Loop] {activity.mixing.report(fs)}")
+    
+    # Create a new evolving layer from the output we just heard
+    new_grand_layer = Layer(recorded_mix, volume=0.15)
+    new_grand_layer.is_active = True
+    
+    add_grand_layer(new_grand_layer)
+    
+    # Every so often an old grand loop comes back from the disk archive
+    grand_loop_cycles += 1
+    if grand_loop_cycles % archive_recall_every == 0:
+        recall_layer()
+        print(f"[Grand Loop] {archive.report()}")
+    
+    # Growing layers are also held to the memory budget
+    if budget.enforce():
+        print(f"[Grand Loop] {budget.report()}")
+
 def grand_loop_processor():
-    global master_history, layers
     print(f"--- Grand Loop Active: Sampling every {grand_loop_dur}s ---")
-    
     while True:
         time.sleep(grand_loop_dur)
-        
-        with lock:
-            if len(master_history) == 0:
-                continue
-            # Combine all chunks collected during the sleep period
-            recorded_mix = np.concatenate(master_history)
-            master_history = [] 
-        
-        # Keep only the last 15 seconds worth of samples
-        target_samples = int(grand_loop_dur * fs)
-        if len(recorded_mix) > target_samples:
-            recorded_mix = recorded_mix[-target_samples:]
-            
-        print(f"\n[Grand Loop] Resampling and adding new master layer...")
-        
-        # Create a new evolving layer from the output we just heard
-        new_grand_layer = Layer(recorded_mix, volume=0.15)
-        new_grand_layer.is_active = True
-        
-        with lock:
-            layers.append(new_grand_layer)
-            # Prevent memory explosion: keep 5 seeds + last 5 grand loops
-            if len(layers) > 10:
-                layers.pop(5) 
+        grand_loop_step()
+
+def save_snapshot():
+    """Writes every layer (samples, position, generation, ...), the unresampled output and RNG state."""
+    start = time.perf_counter()
+    with lock:
+        saved = [snapshot.layer_state(layer) for layer in layers]
+        history = list(master_history)
+    state = {
+        "layers": saved,
+        "master_history": np.concatenate(history) if history else np.zeros(0, dtype=np.float32),
+        "rng": snapshot.rng_state(),
+    }
+    nbytes = snapshot.save(snapshot_path, state)
+    print(f"\n[Snapshot] {len(saved)} layers, {nbytes / 1e6:.1f} MB -> {snapshot_path} "
+          f"({(time.perf_counter() - start) * 1e3:.0f} ms)")
+
+def restore_snapshot():
+    global master_history
+    start = time.perf_counter()
+    state = snapshot.load(snapshot_path)
+    for saved in state["layers"]:
+        layer = snapshot.apply(Layer(saved["data"]), saved)
+        layers.append(budget.register("xavier", layer, on_evict=evict_layer))
+    if len(state["master_history"]):
+        master_history = [np.array(state["master_history"])]
+    snapshot.restore_rng(state["rng"])
+    print(f"[Snapshot] Restored {len(layers)} layers from {snapshot_path} "
+          f"in {(time.perf_counter() - start) * 1e3:.0f} ms")
+
+def add_seed(i, rec):
+    layer = budget.register("xavier", Layer(rec, volume=0.2), on_evict=evict_layer)
+    layer.is_active = True
+    with lock:
+        layers.append(layer)
 
 def main():
     global layers
+    profiler.install("xavier")
     
-    # 1. Capture 5 Seeds
-    print(f"--- Phase 1: Capturing 5 Seeds (2s each) ---")
-    for i in range(5):
-        print(f"Recording Seed {i+1}/5...")
-        rec = sd.rec(int(capture_dur * fs), samplerate=fs, channels=1, blocking=True)
-        layers.append(Layer(rec, volume=0.2))
-
-    # 2. Open Output Stream
-    # Note: Using OutputStream to avoid complex multi-input/output logic
-    with sd.OutputStream(channels=1, samplerate=fs, callback=audio_callback):
-        # Staggered activation
-        for layer in layers:
+    seeds = None
+    if snapshot.exists(snapshot_path):
+        restore_snapshot()
+    elif stream_first:
+        # 1. Seeds come off the running stream, each playing as soon as it is captured
+        print(f"--- Stream-first start: 5 seeds join as they are captured ---")
+        seeds = capture.SeedCapture(input_ring, 5, capture_dur, add_seed)
+    else:
+        # 1. Capture 5 Seeds
+        print(f"--- Phase 1: Capturing 5 Seeds (2s each) ---")
+        for i in range(5):
+            print(f"Recording Seed {i+1}/5...")
+            rec = sd.rec(int(capture_dur * fs), samplerate=fs, channels=1, blocking=True)
+            layers.append(budget.register("xavier", Layer(rec, volume=0.2), on_evict=evict_layer))
+    saves = snapshot.on_signal(save_snapshot)
+
+    # 2. Open the Stream (duplex when the seeds come from its input)
+    if stream_first:
+        stream = sd.Stream(channels=1, samplerate=fs, callback=input_ring.duplex(audio_callback))
+    else:
+        stream = sd.OutputStream(channels=1, samplerate=fs, callback=audio_callback)
+    with stream:
+        if seeds is not None:
+            seeds.start()
+        # Staggered activation (restored layers are already playing)
+        for layer in list(layers):
+            if layer.is_active:
+                continue
             with lock:
                 layer.is_active = True
-            time.sleep(stagger_delay)
+            saves.sleep(stagger_delay)
+        if seeds is not None:
+            while not seeds.wait(timeout=snapshot.POLL):  # Grand loops go after the 5 seeds in the layer list
+                saves.poll()
             
         # 3. Start the background sampler
         threading.Thread(target=grand_loop_processor, daemon=True).start()
         
         print("\n--- Audio Engine Running ---")
         while True:
-            time.sleep(1)
+            saves.sleep(1)  # Signalled snapshots are written here, not in the handler
 
 if __name__ == "__main__":
     try: